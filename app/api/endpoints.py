@@ -1,47 +1,39 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from datetime import date
-from pathlib import Path
-from typing import List
-from ..config import REPORTS_DIR
-from ..services.downloader import ReportDownloader
-from ..services.parser import ReportParser
+from typing import Annotated, Optional
 from ..services.trading_service import TradingService
+from ..services.export import ExportService, EXPORT_FORMATS, ARROW_FORMATS, pyarrow_available
+from ..services.queries import export_query
+from ..services.data_version import data_version
+from ..services.feed import feed_broadcaster
+from ..utils.metrics import registry
+from ..utils.serialization import FastJSONResponse, RawJSONResponse
+from .http_cache import make_etag, cache_headers, is_not_modified, not_modified
 from ..schemas import (
     LastTradingDatesResponse,
+    TradingDayResponse,
     DynamicsRequest,
     DynamicsResponse,
+    DynamicsBatchRequest,
+    DynamicsBatchResponse,
+    ExportRequest,
     TradingResultsRequest,
-    TradingResultsResponse
+    TradingResultsResponse,
+    SeriesRequest,
+    SeriesResponse,
+    PriceAnalyticsRequest,
+    PriceAnalyticsResponse,
+    AggregateRequest,
+    AggregateResponse
 )
 
 router = APIRouter()
 
 
-@router.post("/download-reports/")
-async def download_reports(
-        start_date: date = date(2023, 1, 1),
-        end_date: date = date.today()
-) -> List[str]:
-    try:
-        downloader = ReportDownloader()
-        saved_files = await downloader.get_and_save_reports(start_date, end_date)
-        return saved_files
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@router.post("/process-reports/")
-async def process_reports() -> dict:
-    try:
-        parser = ReportParser()
-        report_dir = Path(REPORTS_DIR)
-        count = await parser.process_directory(report_dir)
-        return {
-            "message": "Отчёты успешно обработаны",
-            "records_processed": count
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # далее эндпоинты в рамках практики по FastAPI
@@ -58,6 +50,22 @@ async def get_last_trading_dates(
             dates=[d.isoformat() for d in dates],
             count=len(dates)
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/trading/days/{day}", response_model=TradingDayResponse)
+async def get_trading_day(day: date) -> TradingDayResponse:
+    try:
+        trading_service = TradingService()
+        summary = await trading_service.get_trading_day(day)
+        await trading_service.close()
+
+        return TradingDayResponse(**summary)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -68,7 +76,8 @@ async def get_dynamics(request: DynamicsRequest) -> DynamicsResponse:
         if request.start_date > request.end_date:
             raise HTTPException(status_code=400, detail="Начальная дата не может быть позже конечной даты")
         trading_service = TradingService()
-        results = await trading_service.get_dynamics(
+        # тело ответа уже сериализовано (из кэша или один раз при промахе), повторной валидации нет
+        payload = await trading_service.get_dynamics_json(
             start_date=request.start_date,
             end_date=request.end_date,
             oil_id=request.oil_id,
@@ -77,10 +86,47 @@ async def get_dynamics(request: DynamicsRequest) -> DynamicsResponse:
         )
         await trading_service.close()
 
-        return DynamicsResponse(
-            results=results,
-            count=len(results)
-        )
+        return RawJSONResponse(payload)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/trading/dynamics/", response_model=DynamicsResponse)
+async def get_dynamics_cached(request: Request, query: Annotated[DynamicsRequest, Query()]) -> DynamicsResponse:
+    # GET-вариант для HTTP-кэшей: условный запрос с актуальным ETag получает 304 без обращения к Redis и БД
+    if query.start_date > query.end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата не может быть позже конечной даты")
+    version, last_modified = await data_version.current()
+    etag = make_etag(version, "dynamics", query.model_dump())
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    result = await get_dynamics(query)
+    result.headers.update(cache_headers(etag, last_modified))
+    return result
+
+
+@router.post("/trading/dynamics/batch/", response_model=DynamicsBatchResponse)
+async def get_dynamics_batch(request: DynamicsBatchRequest) -> DynamicsBatchResponse:
+    try:
+        keys = [item.key or str(idx) for idx, item in enumerate(request.filters)]
+        if len(set(keys)) != len(keys):
+            raise HTTPException(status_code=400, detail="Ключи фильтров должны быть уникальными")
+        for key, item in zip(keys, request.filters):
+            if item.start_date > item.end_date:
+                raise HTTPException(status_code=400,
+                                    detail=f"Фильтр {key}: начальная дата не может быть позже конечной даты")
+        trading_service = TradingService()
+        batch = await trading_service.get_dynamics_batch([
+            item.model_dump(exclude={"key"}) for item in request.filters
+        ])
+        await trading_service.close()
+
+        return FastJSONResponse({
+            "results": {key: {"results": results, "count": len(results)} for key, results in zip(keys, batch)},
+            "count": len(keys)
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -91,7 +137,7 @@ async def get_dynamics(request: DynamicsRequest) -> DynamicsResponse:
 async def get_trading_results(request: TradingResultsRequest) -> TradingResultsResponse:
     try:
         trading_service = TradingService()
-        results = await trading_service.get_trading_results(
+        payload = await trading_service.get_trading_results_json(
             oil_id=request.oil_id,
             delivery_type_id=request.delivery_type_id,
             delivery_basis_id=request.delivery_basis_id,
@@ -99,9 +145,126 @@ async def get_trading_results(request: TradingResultsRequest) -> TradingResultsR
         )
         await trading_service.close()
 
-        return TradingResultsResponse(
-            results=results,
-            count=len(results)
+        return RawJSONResponse(payload)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/trading/results/", response_model=TradingResultsResponse)
+async def get_trading_results_cached(request: Request,
+                                     query: Annotated[TradingResultsRequest, Query()]) -> TradingResultsResponse:
+    version, last_modified = await data_version.current()
+    etag = make_etag(version, "trading_results", query.model_dump())
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    result = await get_trading_results(query)
+    result.headers.update(cache_headers(etag, last_modified))
+    return result
+
+
+@router.get("/trading/export/", response_class=StreamingResponse)
+async def export_trading_results(query: Annotated[ExportRequest, Query()]) -> StreamingResponse:
+    # потоковая выгрузка без ORM: CSV прямо из COPY ... TO STDOUT, Parquet/Arrow батчами из серверного курсора
+    if query.start_date and query.end_date and query.start_date > query.end_date:
+        raise HTTPException(status_code=400, detail="Начальная дата не может быть позже конечной даты")
+    if query.format in ARROW_FORMATS and not pyarrow_available():
+        raise HTTPException(status_code=501, detail=f"Формат {query.format} недоступен: не установлен pyarrow")
+    media_type, extension = EXPORT_FORMATS[query.format]
+    stream = ExportService().stream(export_query(**query.model_dump(exclude={"format"})), query.format)
+    return StreamingResponse(stream, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="spimex_trading_results.{extension}"'
+    })
+
+
+@router.get("/trading/feed/", response_class=StreamingResponse)
+async def trading_feed(
+        last_event_id: Optional[int] = Query(None, ge=0, description="досылать события после этого id"),
+        last_event_id_header: Annotated[Optional[str], Header(alias="Last-Event-ID")] = None) -> StreamingResponse:
+    # SSE: событие trading_day с итогами дня, как только загрузка закоммитила новую дату, вместо опроса
+    # /trading/last-dates/. При подключении приходит последнее событие, при переподключении — пропущенные
+    if last_event_id is None and last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    feed_broadcaster.check_capacity()
+    return StreamingResponse(feed_broadcaster.stream(last_event_id), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@router.post("/trading/series/", response_model=SeriesResponse)
+async def get_series(request: SeriesRequest) -> SeriesResponse:
+    try:
+        if request.start_date > request.end_date:
+            raise HTTPException(status_code=400, detail="Начальная дата не может быть позже конечной даты")
+        trading_service = TradingService()
+        results = await trading_service.get_series(
+            start_date=request.start_date,
+            end_date=request.end_date,
+            granularity=request.granularity,
+            oil_id=request.oil_id,
+            delivery_type_id=request.delivery_type_id,
+            delivery_basis_id=request.delivery_basis_id
+        )
+        await trading_service.close()
+
+        return FastJSONResponse({"results": results, "count": len(results)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/trading/aggregates/", response_model=AggregateResponse)
+async def get_aggregates(request: AggregateRequest) -> AggregateResponse:
+    try:
+        if request.start_date > request.end_date:
+            raise HTTPException(status_code=400, detail="Начальная дата не может быть позже конечной даты")
+        if len(set(request.group_by)) != len(request.group_by) or len(set(request.metrics)) != len(request.metrics):
+            raise HTTPException(status_code=400, detail="Измерения и метрики не должны повторяться")
+        trading_service = TradingService()
+        results = await trading_service.get_aggregates(
+            start_date=request.start_date,
+            end_date=request.end_date,
+            group_by=request.group_by,
+            bucket=request.bucket,
+            metrics=request.metrics,
+            order_by=request.order_by,
+            order=request.order,
+            limit=request.limit,
+            oil_id=request.oil_id,
+            delivery_type_id=request.delivery_type_id,
+            delivery_basis_id=request.delivery_basis_id
         )
+        await trading_service.close()
+
+        return FastJSONResponse({"results": results, "count": len(results)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/trading/analytics/", response_model=PriceAnalyticsResponse)
+async def get_price_analytics(request: PriceAnalyticsRequest) -> PriceAnalyticsResponse:
+    try:
+        if request.start_date > request.end_date:
+            raise HTTPException(status_code=400, detail="Начальная дата не может быть позже конечной даты")
+        trading_service = TradingService()
+        results = await trading_service.get_price_analytics(
+            start_date=request.start_date,
+            end_date=request.end_date,
+            oil_id=request.oil_id,
+            delivery_type_id=request.delivery_type_id,
+            delivery_basis_id=request.delivery_basis_id,
+            resample=request.resample,
+            window=request.window
+        )
+        await trading_service.close()
+
+        return FastJSONResponse(results)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
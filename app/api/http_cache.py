@@ -0,0 +1,49 @@
+import hashlib
+import json
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict
+from fastapi import Request, Response
+
+CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # пустые строки и отсутствующие фильтры — один и тот же запрос
+    return {k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in params.items() if v not in (None, "")}
+
+
+def make_etag(version: int, method: str, params: Dict[str, Any]) -> str:
+    query = json.dumps([method, normalize_params(params)], sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def cache_headers(etag: str, last_modified: datetime) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    # If-None-Match приоритетнее If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        return last_modified <= since
+    return False
+
+
+def not_modified(etag: str, last_modified: datetime) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
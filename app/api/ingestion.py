@@ -0,0 +1,80 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+from redis.exceptions import RedisError
+from datetime import date
+from pathlib import Path
+from typing import List
+from ..config import REPORTS_DIR
+from ..services.post_ingestion import on_ingestion_complete
+from ..services.work_queue import ingestion_queue
+
+# Загрузка отчётов отдельным роутером: pandas (парсер), BeautifulSoup и aiohttp (загрузчик) импортируются
+# при первом вызове, а не при старте воркера. Реплики только на чтение не подключают роутер вовсе
+# (INGESTION_API_ENABLED=false). Даты, которые уже скачивает или загружает другая реплика (аренда в общей
+# очереди), пропускаются, поэтому одновременные вызовы не дублируют файлы и строки.
+router = APIRouter()
+
+
+@router.post("/download-reports/")
+async def download_reports(
+        start_date: date = date(2023, 1, 1),
+        end_date: date = date.today()
+) -> List[str]:
+    try:
+        from ..services.downloader import ReportDownloader
+
+        downloader = ReportDownloader(coordinator=ingestion_queue)
+        saved_files = await downloader.get_and_save_reports(start_date, end_date)
+        return saved_files
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Очередь загрузки недоступна: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/process-reports/")
+async def process_reports(background_tasks: BackgroundTasks) -> dict:
+    try:
+        from ..services.parser import ReportParser
+
+        parser = ReportParser(coordinator=ingestion_queue)
+        report_dir = Path(REPORTS_DIR)
+        count = await parser.process_directory(report_dir)
+        if count:
+            # новые данные: версия, сброс кэша за загруженные даты и прогрев уже после ответа
+            background_tasks.add_task(on_ingestion_complete, dates=sorted(parser.loaded))
+        return {
+            "message": "Отчёты успешно обработаны",
+            "records_processed": count
+        }
+    except RedisError as e:
+        # без аренды дат загрузка не запускается: иначе реплики дублировали бы строки
+        raise HTTPException(status_code=503, detail=f"Очередь загрузки недоступна: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/ingest/queue/")
+async def enqueue_reports(
+        start_date: date = date(2023, 1, 1),
+        end_date: date = date.today()
+) -> dict:
+    # даты бюллетеней за период -> общая очередь; загружают их воркеры (python -m app.ingest worker
+    # или INGEST_WORKER_CONCURRENCY на репликах API)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date не может быть позже end_date")
+    try:
+        return await ingestion_queue.enqueue_range(start_date, end_date)
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Очередь загрузки недоступна: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/ingest/queue/")
+async def queue_status() -> dict:
+    try:
+        return await ingestion_queue.status()
+    except RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Очередь загрузки недоступна: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import random
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from time import perf_counter
+from uuid import uuid4
+from starlette.datastructures import MutableHeaders
+from ..config import (
+    SERVER_TIMING_ENABLED, PROFILE_HEADER_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_INTERVAL_MS,
+    TIMING_LOG_THRESHOLD_MS, RATE_LIMIT_ENABLED, RATE_LIMIT_TRUST_FORWARDED
+)
+from ..services.admission import RateLimiter, rate_limiter, endpoint_class, retry_after_header
+from ..utils.logger import logger
+from ..utils.metrics import HTTP_REQUEST_SECONDS
+from ..utils.profiler import SamplingProfiler
+from ..utils.timing import start_collecting, server_timing_header
+
+
+class MetricsMiddleware:
+    # чистый ASGI без BaseHTTPMiddleware: не буферизует ответ и почти ничего не стоит на запрос
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # шаблон маршрута, а не фактический путь: /trading/days/{day}, а не каждая дата отдельно
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(perf_counter() - started, method=scope["method"], route=route,
+                                         status=status)
+
+
+class AdmissionMiddleware:
+    # Корзины токенов на клиента и класс эндпоинтов до маршрутизации: клиент, превысивший лимит,
+    # сразу получает 429 с Retry-After и не занимает ни Redis-кэш, ни пул БД.
+    def __init__(self, app, enabled: bool = RATE_LIMIT_ENABLED, limiter: Optional[RateLimiter] = None,
+                 trust_forwarded: bool = RATE_LIMIT_TRUST_FORWARDED):
+        self.app = app
+        self.enabled = enabled
+        self.limiter = limiter or rate_limiter
+        self.trust_forwarded = trust_forwarded
+
+    def _client(self, scope) -> str:
+        headers = dict(scope.get("headers", []))
+        api_key = headers.get(b"x-api-key")
+        address = scope["client"][0] if scope.get("client") else None
+        if self.trust_forwarded and b"x-forwarded-for" in headers:
+            address = headers[b"x-forwarded-for"].split(b",")[0].strip().decode("latin-1")
+        return self.limiter.client_key(api_key.decode("latin-1") if api_key else None, address)
+
+    async def __call__(self, scope, receive, send):
+        endpoint = endpoint_class(scope["path"]) if scope["type"] == "http" and self.enabled else None
+        if endpoint is None:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await self.limiter.check(self._client(scope), endpoint)
+        if retry_after is None:
+            await self.app(scope, receive, send)
+            return
+        body = json.dumps({"detail": "Слишком много запросов, повторите позже"}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after_header(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class ServerTimingMiddleware:
+    # Отрезки cache/db/hydrate/serialize текущего запроса: в заголовок Server-Timing и в лог одной JSON-строкой.
+    # По заголовку X-Profile: 1 (если разрешено) или с вероятностью profile_sample_rate запрос профилируется
+    # семплирующим профайлером, свёрнутые стеки пишутся в profile_dir.
+    def __init__(self, app, enabled: bool = SERVER_TIMING_ENABLED, profile_header_enabled: bool = PROFILE_HEADER_ENABLED,
+                 profile_sample_rate: float = PROFILE_SAMPLE_RATE, profile_dir: str = PROFILE_DIR,
+                 profile_interval_ms: float = PROFILE_INTERVAL_MS,
+                 log_threshold_ms: float = TIMING_LOG_THRESHOLD_MS):
+        self.app = app
+        self.enabled = enabled
+        self.profile_header_enabled = profile_header_enabled
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_dir = Path(profile_dir)
+        self.profile_interval = profile_interval_ms / 1000
+        self.log_threshold_ms = log_threshold_ms
+
+    def _should_profile(self, scope) -> bool:
+        if self.profile_header_enabled and (b"x-profile", b"1") in scope.get("headers", []):
+            return True
+        return self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate
+
+    def _profile_path(self, scope) -> Path:
+        path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        return self.profile_dir / f"{datetime.now():%Y%m%dT%H%M%S}_{scope['method']}_{path}_{uuid4().hex[:8]}.folded"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        spans = start_collecting()
+        started = perf_counter()
+        status = 500
+        profiler, profile_path = None, None
+        if self._should_profile(scope):
+            profile_path = self._profile_path(scope)
+            profiler = SamplingProfiler(self.profile_interval).start()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(spans, perf_counter() - started))
+                if profile_path is not None:
+                    headers.append("X-Profile-File", profile_path.name)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total_ms = (perf_counter() - started) * 1000
+            if profiler is not None:
+                profiler.stop()
+                await asyncio.to_thread(profiler.dump, profile_path)
+            level = logging.INFO if total_ms >= self.log_threshold_ms or profile_path else logging.DEBUG
+            # быстрые запросы пишутся на DEBUG: без него запись и JSON не собираются вовсе
+            if logger.isEnabledFor(level):
+                record = {
+                    "method": scope["method"],
+                    "route": getattr(scope.get("route"), "path", scope["path"]),
+                    "status": status,
+                    "total_ms": round(total_ms, 2),
+                    "spans": {name: round(seconds * 1000, 2) for name, (seconds, _) in spans.items()},
+                }
+                if profile_path is not None:
+                    record["profile"] = str(profile_path)
+                logger.log(level, f"request_timing {json.dumps(record, ensure_ascii=False)}")
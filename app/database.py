@@ -1,14 +1,89 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from time import perf_counter
+from uuid import uuid4
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.orm import declarative_base
-from .config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from .config import (
+    DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, DB_READ_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_WRITE_POOL_SIZE, DB_WRITE_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE
+)
+from .utils.metrics import DB_QUERY_SECONDS
+from .utils.timing import record_span
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+READ_DATABASE_URL = DB_READ_URL or DATABASE_URL
+
+
+def connect_args(statement_cache_size: int = DB_STATEMENT_CACHE_SIZE) -> dict:
+    args = {
+        # кэш asyncpg и кэш подготовленных выражений на стороне SQLAlchemy
+        "statement_cache_size": statement_cache_size,
+        "prepared_statement_cache_size": statement_cache_size,
+    }
+    if not statement_cache_size:
+        # за pgbouncer имена подготовленных выражений не должны пересекаться между клиентами
+        args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    return args
+
+
+def track_queries(async_engine: AsyncEngine, name: str) -> AsyncEngine:
+    # длительность каждого SQL-запроса в гистограмму spimex_db_query_duration_seconds{engine=...} и в Server-Timing
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = perf_counter()
+
+    @event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            elapsed = perf_counter() - started
+            DB_QUERY_SECONDS.observe(elapsed, engine=name)
+            record_span("db", elapsed)
+
+    return async_engine
+
+
+def make_engine(url: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args()
+    )
+
 
 Base = declarative_base()
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# запись: загрузка отчётов, партиции, агрегаты
+engine = track_queries(make_engine(DATABASE_URL, DB_WRITE_POOL_SIZE, DB_WRITE_MAX_OVERFLOW), "write")
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+# чтение: эндпоинты API; отдельный пул (или реплика), чтобы долгая загрузка не забирала соединения у запросов
+read_engine = track_queries(make_engine(READ_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW), "read")
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+
+
+def fresh_read_session() -> AsyncSession:
+    # Чтение сразу после загрузки, результат которого живёт дольше запроса: прогрев кэша, колоночный снимок,
+    # итоги дня в ленте. Реплика из DB_READ_URL может ещё не видеть только что записанные строки, и устаревшие
+    # данные остались бы в кэше или снимке до следующей загрузки, поэтому такие чтения идут в основную базу.
+    return AsyncSessionLocal()
 
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+async def dispose_engines():
+    await read_engine.dispose()
+    await engine.dispose()
@@ -0,0 +1,290 @@
+"""Загрузка бюллетеней вне API-сервера.
+
+    python -m app.ingest download --start-date 2024-01-01 --end-date 2024-01-31 --concurrency 8
+    python -m app.ingest process --workers 4 --processes 4 --batch-size 5000
+    python -m app.ingest sync --start-date 2024-01-01
+    python -m app.ingest rebuild --start-date 2024-01-01 --end-date 2024-12-31
+    python -m app.ingest enqueue --start-date 2023-01-01
+    python -m app.ingest worker --concurrency 4
+
+enqueue ставит даты бюллетеней в общую очередь (Redis), worker на любом числе узлов разбирает её без
+пересечений и выходит, когда очередь опустела (--follow — ждать новые даты).
+
+Код выхода 0 — всё загружено, 1 — часть файлов не скачалась или команда упала.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Optional, Iterable, TextIO, Tuple
+from .config import REPORTS_DIR
+from .database import AsyncSessionLocal, dispose_engines
+from .services.downloader import ReportDownloader
+from .services.feed import feed_broadcaster
+from .services.parser import ReportParser, report_date_from_path
+from .services.partitions import month_start
+from .services.post_ingestion import on_ingestion_complete
+from .services.redis_client import close_redis
+from .services.rollups import rollup_service
+from .services.work_queue import QueueWorker, ingestion_queue
+from .utils.logger import logger
+
+DEFAULT_START_DATE = date(2023, 1, 1)
+
+
+class Progress:
+    def __init__(self, title: str, total: int, stream: TextIO = sys.stderr, width: int = 30):
+        self.title = title
+        self.total = total
+        self.stream = stream
+        self.width = width
+        self.done = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+        # в терминале — перерисовываемая строка, в логах cron/k8s — запись на каждые 10%
+        self.interactive = stream.isatty()
+        self._next_log = 0.1
+
+    def update(self, path: Optional[Path] = None, rows: int = 0) -> None:
+        self.done += 1
+        self.rows += rows
+        if self.interactive:
+            self.stream.write("\r" + self.line())
+            self.stream.flush()
+        elif self.total and self.done / self.total >= self._next_log:
+            while self._next_log <= self.done / self.total:
+                self._next_log += 0.1
+            logger.info(self.line())
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        filled = int(self.width * self.done / self.total) if self.total else self.width
+        bar = "#" * filled + "-" * (self.width - filled)
+        return (f"{self.title}: [{bar}] {self.done}/{self.total} файлов, {self.rows} строк, "
+                f"{rate:.1f} файл/с, {elapsed:.1f} с")
+
+    def close(self) -> None:
+        if self.interactive and self.total:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+def select_reports(reports_dir: str, start_date: Optional[date] = None,
+                   end_date: Optional[date] = None) -> List[Path]:
+    paths = []
+    for path in sorted(Path(reports_dir).glob("*.xls")):
+        try:
+            report_date = report_date_from_path(path)
+        except ValueError:
+            logger.warning(f"Пропущен файл без даты в имени: {path.name}")
+            continue
+        if (start_date is None or report_date >= start_date) and (end_date is None or report_date <= end_date):
+            paths.append(path)
+    return paths
+
+
+async def download(start_date: date, end_date: date, concurrency: int = 10,
+                   reports_dir: str = REPORTS_DIR) -> tuple:
+    # возвращает (сохранённые файлы, число ссылок, которые не удалось скачать)
+    downloader = ReportDownloader(reports_dir=reports_dir)
+    reports = await downloader.get_all_bulletins(start_date, end_date)
+    if not reports:
+        logger.warning("Не обнаружено отчётов в данном диапазоне дат")
+        return [], 0
+    os.makedirs(reports_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = Progress("download", len(reports))
+
+    async def run(url: str, report_date: date) -> Optional[str]:
+        saved = await downloader.download_and_save(url, report_date, semaphore)
+        progress.update()
+        return saved
+
+    results = await asyncio.gather(*(run(url, report_date) for url, report_date in reports))
+    progress.close()
+    saved = [Path(r) for r in results if r]
+    return saved, len(results) - len(saved)
+
+
+async def process(paths: Iterable[Path], workers: int = 10, processes: int = 0,
+                  batch_size: Optional[int] = None, coordinate: bool = True) -> Tuple[int, List[date]]:
+    # (число записанных строк, даты, по которым они записаны)
+    paths = list(paths)
+    if not paths:
+        logger.info("Нет файлов для обработки")
+        return 0, []
+    # processes > 0 — разбор xls в отдельных процессах; загрузка в БД остаётся в цикле событий
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+    try:
+        # под арендой общей очереди, как /process-reports/: даты, которые загружает реплика API или воркер,
+        # пропускаются; coordinate=False — без Redis (разовая загрузка, когда больше никто не пишет)
+        parser = ReportParser(batch_size=batch_size, executor=executor,
+                              coordinator=ingestion_queue if coordinate else None)
+        progress = Progress("process", len(paths))
+        count = await parser.process_files(paths, workers, on_progress=progress.update)
+        progress.close()
+        return count, sorted(parser.loaded)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+async def rebuild(start_date: date, end_date: date) -> int:
+    # пересчёт агрегатов и календаря торговых дней; одна транзакция на месяц
+    months = []
+    current = month_start(start_date)
+    while current <= end_date:
+        months.append(current)
+        current = month_start(current + timedelta(days=31))
+    progress = Progress("rebuild", len(months))
+    for month in months:
+        first = max(month, start_date)
+        last = min(month_start(month + timedelta(days=31)) - timedelta(days=1), end_date)
+        dates = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+        async with AsyncSessionLocal() as session:
+            await rollup_service.refresh(session, dates)
+            await session.commit()
+        progress.update()
+    progress.close()
+    return len(months)
+
+
+def _date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ожидается дата в формате ГГГГ-ММ-ДД: {value}")
+
+
+def _positive(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"Ожидается положительное число: {value}")
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    arg_parser = argparse.ArgumentParser(prog="python -m app.ingest", description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    def dates(command: argparse.ArgumentParser, start_default: Optional[date]) -> None:
+        command.add_argument("--reports-dir", default=REPORTS_DIR)
+        command.add_argument("--start-date", type=_date, default=start_default)
+        command.add_argument("--end-date", type=_date, default=None, help="по умолчанию — сегодня")
+
+    def download_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--concurrency", type=_positive, default=10,
+                             help="одновременных загрузок с сайта биржи")
+
+    def process_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--workers", type=_positive, default=10,
+                             help="файлов в обработке одновременно")
+        command.add_argument("--processes", type=int, default=0,
+                             help="процессов для разбора xls (0 — в основном процессе)")
+        command.add_argument("--batch-size", type=_positive, default=None,
+                             help="строк на один bulk insert (по умолчанию — файл целиком)")
+        command.add_argument("--no-coordinate", action="store_true",
+                             help="не брать даты под аренду в Redis (больше никто не загружает)")
+
+    def refresh_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--no-refresh", action="store_true",
+                             help="не обновлять версию данных и не прогревать кэш")
+
+    command = commands.add_parser("download", help="скачать бюллетени в каталог отчётов")
+    dates(command, DEFAULT_START_DATE)
+    download_options(command)
+
+    command = commands.add_parser("process", help="загрузить скачанные бюллетени в БД")
+    dates(command, None)
+    process_options(command)
+    refresh_options(command)
+
+    command = commands.add_parser("sync", help="скачать новые бюллетени и загрузить только их")
+    dates(command, DEFAULT_START_DATE)
+    download_options(command)
+    process_options(command)
+    refresh_options(command)
+
+    command = commands.add_parser("rebuild", help="пересчитать агрегаты за диапазон дат")
+    dates(command, DEFAULT_START_DATE)
+    refresh_options(command)
+
+    command = commands.add_parser("enqueue", help="поставить даты бюллетеней в общую очередь загрузки")
+    dates(command, DEFAULT_START_DATE)
+
+    command = commands.add_parser("worker", help="загружать даты из общей очереди")
+    command.add_argument("--reports-dir", default=REPORTS_DIR)
+    command.add_argument("--concurrency", type=_positive, default=4, help="дат в работе одновременно")
+    command.add_argument("--follow", action="store_true", help="не выходить, когда очередь опустела")
+    refresh_options(command)
+    return arg_parser
+
+
+async def run(args: argparse.Namespace) -> int:
+    end_date = getattr(args, "end_date", None) or date.today()
+    if getattr(args, "start_date", None) and args.start_date > end_date:
+        logger.error("start_date не может быть позже end_date")
+        return 1
+    failed = 0
+    changed = False
+    # загруженные даты; None — неизвестны (rebuild), тогда сбрасывается весь кэш
+    loaded: Optional[List[date]] = None
+    try:
+        if args.command == "download":
+            saved, failed = await download(args.start_date, end_date, args.concurrency, args.reports_dir)
+            logger.info(f"Скачано файлов: {len(saved)}, с ошибкой: {failed}")
+        elif args.command == "process":
+            paths = select_reports(args.reports_dir, args.start_date, args.end_date)
+            count, loaded = await process(paths, args.workers, args.processes, args.batch_size,
+                                          not args.no_coordinate)
+            logger.info(f"Обработано файлов: {len(paths)}, сохранено {count} записей")
+            changed = count > 0
+        elif args.command == "sync":
+            # уже лежащие в каталоге файлы считаются загруженными, повторно в БД не пишутся
+            existing = set(select_reports(args.reports_dir))
+            saved, failed = await download(args.start_date, end_date, args.concurrency, args.reports_dir)
+            new = [path for path in saved if path not in existing]
+            count, loaded = await process(new, args.workers, args.processes, args.batch_size,
+                                          not args.no_coordinate)
+            logger.info(f"Новых файлов: {len(new)}, сохранено {count} записей, не скачано: {failed}")
+            changed = count > 0
+        elif args.command == "rebuild":
+            months = await rebuild(args.start_date, end_date)
+            logger.info(f"Агрегаты пересчитаны за {months} мес.")
+            changed = True
+        elif args.command == "enqueue":
+            queued = await ingestion_queue.enqueue_range(args.start_date, end_date)
+            logger.info(f"Найдено бюллетеней: {queued['found']}, уже в БД: {queued['already_loaded']}, "
+                        f"поставлено в очередь: {queued['queued']}")
+        elif args.command == "worker":
+            # версию данных и кэш воркер обновляет сам после каждой пачки загруженных дат
+            worker = QueueWorker(concurrency=args.concurrency, reports_dir=args.reports_dir,
+                                 refresh=not args.no_refresh)
+            count = await worker.run(drain=not args.follow)
+            failed = len(worker.failed)
+            logger.info(f"Воркер сохранил {count} записей, не загружено дат: {failed}")
+        if changed and not getattr(args, "no_refresh", False):
+            await on_ingestion_complete(dates=loaded)
+    except Exception as e:
+        logger.error(f"Ошибка команды {args.command}: {e}", exc_info=True)
+        return 1
+    finally:
+        await feed_broadcaster.close()
+        await close_redis()
+        await dispose_engines()
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from .api.endpoints import router as api_router
+from .api.middleware import MetricsMiddleware, ServerTimingMiddleware, AdmissionMiddleware
+from .config import (
+    INGESTION_API_ENABLED, SCHEDULER_ENABLED, COLUMNAR_ENGINE_ENABLED, INGEST_WORKER_CONCURRENCY
+)
+from .database import dispose_engines
+from .services.redis_client import close_redis
 
-app = FastAPI()
 
-app.include_router(api_router)
\ No newline at end of file
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler = task = worker = worker_task = None
+    if COLUMNAR_ENGINE_ENABLED:
+        # до загрузки снимка (или если она не удалась) запросы идут через кэш и SQL
+        from .services.columnar import columnar_store
+
+        await columnar_store.refresh()
+    if SCHEDULER_ENABLED:
+        # на каждой реплике, но загружает только лидер (аренда в Redis)
+        from .services.scheduler import IngestionScheduler
+
+        scheduler = IngestionScheduler()
+        task = asyncio.create_task(scheduler.run())
+    if INGEST_WORKER_CONCURRENCY > 0:
+        # воркер общей очереди загрузки: реплики делят между собой поставленный в очередь период
+        from .services.work_queue import QueueWorker
+
+        worker = QueueWorker(concurrency=INGEST_WORKER_CONCURRENCY)
+        worker_task = asyncio.create_task(worker.run())
+    yield
+    if scheduler is not None:
+        await scheduler.stop()
+        await task
+    if worker is not None:
+        worker.stop()
+        await worker_task
+    # подписка ленты на Redis pub/sub и оставшиеся SSE-потоки
+    from .services.feed import feed_broadcaster
+
+    await feed_broadcaster.close()
+    await close_redis()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(api_router)
+if INGESTION_API_ENABLED:
+    from .api.ingestion import router as ingestion_router
+
+    app.include_router(ingestion_router)
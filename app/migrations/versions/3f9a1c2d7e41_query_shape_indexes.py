@@ -0,0 +1,52 @@
+"""Query shape indexes
+
+Revision ID: 3f9a1c2d7e41
+Revises: 517188ec1bd2
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7e41'
+down_revision: Union[str, Sequence[str], None] = '517188ec1bd2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_spimex_trading_results_date_id', 'spimex_trading_results',
+                    [sa.text('date DESC'), 'id'], unique=False)
+    op.create_index('ix_spimex_trading_results_oil_id_date_id', 'spimex_trading_results',
+                    ['oil_id', sa.text('date DESC'), 'id'], unique=False)
+    op.create_index('ix_spimex_trading_results_delivery_basis_id_date_id', 'spimex_trading_results',
+                    ['delivery_basis_id', sa.text('date DESC'), 'id'], unique=False)
+    op.create_index('ix_spimex_trading_results_delivery_type_id_date_id', 'spimex_trading_results',
+                    ['delivery_type_id', sa.text('date DESC'), 'id'], unique=False)
+
+    # перекрываются составными индексами выше (или первичным ключом)
+    op.drop_index(op.f('ix_spimex_trading_results_id'), table_name='spimex_trading_results')
+    op.drop_index(op.f('ix_spimex_trading_results_date'), table_name='spimex_trading_results')
+    op.drop_index(op.f('ix_spimex_trading_results_oil_id'), table_name='spimex_trading_results')
+    op.drop_index(op.f('ix_spimex_trading_results_delivery_basis_id'), table_name='spimex_trading_results')
+
+    op.execute('ANALYZE spimex_trading_results')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_spimex_trading_results_delivery_basis_id'), 'spimex_trading_results',
+                    ['delivery_basis_id'], unique=False)
+    op.create_index(op.f('ix_spimex_trading_results_oil_id'), 'spimex_trading_results', ['oil_id'], unique=False)
+    op.create_index(op.f('ix_spimex_trading_results_date'), 'spimex_trading_results', ['date'], unique=False)
+    op.create_index(op.f('ix_spimex_trading_results_id'), 'spimex_trading_results', ['id'], unique=False)
+
+    op.drop_index('ix_spimex_trading_results_delivery_type_id_date_id', table_name='spimex_trading_results')
+    op.drop_index('ix_spimex_trading_results_delivery_basis_id_date_id', table_name='spimex_trading_results')
+    op.drop_index('ix_spimex_trading_results_oil_id_date_id', table_name='spimex_trading_results')
+    op.drop_index('ix_spimex_trading_results_date_id', table_name='spimex_trading_results')
@@ -0,0 +1,95 @@
+"""Instrument and delivery basis dimensions
+
+Revision ID: 5b8d2f4a6c13
+Revises: e7a3f5c2b918
+Create Date: 2026-10-19 16:05:42.318407
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8d2f4a6c13'
+down_revision: Union[str, Sequence[str], None] = 'e7a3f5c2b918'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('spimex_instruments',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('exchange_product_id', sa.String(length=20), nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('exchange_product_id', 'name', name='uq_spimex_instruments_code_name')
+    )
+    op.create_table('spimex_delivery_bases',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.execute("""
+        INSERT INTO spimex_instruments (exchange_product_id, name)
+        SELECT DISTINCT exchange_product_id, exchange_product_name
+        FROM spimex_trading_results
+        WHERE exchange_product_id IS NOT NULL AND exchange_product_name IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO spimex_delivery_bases (name)
+        SELECT DISTINCT delivery_basis_name
+        FROM spimex_trading_results
+        WHERE delivery_basis_name IS NOT NULL
+    """)
+
+    # колонки добавляются в секционированную таблицу и сразу во все партиции
+    op.add_column('spimex_trading_results', sa.Column('instrument_key', sa.Integer(), nullable=True))
+    op.add_column('spimex_trading_results', sa.Column('delivery_basis_key', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE spimex_trading_results AS r
+        SET instrument_key = i.id
+        FROM spimex_instruments AS i
+        WHERE i.exchange_product_id = r.exchange_product_id AND i.name = r.exchange_product_name
+    """)
+    op.execute("""
+        UPDATE spimex_trading_results AS r
+        SET delivery_basis_key = b.id
+        FROM spimex_delivery_bases AS b
+        WHERE b.name = r.delivery_basis_name
+    """)
+    op.create_foreign_key('fk_spimex_trading_results_instrument_key', 'spimex_trading_results',
+                          'spimex_instruments', ['instrument_key'], ['id'])
+    op.create_foreign_key('fk_spimex_trading_results_delivery_basis_key', 'spimex_trading_results',
+                          'spimex_delivery_bases', ['delivery_basis_key'], ['id'])
+    # место в партициях освобождается после VACUUM FULL (или pg_repack) каждой партиции
+    op.drop_column('spimex_trading_results', 'exchange_product_name')
+    op.drop_column('spimex_trading_results', 'delivery_basis_name')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('spimex_trading_results', sa.Column('exchange_product_name', sa.Text(), nullable=True))
+    op.add_column('spimex_trading_results', sa.Column('delivery_basis_name', sa.Text(), nullable=True))
+    op.execute("""
+        UPDATE spimex_trading_results AS r
+        SET exchange_product_name = i.name
+        FROM spimex_instruments AS i
+        WHERE i.id = r.instrument_key
+    """)
+    op.execute("""
+        UPDATE spimex_trading_results AS r
+        SET delivery_basis_name = b.name
+        FROM spimex_delivery_bases AS b
+        WHERE b.id = r.delivery_basis_key
+    """)
+    op.drop_constraint('fk_spimex_trading_results_delivery_basis_key', 'spimex_trading_results',
+                       type_='foreignkey')
+    op.drop_constraint('fk_spimex_trading_results_instrument_key', 'spimex_trading_results', type_='foreignkey')
+    op.drop_column('spimex_trading_results', 'delivery_basis_key')
+    op.drop_column('spimex_trading_results', 'instrument_key')
+    op.drop_table('spimex_delivery_bases')
+    op.drop_table('spimex_instruments')
@@ -0,0 +1,146 @@
+"""Partition trading results by month
+
+date becomes part of the primary key and cannot be NULL. If the table has rows
+without a date, the upgrade stops before changing anything: fix or delete them
+first (SELECT * FROM spimex_trading_results WHERE date IS NULL).
+
+Revision ID: 8c2e4b7d1a90
+Revises: 3f9a1c2d7e41
+Create Date: 2026-10-19 11:03:54.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e4b7d1a90'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "id, exchange_product_id, exchange_product_name, oil_id, delivery_basis_id, delivery_basis_name, "
+    "delivery_type_id, volume, total, count, date, created_on, updated_on"
+)
+
+INDEXES = (
+    ('ix_spimex_trading_results_exchange_product_id', ['exchange_product_id']),
+    ('ix_spimex_trading_results_date_id', [sa.text('date DESC'), 'id']),
+    ('ix_spimex_trading_results_oil_id_date_id', ['oil_id', sa.text('date DESC'), 'id']),
+    ('ix_spimex_trading_results_delivery_basis_id_date_id', ['delivery_basis_id', sa.text('date DESC'), 'id']),
+    ('ix_spimex_trading_results_delivery_type_id_date_id', ['delivery_type_id', sa.text('date DESC'), 'id']),
+)
+
+# партиции на каждый месяц имеющихся данных плюс текущий и два следующих
+CREATE_MONTH_PARTITIONS = """
+DO $$
+DECLARE
+    month_start date;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(min(date), current_date), current_date)),
+            date_trunc('month', GREATEST(COALESCE(max(date), current_date), current_date)) + interval '2 months',
+            interval '1 month'
+        )::date
+        FROM spimex_trading_results_legacy
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF spimex_trading_results FOR VALUES FROM (%L) TO (%L)',
+            'spimex_trading_results_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+            month_start,
+            (month_start + interval '1 month')::date
+        );
+    END LOOP;
+END $$;
+"""
+
+
+def _drop_indexes() -> None:
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='spimex_trading_results_legacy')
+
+
+def _create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'spimex_trading_results', columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # строки без даты некуда положить: молча терять их при копировании нельзя
+    undated = op.get_bind().execute(
+        sa.text("SELECT count(*) FROM spimex_trading_results WHERE date IS NULL")
+    ).scalar()
+    if undated:
+        raise RuntimeError(
+            f"В spimex_trading_results {undated} строк без даты: исправьте или удалите их перед секционированием"
+        )
+    op.rename_table('spimex_trading_results', 'spimex_trading_results_legacy')
+    op.drop_constraint('spimex_trading_results_pkey', 'spimex_trading_results_legacy', type_='primary')
+    _drop_indexes()
+
+    # ключ секционирования обязан входить в первичный ключ; последовательность id переиспользуем
+    op.create_table('spimex_trading_results',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('spimex_trading_results_id_seq')"),
+              nullable=False),
+    sa.Column('exchange_product_id', sa.String(length=20), nullable=True),
+    sa.Column('exchange_product_name', sa.Text(), nullable=True),
+    sa.Column('oil_id', sa.String(length=10), nullable=True),
+    sa.Column('delivery_basis_id', sa.String(length=10), nullable=True),
+    sa.Column('delivery_basis_name', sa.Text(), nullable=True),
+    sa.Column('delivery_type_id', sa.String(length=5), nullable=True),
+    sa.Column('volume', sa.Numeric(precision=20, scale=2), nullable=True),
+    sa.Column('total', sa.Numeric(precision=20, scale=2), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('created_on', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_on', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'date'),
+    postgresql_partition_by='RANGE (date)'
+    )
+    op.execute("ALTER SEQUENCE spimex_trading_results_id_seq OWNED BY spimex_trading_results.id")
+    op.execute(CREATE_MONTH_PARTITIONS)
+    op.execute(
+        f"INSERT INTO spimex_trading_results ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM spimex_trading_results_legacy"
+    )
+    op.drop_table('spimex_trading_results_legacy')
+    _create_indexes()
+    op.execute('ANALYZE spimex_trading_results')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table('spimex_trading_results', 'spimex_trading_results_legacy')
+    op.drop_constraint('spimex_trading_results_pkey', 'spimex_trading_results_legacy', type_='primary')
+    _drop_indexes()
+
+    op.create_table('spimex_trading_results',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('spimex_trading_results_id_seq')"),
+              nullable=False),
+    sa.Column('exchange_product_id', sa.String(length=20), nullable=True),
+    sa.Column('exchange_product_name', sa.Text(), nullable=True),
+    sa.Column('oil_id', sa.String(length=10), nullable=True),
+    sa.Column('delivery_basis_id', sa.String(length=10), nullable=True),
+    sa.Column('delivery_basis_name', sa.Text(), nullable=True),
+    sa.Column('delivery_type_id', sa.String(length=5), nullable=True),
+    sa.Column('volume', sa.Numeric(precision=20, scale=2), nullable=True),
+    sa.Column('total', sa.Numeric(precision=20, scale=2), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('created_on', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_on', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("ALTER SEQUENCE spimex_trading_results_id_seq OWNED BY spimex_trading_results.id")
+    op.execute(
+        f"INSERT INTO spimex_trading_results ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM spimex_trading_results_legacy"
+    )
+    op.drop_table('spimex_trading_results_legacy')
+    _create_indexes()
+    op.execute('ANALYZE spimex_trading_results')
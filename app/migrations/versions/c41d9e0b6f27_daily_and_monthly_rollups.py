@@ -0,0 +1,70 @@
+"""Daily and monthly rollups
+
+Revision ID: c41d9e0b6f27
+Revises: 8c2e4b7d1a90
+Create Date: 2026-10-19 12:20:08.733195
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d9e0b6f27'
+down_revision: Union[str, Sequence[str], None] = '8c2e4b7d1a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rollup_columns(period: str) -> list:
+    return [
+        sa.Column(period, sa.Date(), nullable=False),
+        sa.Column('oil_id', sa.String(length=10), nullable=False),
+        sa.Column('delivery_basis_id', sa.String(length=10), nullable=False),
+        sa.Column('delivery_type_id', sa.String(length=5), nullable=False),
+        sa.Column('volume', sa.Numeric(precision=20, scale=2), nullable=True),
+        sa.Column('total', sa.Numeric(precision=20, scale=2), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.Column('updated_on', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint(period, 'oil_id', 'delivery_basis_id', 'delivery_type_id'),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('spimex_daily_rollups', *_rollup_columns('date'))
+    op.create_index('ix_spimex_daily_rollups_oil_id_date', 'spimex_daily_rollups',
+                    ['oil_id', 'date'], unique=False)
+    op.create_index('ix_spimex_daily_rollups_delivery_basis_id_date', 'spimex_daily_rollups',
+                    ['delivery_basis_id', 'date'], unique=False)
+    op.create_index('ix_spimex_daily_rollups_delivery_type_id_date', 'spimex_daily_rollups',
+                    ['delivery_type_id', 'date'], unique=False)
+    op.create_table('spimex_monthly_rollups', *_rollup_columns('month'))
+
+    op.execute("""
+        INSERT INTO spimex_daily_rollups (date, oil_id, delivery_basis_id, delivery_type_id, volume, total, count)
+        SELECT date, coalesce(oil_id, ''), coalesce(delivery_basis_id, ''), coalesce(delivery_type_id, ''),
+               sum(volume), sum(total), sum(count)
+        FROM spimex_trading_results
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO spimex_monthly_rollups (month, oil_id, delivery_basis_id, delivery_type_id, volume, total, count)
+        SELECT date_trunc('month', date)::date, oil_id, delivery_basis_id, delivery_type_id,
+               sum(volume), sum(total), sum(count)
+        FROM spimex_daily_rollups
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute('ANALYZE spimex_daily_rollups')
+    op.execute('ANALYZE spimex_monthly_rollups')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spimex_monthly_rollups')
+    op.drop_index('ix_spimex_daily_rollups_delivery_type_id_date', table_name='spimex_daily_rollups')
+    op.drop_index('ix_spimex_daily_rollups_delivery_basis_id_date', table_name='spimex_daily_rollups')
+    op.drop_index('ix_spimex_daily_rollups_oil_id_date', table_name='spimex_daily_rollups')
+    op.drop_table('spimex_daily_rollups')
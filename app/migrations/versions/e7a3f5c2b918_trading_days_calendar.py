@@ -0,0 +1,42 @@
+"""Trading days calendar
+
+Revision ID: e7a3f5c2b918
+Revises: c41d9e0b6f27
+Create Date: 2026-10-19 13:41:17.550862
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3f5c2b918'
+down_revision: Union[str, Sequence[str], None] = 'c41d9e0b6f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('spimex_trading_days',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=True),
+    sa.Column('volume', sa.Numeric(precision=20, scale=2), nullable=True),
+    sa.Column('total', sa.Numeric(precision=20, scale=2), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('updated_on', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('date')
+    )
+    op.execute("""
+        INSERT INTO spimex_trading_days (date, rows, volume, total, count)
+        SELECT date, count(*), sum(volume), sum(total), sum(count)
+        FROM spimex_trading_results
+        GROUP BY date
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spimex_trading_days')
@@ -1,21 +1,97 @@
-from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, func, Text
+from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, func, Text, Index, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import declarative_base
 from .database import Base
 
 
+class SpimexInstrument(Base):
+    __tablename__ = 'spimex_instruments'
+    __table_args__ = (UniqueConstraint('exchange_product_id', 'name', name='uq_spimex_instruments_code_name'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    exchange_product_id = Column(String(20), nullable=False)
+    name = Column(Text, nullable=False)
+
+
+class SpimexDeliveryBasis(Base):
+    __tablename__ = 'spimex_delivery_bases'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(Text, nullable=False, unique=True)
+
+
 class SpimexTradingResult(Base):
     __tablename__ = 'spimex_trading_results'
+    # помесячное секционирование по дате, партиции создаёт services/partitions.py
+    __table_args__ = {'postgresql_partition_by': 'RANGE (date)'}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     exchange_product_id = Column(String(20), index=True)
-    exchange_product_name = Column(Text)
-    oil_id = Column(String(10), index=True)
-    delivery_basis_id = Column(String(10), index=True)
-    delivery_basis_name = Column(Text)
+    # названия инструмента и базиса вынесены в таблицы-измерения, в строке торгов — только ключи
+    instrument_key = Column(Integer, ForeignKey('spimex_instruments.id'))
+    oil_id = Column(String(10))
+    delivery_basis_id = Column(String(10))
+    delivery_basis_key = Column(Integer, ForeignKey('spimex_delivery_bases.id'))
     delivery_type_id = Column(String(5))
     volume = Column(Numeric(20, 2))
     total = Column(Numeric(20, 2))
     count = Column(Integer)
-    date = Column(Date, index=True)
+    date = Column(Date, primary_key=True)
     created_on = Column(DateTime, server_default=func.now())
     updated_on = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# Индексы под реальные запросы: диапазон дат + опциональный id, сортировка "date desc, id".
+# Индекс по дате заодно покрывает выборку последних торговых дней (index-only scan).
+Index('ix_spimex_trading_results_date_id',
+      SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+Index('ix_spimex_trading_results_oil_id_date_id',
+      SpimexTradingResult.oil_id, SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+Index('ix_spimex_trading_results_delivery_basis_id_date_id',
+      SpimexTradingResult.delivery_basis_id, SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+Index('ix_spimex_trading_results_delivery_type_id_date_id',
+      SpimexTradingResult.delivery_type_id, SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+
+
+class SpimexDailyRollup(Base):
+    __tablename__ = 'spimex_daily_rollups'
+
+    date = Column(Date, primary_key=True)
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(5), primary_key=True)
+    volume = Column(Numeric(20, 2))
+    total = Column(Numeric(20, 2))
+    count = Column(Integer)
+    updated_on = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class SpimexMonthlyRollup(Base):
+    __tablename__ = 'spimex_monthly_rollups'
+
+    month = Column(Date, primary_key=True)
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(5), primary_key=True)
+    volume = Column(Numeric(20, 2))
+    total = Column(Numeric(20, 2))
+    count = Column(Integer)
+    updated_on = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+
+class SpimexTradingDay(Base):
+    __tablename__ = 'spimex_trading_days'
+
+    date = Column(Date, primary_key=True)
+    rows = Column(Integer)
+    volume = Column(Numeric(20, 2))
+    total = Column(Numeric(20, 2))
+    count = Column(Integer)
+    updated_on = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+Index('ix_spimex_daily_rollups_oil_id_date', SpimexDailyRollup.oil_id, SpimexDailyRollup.date)
+Index('ix_spimex_daily_rollups_delivery_basis_id_date',
+      SpimexDailyRollup.delivery_basis_id, SpimexDailyRollup.date)
+Index('ix_spimex_daily_rollups_delivery_type_id_date',
+      SpimexDailyRollup.delivery_type_id, SpimexDailyRollup.date)
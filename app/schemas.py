@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Literal
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -50,6 +50,15 @@ class LastTradingDatesResponse(BaseModel):
     count: int
 
 
+class TradingDayResponse(BaseModel):
+    date: str
+    is_trading_day: bool
+    rows: int
+    volume: Optional[float]
+    total: Optional[float]
+    count: int
+
+
 class DynamicsRequest(BaseModel):
     start_date: date = Field(..., description="обязательно")
     end_date: date = Field(..., description="обязательно")
@@ -63,6 +72,30 @@ class DynamicsResponse(BaseModel):
     count: int
 
 
+class DynamicsBatchItem(DynamicsRequest):
+    key: Optional[str] = Field(None, description="опционально, ключ фильтра в ответе (по умолчанию его номер)")
+
+
+class DynamicsBatchRequest(BaseModel):
+    filters: List[DynamicsBatchItem] = Field(..., min_length=1, max_length=100, description="от 1 до 100 фильтров")
+
+
+class DynamicsBatchResponse(BaseModel):
+    results: Dict[str, DynamicsResponse]
+    count: int
+
+
+class ExportRequest(BaseModel):
+    format: Literal["csv", "parquet", "arrow"] = Field("csv", description="csv, parquet или arrow (нужен pyarrow)")
+    start_date: Optional[date] = Field(None, description="опционально")
+    end_date: Optional[date] = Field(None, description="опционально")
+    oil_id: Optional[str] = Field(None, description="опционально")
+    delivery_type_id: Optional[str] = Field(None, description="опционально")
+    delivery_basis_id: Optional[str] = Field(None, description="опционально")
+    min_id: Optional[int] = Field(None, ge=1, description="опционально, id от")
+    max_id: Optional[int] = Field(None, ge=1, description="опционально, id до")
+
+
 class TradingResultsRequest(BaseModel):
     oil_id: Optional[str] = Field(None, description="опционально")
     delivery_type_id: Optional[str] = Field(None, description="опционально")
@@ -73,3 +106,97 @@ class TradingResultsRequest(BaseModel):
 class TradingResultsResponse(BaseModel):
     results: List[TradingResultResponse]
     count: int
+
+
+class SeriesRequest(BaseModel):
+    start_date: date = Field(..., description="обязательно")
+    end_date: date = Field(..., description="обязательно")
+    granularity: Literal["day", "month"] = Field("day", description="day или month, по умолчанию day")
+    oil_id: Optional[str] = Field(None, description="опционально")
+    delivery_type_id: Optional[str] = Field(None, description="опционально")
+    delivery_basis_id: Optional[str] = Field(None, description="опционально")
+
+
+class SeriesPoint(BaseModel):
+    period: str
+    volume: Optional[float]
+    total: Optional[float]
+    count: int
+    avg_price: Optional[float]
+
+
+class SeriesResponse(BaseModel):
+    results: List[SeriesPoint]
+    count: int
+
+
+class PriceAnalyticsRequest(BaseModel):
+    start_date: date = Field(..., description="обязательно")
+    end_date: date = Field(..., description="обязательно")
+    oil_id: Optional[str] = Field(None, description="опционально")
+    delivery_type_id: Optional[str] = Field(None, description="опционально")
+    delivery_basis_id: Optional[str] = Field(None, description="опционально")
+    resample: Literal["week", "month"] = Field("week", description="week или month, по умолчанию week")
+    window: int = Field(5, ge=1, le=250, description="окно скользящей VWAP в торговых днях, по умолчанию 5")
+
+
+class DailyPricePoint(BaseModel):
+    date: str
+    volume: Optional[float]
+    total: Optional[float]
+    count: int
+    vwap: Optional[float]
+    min_price: Optional[float]
+    max_price: Optional[float]
+    rolling_vwap: Optional[float]
+
+
+class PriceBand(BaseModel):
+    period: str
+    open: Optional[float]
+    close: Optional[float]
+    min_price: Optional[float]
+    max_price: Optional[float]
+    mean_price: Optional[float]
+    vwap: Optional[float]
+    volume: Optional[float]
+    count: int
+
+
+class PriceAnalyticsResponse(BaseModel):
+    daily: List[DailyPricePoint]
+    bands: List[PriceBand]
+
+
+class AggregateRequest(BaseModel):
+    start_date: date = Field(..., description="обязательно")
+    end_date: date = Field(..., description="обязательно")
+    group_by: List[Literal["oil_id", "delivery_basis_id", "delivery_type_id", "period"]] = Field(
+        ["delivery_basis_id"], max_length=4, description="измерения группировки, period — по bucket; [] — итог")
+    bucket: Literal["day", "week", "month", "year"] = Field("month", description="шаг period, по умолчанию month")
+    metrics: List[Literal["volume", "total", "count", "vwap"]] = Field(
+        ["volume", "total", "count", "vwap"], min_length=1, max_length=4, description="по умолчанию все")
+    order_by: Optional[Literal["volume", "total", "count", "vwap"]] = Field(
+        "total", description="метрика для top-N, по умолчанию total; null — по ключам группы")
+    order: Literal["desc", "asc"] = Field("desc", description="по умолчанию desc")
+    limit: int = Field(20, ge=1, le=1000, description="по умолчанию 20")
+    oil_id: Optional[str] = Field(None, description="опционально")
+    delivery_type_id: Optional[str] = Field(None, description="опционально")
+    delivery_basis_id: Optional[str] = Field(None, description="опционально")
+
+
+class AggregateRow(BaseModel):
+    # в ответе только запрошенные измерения и метрики
+    oil_id: Optional[str] = None
+    delivery_basis_id: Optional[str] = None
+    delivery_type_id: Optional[str] = None
+    period: Optional[str] = None
+    volume: Optional[float] = None
+    total: Optional[float] = None
+    count: Optional[int] = None
+    vwap: Optional[float] = None
+
+
+class AggregateResponse(BaseModel):
+    results: List[AggregateRow]
+    count: int
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Tuple, AsyncIterator
+import redis.asyncio as redis
+from fastapi import HTTPException
+from ..config import (
+    RATE_LIMIT_HEAVY_RATE, RATE_LIMIT_HEAVY_BURST, RATE_LIMIT_LIGHT_RATE, RATE_LIMIT_LIGHT_BURST,
+    RATE_LIMIT_INGEST_RATE, RATE_LIMIT_INGEST_BURST,
+    DB_MISS_CONCURRENCY, DB_MISS_WAIT_MS, DB_MISS_RETRY_AFTER
+)
+from .redis_client import get_redis
+from ..utils.logger import logger
+from ..utils.metrics import ADMISSION_REJECTED
+
+RATE_LIMIT_PREFIX = "trading_meta:ratelimit"
+# класс эндпоинтов -> (токенов в секунду, ёмкость корзины)
+ENDPOINT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "heavy": (RATE_LIMIT_HEAVY_RATE, RATE_LIMIT_HEAVY_BURST),
+    "light": (RATE_LIMIT_LIGHT_RATE, RATE_LIMIT_LIGHT_BURST),
+    "ingest": (RATE_LIMIT_INGEST_RATE, RATE_LIMIT_INGEST_BURST),
+}
+HEAVY_PREFIXES = ("/trading/dynamics", "/trading/series", "/trading/analytics", "/trading/export",
+                  "/trading/aggregates")
+INGEST_PREFIXES = ("/download-reports", "/process-reports", "/ingest/")
+
+# Корзина токенов в hash {tokens, ts}: пополнение по времени Redis, проверка и списание — одним скриптом,
+# поэтому лимит общий для всех реплик. Возвращает {1, 0} или {0, секунд до появления токена}.
+TOKEN_BUCKET_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+def endpoint_class(path: str) -> Optional[str]:
+    # None — эндпоинт не ограничивается (метрики, документация)
+    if path.startswith(INGEST_PREFIXES):
+        return "ingest"
+    if path.startswith(HEAVY_PREFIXES):
+        return "heavy"
+    if path.startswith("/trading/"):
+        return "light"
+    return None
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class Overloaded(HTTPException):
+    # 503 с Retry-After: эндпоинты пропускают HTTPException как есть, поэтому он не превращается в 500
+    def __init__(self, retry_after: float = DB_MISS_RETRY_AFTER, detail: str = "Сервис перегружен, повторите позже"):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": retry_after_header(retry_after)})
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    # Лимиты на клиента и класс эндпоинтов. Если Redis недоступен, запросы пропускаются:
+    # ограничение нагрузки не должно само становиться причиной отказа.
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None, error_log_interval: float = 60):
+        self.limits = limits or ENDPOINT_LIMITS
+        self.redis: Optional[redis.Redis] = None
+        self.error_log_interval = error_log_interval
+        self._last_error_logged = 0.0
+
+    def _get_redis(self) -> redis.Redis:
+        if self.redis is None:
+            self.redis = get_redis()
+        return self.redis
+
+    @staticmethod
+    def client_key(api_key: Optional[str], address: Optional[str]) -> str:
+        # ключ API в Redis не хранится в открытом виде
+        if api_key:
+            return "key:" + hashlib.sha1(api_key.encode()).hexdigest()[:16]
+        return f"ip:{address or 'unknown'}"
+
+    async def check(self, client: str, endpoint: str, cost: float = 1) -> Optional[float]:
+        # None — запрос допущен, иначе через сколько секунд повторить
+        rate, burst = self.limits[endpoint]
+        try:
+            allowed, retry_after = await self._get_redis().eval(
+                TOKEN_BUCKET_SCRIPT, 1, f"{RATE_LIMIT_PREFIX}:{endpoint}:{client}", rate, burst, cost)
+        except Exception as e:
+            now = time.monotonic()
+            if now - self._last_error_logged >= self.error_log_interval:
+                self._last_error_logged = now
+                logger.error(f"Ограничение нагрузки отключено, Redis недоступен: {e}")
+            return None
+        if int(allowed):
+            return None
+        ADMISSION_REJECTED.inc(reason="rate_limit", endpoint_class=endpoint)
+        return float(retry_after)
+
+    async def close(self):
+        self.redis = None
+
+
+class DbGate:
+    # Не больше limit одновременных SQL-запросов на промахах кэша в процессе. Промах, не получивший слот
+    # за wait_ms, получает 503, а не встаёт в очередь пула: пул и Postgres не тонут во всплеске
+    # некэшированных запросов, а попадания в кэш и загрузка отчётов (свой пул) идут без задержек.
+    def __init__(self, limit: int = DB_MISS_CONCURRENCY, wait_ms: float = DB_MISS_WAIT_MS,
+                 retry_after: float = DB_MISS_RETRY_AFTER):
+        self.limit = limit
+        self.wait = wait_ms / 1000
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        if self._semaphore is None:
+            yield
+            return
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.wait)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.inc(reason="db_busy", endpoint_class="db_miss")
+            raise Overloaded(self.retry_after)
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+rate_limiter = RateLimiter()
+db_miss_gate = DbGate()
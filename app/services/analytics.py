@@ -0,0 +1,163 @@
+from datetime import date
+from typing import List, Optional, Dict, Any, Sequence
+import numpy as np
+from sqlalchemy import select, and_, cast, Float, Select
+from ..models import SpimexTradingResult
+from .queries import build_filters
+
+RESAMPLE_PERIODS = ("week", "month")
+
+
+def price_series_query(
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None
+) -> Select:
+    # только то, что нужно для расчёта цен; numeric сразу приводим к float на стороне БД
+    conditions = build_filters(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    return select(
+        SpimexTradingResult.date,
+        cast(SpimexTradingResult.volume, Float),
+        cast(SpimexTradingResult.total, Float),
+        SpimexTradingResult.count,
+    ).where(and_(*conditions))
+
+
+def _group_bounds(keys: np.ndarray):
+    # keys отсортированы; возвращает уникальные ключи и начала групп для reduceat
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    return keys[starts], starts
+
+
+def _iso(days: np.ndarray) -> List[str]:
+    return np.datetime_as_string(days.astype("datetime64[D]"), unit="D").tolist()
+
+
+def _nullable(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    rounded = np.round(values, digits)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class PriceAnalytics:
+    def __init__(self, days: np.ndarray, volume: np.ndarray, total: np.ndarray, count: np.ndarray):
+        # days — дни от 1970-01-01 (int64); None в объёмах/суммах уже превращены в NaN
+        order = np.argsort(days, kind="stable")
+        self.days = days[order]
+        self.volume = volume[order]
+        self.total = total[order]
+        self.count = np.nan_to_num(count[order])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # цена за тонну по каждой сделке; при нулевом объёме — NaN
+            self.price = np.where(self.volume > 0, self.total / self.volume, np.nan)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[Any]]) -> "PriceAnalytics":
+        # строки (date, volume, total, count) раскладываются по колонкам за один проход на колонку;
+        # np.array(..., dtype=float64) сам превращает None в NaN
+        n = len(rows)
+        days = np.fromiter((row[0].toordinal() for row in rows), dtype=np.int64, count=n) - EPOCH_ORDINAL
+        volume = np.array([row[1] for row in rows], dtype=np.float64)
+        total = np.array([row[2] for row in rows], dtype=np.float64)
+        count = np.array([row[3] for row in rows], dtype=np.float64)
+        return cls(days, volume, total, count)
+
+    def daily(self, window: int = 5) -> Dict[str, np.ndarray]:
+        if not len(self.days):
+            empty = np.array([], dtype=np.float64)
+            return {"days": np.array([], dtype=np.int64), "volume": empty, "total": empty, "count": empty,
+                    "vwap": empty, "min": empty, "max": empty, "rolling_vwap": empty}
+        days, starts = _group_bounds(self.days)
+        valid = ~np.isnan(self.price)
+        volume = np.add.reduceat(np.where(valid, self.volume, 0.0), starts)
+        total = np.add.reduceat(np.where(valid, self.total, 0.0), starts)
+        count = np.add.reduceat(self.count, starts)
+        with np.errstate(divide="ignore", invalid="ignore", all="ignore"):
+            vwap = np.where(volume > 0, total / volume, np.nan)
+            low = np.fmin.reduceat(self.price, starts)
+            high = np.fmax.reduceat(self.price, starts)
+        return {"days": days, "volume": volume, "total": total, "count": count, "vwap": vwap,
+                "min": low, "max": high, "rolling_vwap": self.rolling_mean(vwap, window)}
+
+    @staticmethod
+    def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+        # скользящее среднее по последним window торговым дням, пропуски (NaN) не учитываются
+        valid = ~np.isnan(values)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(valid)))
+        idx = np.arange(1, len(values) + 1)
+        lower = np.maximum(idx - window, 0)
+        window_counts = counts[idx] - counts[lower]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(window_counts > 0, (sums[idx] - sums[lower]) / window_counts, np.nan)
+
+    @staticmethod
+    def period_keys(days: np.ndarray, period: str) -> np.ndarray:
+        if period == "week":
+            # 1970-01-01 — четверг; ключ недели — её понедельник
+            return days - (days + 3) % 7
+        if period == "month":
+            months = days.astype("datetime64[D]").astype("datetime64[M]")
+            return months.astype("datetime64[D]").astype(np.int64)
+        raise ValueError(f"Неизвестный период: {period}")
+
+    def bands(self, daily: Dict[str, np.ndarray], period: str) -> Dict[str, np.ndarray]:
+        if not len(daily["days"]):
+            return {"periods": np.array([], dtype=np.int64)}
+        keys = self.period_keys(daily["days"], period)
+        periods, starts = _group_bounds(keys)
+        ends = np.concatenate((starts[1:], [len(keys)])) - 1
+        vwap = daily["vwap"]
+        valid = ~np.isnan(vwap)
+        volume = np.add.reduceat(daily["volume"], starts)
+        total = np.add.reduceat(daily["total"], starts)
+        valid_days = np.add.reduceat(valid.astype(np.int64), starts)
+        # open/close — первый и последний день периода, в котором была цена
+        positions = np.arange(len(vwap))
+        last_valid = np.maximum.accumulate(np.where(valid, positions, -1))
+        next_valid = np.minimum.accumulate(np.where(valid, positions, len(vwap))[::-1])[::-1]
+        open_idx, close_idx = next_valid[starts], last_valid[ends]
+        has_price = valid_days > 0
+        padded = np.append(vwap, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore", all="ignore"):
+            mean = np.add.reduceat(np.where(valid, vwap, 0.0), starts) / valid_days
+            return {
+                "periods": periods,
+                "open": np.where(has_price, padded[np.minimum(open_idx, len(vwap))], np.nan),
+                "close": np.where(has_price, padded[close_idx], np.nan),
+                "min": np.fmin.reduceat(daily["min"], starts),
+                "max": np.fmax.reduceat(daily["max"], starts),
+                "mean": np.where(has_price, mean, np.nan),
+                "vwap": np.where(volume > 0, total / volume, np.nan),
+                "volume": volume,
+                "count": np.add.reduceat(daily["count"], starts),
+            }
+
+    def compute(self, resample: str = "week", window: int = 5) -> Dict[str, Any]:
+        daily = self.daily(window)
+        bands = self.bands(daily, resample)
+        daily_results = [
+            {"date": d, "volume": v, "total": t, "count": int(c), "vwap": w, "min_price": lo,
+             "max_price": hi, "rolling_vwap": r}
+            for d, v, t, c, w, lo, hi, r in zip(
+                _iso(daily["days"]), _nullable(daily["volume"]), _nullable(daily["total"]),
+                daily["count"].tolist(), _nullable(daily["vwap"]), _nullable(daily["min"]),
+                _nullable(daily["max"]), _nullable(daily["rolling_vwap"])
+            )
+        ]
+        band_results = []
+        if len(bands["periods"]):
+            band_results = [
+                {"period": p, "open": o, "close": c, "min_price": lo, "max_price": hi, "mean_price": m,
+                 "vwap": w, "volume": v, "count": int(n)}
+                for p, o, c, lo, hi, m, w, v, n in zip(
+                    _iso(bands["periods"]), _nullable(bands["open"]), _nullable(bands["close"]),
+                    _nullable(bands["min"]), _nullable(bands["max"]), _nullable(bands["mean"]),
+                    _nullable(bands["vwap"]), _nullable(bands["volume"]), bands["count"].tolist()
+                )
+            ]
+        return {"daily": daily_results, "bands": band_results}
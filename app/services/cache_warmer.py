@@ -0,0 +1,133 @@
+import asyncio
+import json
+from collections import Counter
+from datetime import date, timedelta
+from typing import List, Dict, Any, Tuple, Optional, Iterable
+from .trading_service import TradingService, query_stats, exchange_today
+from ..database import fresh_read_session
+from ..utils.logger import logger
+
+DEFAULT_WINDOWS = (7, 30, 90)
+DATED_METHODS = ("dynamics", "series", "price_analytics", "aggregates")
+
+
+class CacheWarmer:
+    def __init__(self, top_n: int = 50, concurrency: int = 4, top_oil_ids: int = 10,
+                 windows: Tuple[int, ...] = DEFAULT_WINDOWS):
+        self.top_n = top_n
+        self.concurrency = concurrency
+        self.top_oil_ids = top_oil_ids
+        self.windows = windows
+        # прогрев не должен попадать в статистику запросов, по которой сам же и строится
+        self.trading_service = TradingService(record_queries=False, session_factory=fresh_read_session, db_gate=None)
+
+    @staticmethod
+    def _resolve_params(params: Dict[str, Any], today: date) -> Dict[str, Any]:
+        params = dict(params)
+        window_days = params.pop("window_days", None)
+        if window_days is not None:
+            params["start_date"] = (today - timedelta(days=window_days)).isoformat()
+            params["end_date"] = today.isoformat()
+        return params
+
+    async def plan(self) -> List[Tuple[str, Dict[str, Any]]]:
+        redis_client = await self.trading_service._get_redis()
+        # частоты, ещё не отправленные этим процессом, тоже учитываются
+        try:
+            await query_stats.flush(redis_client)
+        except Exception as e:
+            logger.error(f"Ошибка записи статистики запросов: {e}")
+        top = await query_stats.top(redis_client, self.top_n)
+        today = exchange_today()
+
+        queries: List[Tuple[str, Dict[str, Any]]] = [("last_trading_dates", {"limit": 10})]
+        oil_ids: Counter = Counter()
+        for member, score in top:
+            try:
+                query = json.loads(member)
+                method, params = query["method"], query["params"]
+            except (ValueError, KeyError):
+                continue
+            if params.get("oil_id"):
+                oil_ids[params["oil_id"]] += score
+            queries.append((method, self._resolve_params(params, today)))
+
+        # типовые окна 7/30/90 дней для самых популярных oil_id
+        for oil_id, _ in oil_ids.most_common(self.top_oil_ids):
+            for window in self.windows:
+                queries.append(("dynamics", self._resolve_params({
+                    "window_days": window,
+                    "oil_id": oil_id,
+                    "delivery_type_id": "",
+                    "delivery_basis_id": ""
+                }, today)))
+
+        unique = {}
+        for method, params in queries:
+            unique.setdefault(json.dumps([method, params], sort_keys=True), (method, params))
+        return list(unique.values())
+
+    async def _run_query(self, method: str, params: Dict[str, Any]):
+        kwargs: Dict[str, Any] = {k: (v or None) for k, v in params.items()}
+        for key in ("start_date", "end_date"):
+            if kwargs.get(key):
+                kwargs[key] = date.fromisoformat(kwargs[key])
+        for key in ("limit", "window"):
+            if key in kwargs:
+                kwargs[key] = int(params[key])
+
+        if method == "last_trading_dates":
+            await self.trading_service.get_last_trading_dates(**kwargs)
+        elif method == "dynamics":
+            await self.trading_service.get_dynamics(**kwargs)
+        elif method == "trading_results":
+            await self.trading_service.get_trading_results(**kwargs)
+        elif method == "series":
+            await self.trading_service.get_series(**kwargs)
+        elif method == "price_analytics":
+            await self.trading_service.get_price_analytics(**kwargs)
+        elif method == "aggregates":
+            for key in ("group_by", "metrics"):
+                kwargs[key] = params[key].split(",") if params[key] else []
+            await self.trading_service.get_aggregates(**kwargs)
+        else:
+            raise ValueError(f"Неизвестный метод: {method}")
+
+    async def warm(self) -> int:
+        queries = await self.plan()
+        # ограничиваем число одновременных запросов к БД, чтобы прогрев не вытеснил живой трафик
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(method: str, params: Dict[str, Any]) -> bool:
+            async with semaphore:
+                try:
+                    await self._run_query(method, params)
+                    return True
+                except Exception as e:
+                    logger.error(f"Ошибка прогрева {method} {params}: {e}")
+                    return False
+
+        results = await asyncio.gather(*(run(method, params) for method, params in queries))
+        warmed = sum(results)
+        logger.info(f"Кэш прогрет: {warmed} из {len(queries)} запросов")
+        return warmed
+
+    async def close(self):
+        await self.trading_service.close()
+
+
+async def warm_after_ingestion(warmer: Optional[CacheWarmer] = None,
+                               dates: Optional[Iterable[date]] = None) -> int:
+    # dates — какие торговые дни загружены; без них сбрасывается весь кэш
+    warmer = warmer or CacheWarmer()
+    try:
+        if dates is None:
+            await warmer.trading_service.invalidate_cache()
+        else:
+            await warmer.trading_service.invalidate_dates(dates)
+        return await warmer.warm()
+    except Exception as e:
+        logger.error(f"Ошибка прогрева кэша после загрузки: {e}")
+        return 0
+    finally:
+        await warmer.close()
@@ -0,0 +1,199 @@
+import asyncio
+from datetime import date
+from typing import List, Optional, Dict, Any, Sequence, Tuple, Callable
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import fresh_read_session
+from ..models import SpimexTradingResult
+from .queries import RESULT_COLUMNS, select_results
+from .data_version import data_version
+from ..utils.logger import logger
+from ..utils.timing import span
+
+# NULL в count; NULL в volume/total хранится как NaN, в текстовых колонках — как None в словаре
+NULL_COUNT = -1
+
+
+def _encode(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[Optional[str]], Dict[str, int]]:
+    # словарное кодирование: коды int32 и список уникальных значений
+    uniques: Dict[Optional[str], int] = {}
+    codes = np.fromiter((uniques.setdefault(v, len(uniques)) for v in values), dtype=np.int32, count=len(values))
+    dictionary = list(uniques)
+    return codes, dictionary, {v: code for code, v in enumerate(dictionary) if v is not None}
+
+
+def _float(value) -> float:
+    return float(value) if value is not None else np.nan
+
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    result = values.tolist()
+    if np.isnan(values).any():
+        result = [None if v != v else v for v in result]
+    return result
+
+
+class ColumnarSnapshot:
+    # Вся история торгов в NumPy-колонках, отсортированная как ответ /trading/dynamics/: date desc, id.
+    # Диапазон дат — бинарный поиск по отрицательному номеру дня (массив возрастает),
+    # фильтры по id — сравнение кодов словаря, т.е. булевы маски без обращения к Postgres и Redis.
+    def __init__(self, rows: Sequence[Sequence[Any]], version: int = 0):
+        self.version = version
+        self.size = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(RESULT_COLUMNS)
+        (ids, product_ids, product_names, oil_ids, basis_ids, basis_names, type_ids,
+         volumes, totals, counts, dates, created, updated) = columns
+
+        self.ids = np.fromiter(ids, dtype=np.int64, count=self.size)
+        self.neg_days = np.fromiter((-d.toordinal() for d in dates), dtype=np.int32, count=self.size)
+        self.volume = np.fromiter((_float(v) for v in volumes), dtype=np.float64, count=self.size)
+        self.total = np.fromiter((_float(v) for v in totals), dtype=np.float64, count=self.size)
+        self.count = np.fromiter((NULL_COUNT if c is None else c for c in counts), dtype=np.int32,
+                                 count=self.size)
+
+        self.oil_codes, self.oil_dict, self.oil_lookup = _encode(oil_ids)
+        self.basis_codes, self.basis_dict, self.basis_lookup = _encode(basis_ids)
+        self.type_codes, self.type_dict, self.type_lookup = _encode(type_ids)
+        self.product_codes, self.product_dict, _ = _encode(product_ids)
+        self.product_name_codes, self.product_name_dict, _ = _encode(product_names)
+        self.basis_name_codes, self.basis_name_dict, _ = _encode(basis_names)
+        # даты и время создания уже строками, как в ответе API
+        self.day_codes, self.day_dict, _ = _encode([d.isoformat() for d in dates])
+        self.created_codes, self.created_dict, _ = _encode([c.isoformat() if c else None for c in created])
+        self.updated_codes, self.updated_dict, _ = _encode([u.isoformat() if u else None for u in updated])
+
+        order = np.lexsort((self.ids, self.neg_days))
+        if not np.array_equal(order, np.arange(self.size)):
+            raise ValueError("Строки снимка должны быть отсортированы по date desc, id")
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in vars(self) if isinstance(getattr(self, name), np.ndarray))
+
+    def _mask(self, lo: int, hi: int, oil_id: Optional[str], delivery_type_id: Optional[str],
+              delivery_basis_id: Optional[str]) -> Optional[np.ndarray]:
+        # маска строк [lo, hi), прошедших фильтры; None — фильтров нет
+        mask = None
+        for value, codes, lookup in ((oil_id, self.oil_codes, self.oil_lookup),
+                                     (delivery_type_id, self.type_codes, self.type_lookup),
+                                     (delivery_basis_id, self.basis_codes, self.basis_lookup)):
+            if not value:
+                continue
+            # значения нет в снимке — код -1 не совпадёт ни с одной строкой
+            matched = codes[lo:hi] == lookup.get(value, -1)
+            mask = matched if mask is None else mask & matched
+        return mask
+
+    def _materialize(self, index: np.ndarray) -> List[Dict[str, Any]]:
+        # колонки целиком в списки Python, затем одна сборка словарей
+        def decoded(codes: np.ndarray, dictionary: List[Optional[str]]) -> List[Optional[str]]:
+            return [dictionary[c] for c in codes[index].tolist()]
+
+        counts = [None if c == NULL_COUNT else c for c in self.count[index].tolist()]
+        columns = zip(
+            self.ids[index].tolist(),
+            decoded(self.product_codes, self.product_dict),
+            decoded(self.product_name_codes, self.product_name_dict),
+            decoded(self.oil_codes, self.oil_dict),
+            decoded(self.basis_codes, self.basis_dict),
+            decoded(self.basis_name_codes, self.basis_name_dict),
+            decoded(self.type_codes, self.type_dict),
+            _nullable(self.volume[index]),
+            _nullable(self.total[index]),
+            counts,
+            decoded(self.day_codes, self.day_dict),
+            decoded(self.created_codes, self.created_dict),
+            decoded(self.updated_codes, self.updated_dict),
+        )
+        keys = ("id", "exchange_product_id", "exchange_product_name", "oil_id", "delivery_basis_id",
+                "delivery_basis_name", "delivery_type_id", "volume", "total", "count", "date",
+                "created_on", "updated_on")
+        with span("hydrate"):
+            return [dict(zip(keys, row)) for row in columns]
+
+    def dynamics_index(self, start_date: date, end_date: date, oil_id: Optional[str] = None,
+                       delivery_type_id: Optional[str] = None,
+                       delivery_basis_id: Optional[str] = None) -> np.ndarray:
+        lo = int(np.searchsorted(self.neg_days, -end_date.toordinal(), side="left"))
+        hi = int(np.searchsorted(self.neg_days, -start_date.toordinal(), side="right"))
+        if hi <= lo:
+            return np.empty(0, dtype=np.int64)
+        mask = self._mask(lo, hi, oil_id, delivery_type_id, delivery_basis_id)
+        return np.arange(lo, hi) if mask is None else np.flatnonzero(mask) + lo
+
+    def dynamics(self, start_date: date, end_date: date, oil_id: Optional[str] = None,
+                 delivery_type_id: Optional[str] = None,
+                 delivery_basis_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with span("columnar"):
+            index = self.dynamics_index(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+        return self._materialize(index)
+
+    def trading_results_index(self, oil_id: Optional[str] = None, delivery_type_id: Optional[str] = None,
+                              delivery_basis_id: Optional[str] = None, limit: int = 100) -> np.ndarray:
+        mask = self._mask(0, self.size, oil_id, delivery_type_id, delivery_basis_id)
+        if mask is None:
+            # без фильтров достаточно первых limit строк и остатка их последнего дня
+            hi = self.size if self.size <= limit else \
+                int(np.searchsorted(self.neg_days, self.neg_days[limit - 1], side="right"))
+            index = np.arange(hi)
+        else:
+            index = np.flatnonzero(mask)
+        if len(index) > limit:
+            # до последней даты, попавшей в limit, включительно: внутри дня порядок id меняется на обратный
+            cutoff = self.neg_days[index[limit - 1]]
+            index = index[:int(np.searchsorted(self.neg_days[index], cutoff, side="right"))]
+        order = np.lexsort((-self.ids[index], self.neg_days[index]))
+        return index[order][:limit]
+
+    def trading_results(self, oil_id: Optional[str] = None, delivery_type_id: Optional[str] = None,
+                        delivery_basis_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with span("columnar"):
+            index = self.trading_results_index(oil_id, delivery_type_id, delivery_basis_id, limit)
+        return self._materialize(index)
+
+
+def snapshot_query():
+    t = SpimexTradingResult
+    return select_results().order_by(t.date.desc(), t.id)
+
+
+class ColumnarStore:
+    # Текущий снимок процесса. Загружается при старте, перезагружается после загрузки отчётов
+    # и в фоне, когда другая реплика увеличила версию данных; пока идёт перезагрузка, отвечает старый снимок.
+    def __init__(self, session_factory: Optional[Callable[[], AsyncSession]] = None):
+        self.session_factory = session_factory
+        self.snapshot: Optional[ColumnarSnapshot] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> ColumnarSnapshot:
+        async with self._lock:
+            version, _ = await data_version.current()
+            async with (self.session_factory or fresh_read_session)() as session:
+                result = await session.execute(snapshot_query())
+                rows = result.fetchall()
+            snapshot = await asyncio.to_thread(ColumnarSnapshot, rows, version)
+            self.snapshot = snapshot
+            logger.info(f"Колоночный снимок загружен: {snapshot.size} строк, "
+                        f"{snapshot.nbytes / 2 ** 20:.1f} МБ, версия данных {version}")
+            return snapshot
+
+    async def refresh(self) -> Optional[ColumnarSnapshot]:
+        try:
+            return await self.load()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки колоночного снимка: {e}", exc_info=True)
+            return None
+
+    async def current(self) -> Optional[ColumnarSnapshot]:
+        # None — снимка ещё нет, запрос идёт по обычному пути через кэш и SQL
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        version, _ = await data_version.current()
+        if version > snapshot.version and (self._refreshing is None or self._refreshing.done()):
+            self._refreshing = asyncio.create_task(self.refresh())
+        return snapshot
+
+
+columnar_store = ColumnarStore()
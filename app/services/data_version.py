@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+import redis.asyncio as redis
+from .redis_client import get_redis
+from ..utils.logger import logger
+
+VERSION_KEY = "trading_meta:data_version"
+INGESTED_AT_KEY = "trading_meta:last_ingested_at"
+
+
+class DataVersion:
+    # Версия данных и время последней загрузки. Хранятся в Redis (общие для всех реплик),
+    # но читаются оттуда не чаще refresh_interval секунд: условные GET-запросы отвечают 304
+    # по копии в памяти процесса, не обращаясь ни к Redis, ни к Postgres.
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._checked_at: Optional[float] = None
+        self.redis: Optional[redis.Redis] = None
+
+    def _get_redis(self) -> redis.Redis:
+        if self.redis is None:
+            self.redis = get_redis()
+        return self.redis
+
+    def _apply(self, version: Optional[str], ingested_at: Optional[str]):
+        if version is not None:
+            self.version = int(version)
+        if ingested_at:
+            self.last_modified = datetime.fromisoformat(ingested_at)
+
+    async def current(self) -> Tuple[int, datetime]:
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+            self._checked_at = now
+            try:
+                version, ingested_at = await self._get_redis().mget(VERSION_KEY, INGESTED_AT_KEY)
+                self._apply(version, ingested_at)
+            except Exception as e:
+                logger.error(f"Ошибка чтения версии данных: {e}")
+        return self.version, self.last_modified
+
+    async def bump(self) -> int:
+        ingested_at = datetime.now(timezone.utc).replace(microsecond=0)
+        try:
+            redis_client = self._get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(VERSION_KEY)
+                pipe.set(INGESTED_AT_KEY, ingested_at.isoformat())
+                version, _ = await pipe.execute()
+            self._apply(str(version), ingested_at.isoformat())
+        except Exception as e:
+            logger.error(f"Ошибка обновления версии данных: {e}")
+            self._apply(str(self.version + 1), ingested_at.isoformat())
+        self._checked_at = time.monotonic()
+        logger.info(f"Версия данных: {self.version}")
+        return self.version
+
+
+data_version = DataVersion()
@@ -0,0 +1,68 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from ..database import AsyncSessionLocal
+from ..models import SpimexInstrument, SpimexDeliveryBasis
+
+
+class DimensionService:
+    # Ключи инструментов и базисов для строк торгов. Измерения только растут, а выданный ключ не меняется,
+    # поэтому соответствие "название -> ключ" кэшируется в процессе и в БД уходят только новые названия.
+    # Новые названия вставляются отдельной короткой транзакцией: откат загрузки файла не должен оставить
+    # в кэше ключ, которого нет в таблице.
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None):
+        self.session_factory = session_factory
+        self.instruments: Dict[Tuple[str, str], int] = {}
+        self.bases: Dict[str, int] = {}
+
+    async def _instrument_keys(self, session, pairs: Iterable[Tuple[str, str]]) -> None:
+        missing = sorted(set(pairs) - self.instruments.keys())
+        if not missing:
+            return
+        await session.execute(
+            insert(SpimexInstrument)
+            .values([{"exchange_product_id": code, "name": name} for code, name in missing])
+            .on_conflict_do_nothing(index_elements=["exchange_product_id", "name"])
+        )
+        result = await session.execute(
+            select(SpimexInstrument.id, SpimexInstrument.exchange_product_id, SpimexInstrument.name)
+            .where(tuple_(SpimexInstrument.exchange_product_id, SpimexInstrument.name).in_(missing))
+        )
+        for key, code, name in result.fetchall():
+            self.instruments[(code, name)] = key
+
+    async def _basis_keys(self, session, names: Iterable[str]) -> None:
+        missing = sorted(set(names) - self.bases.keys())
+        if not missing:
+            return
+        await session.execute(
+            insert(SpimexDeliveryBasis)
+            .values([{"name": name} for name in missing])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        result = await session.execute(
+            select(SpimexDeliveryBasis.id, SpimexDeliveryBasis.name).where(SpimexDeliveryBasis.name.in_(missing))
+        )
+        for key, name in result.fetchall():
+            self.bases[name] = key
+
+    async def assign_keys(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # exchange_product_name / delivery_basis_name заменяются на instrument_key / delivery_basis_key
+        pairs = {(r["exchange_product_id"], r["exchange_product_name"]) for r in records
+                 if r.get("exchange_product_id") and r.get("exchange_product_name")}
+        names = {r["delivery_basis_name"] for r in records if r.get("delivery_basis_name")}
+        if pairs - self.instruments.keys() or names - self.bases.keys():
+            async with (self.session_factory or AsyncSessionLocal)() as session:
+                await self._instrument_keys(session, pairs)
+                await self._basis_keys(session, names)
+                await session.commit()
+        for record in records:
+            product_name = record.pop("exchange_product_name", None)
+            basis_name = record.pop("delivery_basis_name", None)
+            record["instrument_key"] = self.instruments.get((record.get("exchange_product_id"), product_name))
+            record["delivery_basis_key"] = self.bases.get(basis_name)
+        return records
+
+
+dimension_service = DimensionService()
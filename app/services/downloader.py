@@ -1,11 +1,13 @@
 import os
 import asyncio
+import time
 import aiohttp
 from datetime import date
 from typing import List, Tuple, Optional
 from bs4 import BeautifulSoup
 from ..config import REPORTS_DIR
 from ..utils.logger import logger
+from ..utils.metrics import DOWNLOAD_SECONDS, DOWNLOAD_BYTES
 
 BASE_URL = "https://spimex.com"
 PAGE_URL = "https://spimex.com/markets/oil_products/trades/results/"
@@ -17,8 +19,13 @@ USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 
 
 class ReportDownloader:
-    def __init__(self):
+    def __init__(self, base_url: str = BASE_URL, reports_dir: str = REPORTS_DIR, coordinator=None):
         self.user_agent = USER_AGENT
+        # адрес биржи и каталог отчётов переопределяются для стенда бенчмарков
+        self.base_url = base_url
+        self.reports_dir = reports_dir
+        # общая очередь загрузки: дату, которую уже скачивает другой процесс, get_and_save_reports пропускает
+        self.coordinator = coordinator
 
     def _get_headers(self) -> dict:
         return {
@@ -43,7 +50,7 @@ class ReportDownloader:
             raise ValueError(f"Не удалось извлечь данные из ссылки: {href}") from e
 
     def _get_absolute_url(self, href: str) -> str:
-        return href if href.startswith(('http://', 'https://')) else f"{BASE_URL}{href}"
+        return href if href.startswith(('http://', 'https://')) else f"{self.base_url}{href}"
 
     def _parse_page_links(self, html: str, start_date: date, end_date: date) -> List[Tuple[str, date]]:
         results = []
@@ -74,13 +81,19 @@ class ReportDownloader:
     async def download_resource(self, url: str, retries: int = 3, delay: float = 1.5) -> Optional[bytes]:
         headers = self._get_headers()
         for attempt in range(retries):
+            started = time.perf_counter()
             try:
                 async with aiohttp.ClientSession(headers=headers) as session:
                     async with session.get(url, timeout=30) as response:
                         if response.status == 200:
-                            return await response.read()
+                            content = await response.read()
+                            DOWNLOAD_SECONDS.observe(time.perf_counter() - started, result="ok")
+                            DOWNLOAD_BYTES.inc(len(content))
+                            return content
+                        DOWNLOAD_SECONDS.observe(time.perf_counter() - started, result="http_error")
                         logger.warning(f"HTTP {response.status} for {url}")
             except Exception as e:
+                DOWNLOAD_SECONDS.observe(time.perf_counter() - started, result="error")
                 logger.error(f"{attempt + 1} попыток завершились неудачей для {url}: {str(e)}")
                 await asyncio.sleep(delay * (attempt + 1))
         logger.error(f"Все попытки завершились неудачей для {url}")
@@ -91,7 +104,7 @@ class ReportDownloader:
         all_links = []
         max_pages = 65
         while page <= max_pages:
-            url = f"{BASE_URL}/markets/oil_products/trades/results/?page=page-{page}"
+            url = f"{self.base_url}/markets/oil_products/trades/results/?page=page-{page}"
             try:
                 logger.info(f"Загрузка страницы {page}...")
                 html = await self.download_resource(url)
@@ -115,7 +128,7 @@ class ReportDownloader:
         async with semaphore:
             try:
                 file_name = f"oil_xls_{report_date.strftime('%Y%m%d')}.xls"
-                file_path = os.path.join(REPORTS_DIR, file_name)
+                file_path = os.path.join(self.reports_dir, file_name)
                 if os.path.exists(file_path):
                     logger.info(f"Файл уже существует: {file_path}")
                     return file_path
@@ -130,16 +143,25 @@ class ReportDownloader:
                 logger.error(f"Ошибка при загрузке отчёта {url}: {str(e)}")
                 return None
 
+    async def _download_leased(self, url: str, report_date: date, semaphore: asyncio.Semaphore) -> Optional[str]:
+        if self.coordinator is None:
+            return await self.download_and_save(url, report_date, semaphore)
+        async with self.coordinator.leased(report_date) as acquired:
+            if not acquired:
+                logger.info(f"Отчёт за {report_date} уже скачивается другим процессом")
+                return None
+            return await self.download_and_save(url, report_date, semaphore)
+
     async def get_and_save_reports(self, start_date: date, end_date: date, max_concurrent: int = 10) -> List[str]:
         try:
             reports = await self.get_all_bulletins(start_date, end_date)
             if not reports:
                 logger.warning("Не обнаружено отчётов в данном диапазоне дат")
                 return []
-            os.makedirs(REPORTS_DIR, exist_ok=True)
+            os.makedirs(self.reports_dir, exist_ok=True)
             semaphore = asyncio.Semaphore(max_concurrent)
             tasks = [
-                self.download_and_save(url, report_date, semaphore)
+                self._download_leased(url, report_date, semaphore)
                 for url, report_date in reports
             ]
             results = await asyncio.gather(*tasks)
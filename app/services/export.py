@@ -0,0 +1,161 @@
+import asyncio
+import io
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Sequence, Tuple
+from sqlalchemy import Select
+from sqlalchemy.dialects.postgresql import asyncpg as asyncpg_dialect
+from ..database import read_engine
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+# форматы, которым нужен pyarrow
+ARROW_FORMATS = ("parquet", "arrow")
+
+
+@lru_cache(maxsize=None)
+def load_pyarrow() -> Tuple[Any, Any]:
+    # pyarrow импортируется при первой выгрузке parquet/arrow, а не при старте API;
+    # (None, None) — не установлен (extra "export")
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None, None
+    return pa, pq
+
+
+def pyarrow_available() -> bool:
+    return load_pyarrow()[0] is not None
+
+
+def compile_query(query: Select) -> Tuple[str, List[Any]]:
+    # SQL с параметрами $1..$n для asyncpg: COPY и курсоры выполняются на «сыром» соединении
+    compiled = query.compile(dialect=asyncpg_dialect.dialect())
+    return compiled.string, [compiled.params[name] for name in compiled.positiontup]
+
+
+def arrow_schema():
+    pa, _ = load_pyarrow()
+    return pa.schema([
+        ("id", pa.int32()),
+        ("exchange_product_id", pa.string()),
+        ("exchange_product_name", pa.string()),
+        ("oil_id", pa.string()),
+        ("delivery_basis_id", pa.string()),
+        ("delivery_basis_name", pa.string()),
+        ("delivery_type_id", pa.string()),
+        ("volume", pa.decimal128(20, 2)),
+        ("total", pa.decimal128(20, 2)),
+        ("count", pa.int32()),
+        ("date", pa.date32()),
+        ("created_on", pa.timestamp("us")),
+        ("updated_on", pa.timestamp("us")),
+    ])
+
+
+def rows_to_batch(rows: Sequence[Sequence[Any]], schema) -> Any:
+    pa, _ = load_pyarrow()
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                           schema=schema)
+
+
+class _Sink(io.RawIOBase):
+    # принимает то, что пишет pyarrow, и отдаёт накопленное порциями; в памяти не больше одного батча
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class ExportService:
+    def __init__(self, batch_size: int = 10000, queue_size: int = 16):
+        self.batch_size = batch_size
+        # ограниченная очередь между COPY и клиентом: медленный клиент притормаживает чтение из БД
+        self.queue_size = queue_size
+
+    async def _raw_connection(self, conn):
+        raw = await conn.get_raw_connection()
+        return raw.driver_connection
+
+    async def stream_csv(self, query: Select) -> AsyncIterator[bytes]:
+        sql, args = compile_query(query)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def copy():
+            try:
+                async with read_engine.connect() as conn:
+                    connection = await self._raw_connection(conn)
+                    await connection.copy_from_query(sql, *args, output=queue.put, format="csv", header=True)
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def _fetch_batches(self, query: Select) -> AsyncIterator[List[Sequence[Any]]]:
+        sql, args = compile_query(query)
+        async with read_engine.connect() as conn:
+            connection = await self._raw_connection(conn)
+            # серверный курсор работает только внутри транзакции
+            async with connection.transaction():
+                cursor = await connection.cursor(sql, *args)
+                while rows := await cursor.fetch(self.batch_size):
+                    yield rows
+
+    async def stream_parquet(self, query: Select) -> AsyncIterator[bytes]:
+        _, pq = load_pyarrow()
+        schema = arrow_schema()
+        sink = _Sink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        try:
+            async for rows in self._fetch_batches(query):
+                # каждый батч — отдельная row group, сразу уходит клиенту
+                writer.write_batch(rows_to_batch(rows, schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    async def stream_arrow(self, query: Select) -> AsyncIterator[bytes]:
+        pa, _ = load_pyarrow()
+        schema = arrow_schema()
+        sink = _Sink()
+        writer = pa.ipc.new_stream(sink, schema)
+        try:
+            async for rows in self._fetch_batches(query):
+                writer.write_batch(rows_to_batch(rows, schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def stream(self, query: Select, export_format: str = "csv") -> AsyncIterator[bytes]:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+        if export_format == "csv":
+            return self.stream_csv(query)
+        if not pyarrow_available():
+            raise RuntimeError("Для форматов parquet/arrow нужен pyarrow")
+        if export_format == "parquet":
+            return self.stream_parquet(query)
+        return self.stream_arrow(query)
@@ -0,0 +1,203 @@
+import asyncio
+import json
+from datetime import date, datetime, timezone
+from typing import Optional, Set, List, Dict, Any, Iterable, AsyncIterator, Tuple
+import redis.asyncio as redis
+from sqlalchemy import select
+from .admission import Overloaded
+from ..config import (
+    FEED_HEARTBEAT_SECONDS, FEED_MAX_CLIENTS, FEED_QUEUE_SIZE, FEED_HISTORY, FEED_RETRY_MS
+)
+from .redis_client import get_redis
+from ..database import fresh_read_session
+from ..models import SpimexTradingDay
+from ..utils.logger import logger
+from ..utils.metrics import FEED_EVENTS
+
+FEED_CHANNEL = "trading_meta:feed"
+# последние события, новые в начале: досылаются клиенту после переподключения
+FEED_HISTORY_KEY = "trading_meta:feed:history"
+FEED_ID_KEY = "trading_meta:feed:last_id"
+FEED_EVENT = "trading_day"
+# сигнал генератору клиента завершить поток
+_CLOSE = None
+
+# id события — счётчик в Redis, выданный в том же скрипте, что и публикация: id растут в порядке
+# публикации на всех репликах, и по Last-Event-ID можно дослать всё пропущенное. Сообщение — "<id> <json>".
+PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+local message = id .. ' ' .. ARGV[1]
+redis.call('LPUSH', KEYS[2], message)
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[2]) - 1)
+redis.call('PUBLISH', ARGV[3], message)
+return id
+"""
+
+
+def parse_message(message: str) -> Tuple[int, str]:
+    event_id, data = message.split(" ", 1)
+    return int(event_id), data
+
+
+def format_event(event_id: int, data: str) -> str:
+    return f"id: {event_id}\nevent: {FEED_EVENT}\ndata: {data}\n\n"
+
+
+async def trading_days_summary(dates: Optional[Iterable[date]] = None) -> List[Dict[str, Any]]:
+    # итоги загруженных дней из календаря; без дат — последний торговый день
+    t = SpimexTradingDay
+    query = select(t.date, t.rows, t.volume, t.total, t.count)
+    if dates is None:
+        query = query.order_by(t.date.desc()).limit(1)
+    else:
+        query = query.where(t.date.in_(list(dates))).order_by(t.date)
+    async with fresh_read_session() as session:
+        result = await session.execute(query)
+        return [{
+            "date": row[0].isoformat(),
+            "rows": row[1] or 0,
+            "volume": float(row[2]) if row[2] is not None else None,
+            "total": float(row[3]) if row[3] is not None else None,
+            "count": row[4] or 0,
+        } for row in result.fetchall()]
+
+
+class FeedBroadcaster:
+    # Одна подписка на Redis pub/sub на процесс, события раздаются локальным клиентам через
+    # ограниченные очереди. Публикует любая реплика, завершившая загрузку, — получают клиенты всех реплик.
+    def __init__(self, heartbeat: float = FEED_HEARTBEAT_SECONDS, max_clients: int = FEED_MAX_CLIENTS,
+                 queue_size: int = FEED_QUEUE_SIZE, history: int = FEED_HISTORY, retry_ms: int = FEED_RETRY_MS):
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.history_size = history
+        self.retry_ms = retry_ms
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.last_id: Optional[int] = None
+        self.redis: Optional[redis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _get_redis(self) -> redis.Redis:
+        if self.redis is None:
+            self.redis = get_redis()
+        return self.redis
+
+    async def publish(self, version: int, dates: Optional[Iterable[date]] = None) -> Optional[int]:
+        # событие с итогами загруженных дней; None — публиковать нечего
+        days = await trading_days_summary(dates)
+        if not days:
+            return None
+        event = {
+            "version": version,
+            "ingested_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+            "dates": [day["date"] for day in days],
+            "days": days,
+        }
+        event_id = await self._get_redis().eval(
+            PUBLISH_SCRIPT, 2, FEED_ID_KEY, FEED_HISTORY_KEY,
+            json.dumps(event, ensure_ascii=False), self.history_size, FEED_CHANNEL)
+        FEED_EVENTS.inc(result="published")
+        logger.info(f"Лента: событие {event_id}, даты {', '.join(event['dates'])}")
+        return int(event_id)
+
+    async def history(self, after: Optional[int] = None) -> List[Tuple[int, str]]:
+        # события с id больше after в порядке публикации; без after — только последнее (текущее состояние)
+        try:
+            items = await self._get_redis().lrange(FEED_HISTORY_KEY, 0, 0 if after is None else -1)
+        except Exception as e:
+            logger.error(f"Ошибка чтения истории ленты: {e}")
+            return []
+        events = [parse_message(message) for message in reversed(items)]
+        return [(event_id, data) for event_id, data in events if after is None or event_id > after]
+
+    def _deliver(self, event_id: int, data: str):
+        if self.last_id is not None and event_id <= self.last_id:
+            return
+        self.last_id = event_id
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event_id, data))
+                FEED_EVENTS.inc(result="delivered")
+            except asyncio.QueueFull:
+                # клиент не читает: отключаем, EventSource переподключится с Last-Event-ID и получит пропущенное
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(_CLOSE)
+                FEED_EVENTS.inc(result="dropped_client")
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = self._get_redis().pubsub()
+            try:
+                await pubsub.subscribe(FEED_CHANNEL)
+                backoff = 1.0
+                # события, опубликованные пока подписки не было (при первом запуске — последнее событие;
+                # клиенты, уже получившие его из истории, отсекают повтор по id)
+                for event_id, data in await self.history(after=self.last_id):
+                    self._deliver(event_id, data)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._deliver(*parse_message(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка подписки на ленту, повтор через {backoff:.0f} с: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                await pubsub.aclose()
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stream(self, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        self._ensure_listener()
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            # подписка раньше чтения истории: событие между ними придёт из очереди, повтор отсекается по id
+            sent = last_event_id
+            for event_id, data in await self.history(after=last_event_id):
+                sent = event_id
+                yield format_event(event_id, data)
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if item is _CLOSE:
+                    return
+                event_id, data = item
+                if sent is not None and event_id <= sent:
+                    continue
+                sent = event_id
+                yield format_event(event_id, data)
+        finally:
+            self.subscribers.discard(queue)
+
+    def check_capacity(self):
+        if len(self.subscribers) >= self.max_clients:
+            raise Overloaded(detail="Слишком много подписчиков ленты, повторите позже")
+
+    async def close(self):
+        for queue in list(self.subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSE)
+        self.subscribers.clear()
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.redis = None
+
+
+feed_broadcaster = FeedBroadcaster()
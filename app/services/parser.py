@@ -1,15 +1,41 @@
+import time
 import pandas as pd
+from redis.exceptions import RedisError
+from concurrent.futures import Executor
 from datetime import date
-from typing import Optional
+from typing import Optional, Iterable, Callable, Set
 from pathlib import Path
 from ..models import SpimexTradingResult
 from ..database import AsyncSessionLocal
+from .partitions import partition_manager
+from .rollups import rollup_service
+from .dimensions import dimension_service
 from ..utils.logger import logger
+from ..utils.metrics import PARSE_FILE_SECONDS, DB_LOAD_SECONDS, DB_LOAD_ROWS, DB_LOAD_BATCH_ROWS
 import asyncio
 
 
+def _parse_report(file_path: Path, report_date: date) -> Optional[pd.DataFrame]:
+    # точка входа для пула процессов: функция модуля сериализуется по имени, без экземпляра парсера
+    return ReportParser().parse_xls_file(file_path, report_date)
+
+
+def report_date_from_path(file_path: Path) -> date:
+    date_str = file_path.stem.split("_")[-1][:8]
+    return date.fromisoformat(f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}")
+
+
 class ReportParser:
-    def __init__(self):
+    def __init__(self, batch_size: Optional[int] = None, executor: Optional[Executor] = None, coordinator=None):
+        # batch_size — сколько строк отправлять в БД за один bulk insert (None — файл целиком);
+        # executor — пул, в котором разбирать xls, чтобы pandas не занимал цикл событий;
+        # coordinator — общая очередь загрузки (work_queue.IngestionQueue): файл обрабатывается под арендой
+        # его даты и пропускается, если дату уже загрузил или загружает другой процесс
+        self.batch_size = batch_size
+        self.executor = executor
+        self.coordinator = coordinator
+        # даты, по которым записаны строки: для точечного сброса кэша и события ленты после загрузки
+        self.loaded: Set[date] = set()
         self.required_columns = [
             "Код Инструмента",
             "Наименование Инструмента",
@@ -25,6 +51,8 @@ class ReportParser:
         return name.replace("\n", " ").replace("\xa0", " ").strip()
 
     def parse_xls_file(self, file_path: Path, report_date: date) -> Optional[pd.DataFrame]:
+        started = time.perf_counter()
+        result = "error"
         try:
             df_raw = pd.read_excel(file_path, sheet_name="TRADE_SUMMARY", header=None, engine="xlrd")
 
@@ -54,6 +82,7 @@ class ReportParser:
             df_data = df_data[df_data["Количество Договоров, шт."] > 0]
 
             if df_data.empty:
+                result = "empty"
                 return None
 
             df_result = df_data.rename(
@@ -76,13 +105,22 @@ class ReportParser:
 
             df_result["date"] = report_date
 
+            result = "ok"
             return df_result
 
         except Exception as e:
             logger.error(f"Error parsing file {file_path}: {e}")
             return None
+        finally:
+            PARSE_FILE_SECONDS.observe(time.perf_counter() - started, result=result)
 
     async def save_to_database(self, df: pd.DataFrame) -> int:
+        try:
+            await partition_manager.ensure_partitions(df["date"].unique())
+        except Exception as e:
+            logger.error(f"Ошибка при создании партиций: {e}", exc_info=True)
+            return 0
+        started = time.perf_counter()
         async with AsyncSessionLocal() as session:
             try:
                 df = df.where(pd.notnull(df), None)
@@ -103,34 +141,75 @@ class ReportParser:
                         "date": row["date"],
                     }
                     records.append(record)
-                await session.run_sync(
-                    lambda sync_session: sync_session.bulk_insert_mappings(SpimexTradingResult, records))
+                # названия -> ключи таблиц-измерений (новые названия вставляются заранее)
+                await dimension_service.assign_keys(records)
+                batch_size = self.batch_size or max(len(records), 1)
+                for offset in range(0, len(records), batch_size):
+                    batch = records[offset:offset + batch_size]
+                    await session.run_sync(
+                        lambda sync_session: sync_session.bulk_insert_mappings(SpimexTradingResult, batch))
+                    DB_LOAD_BATCH_ROWS.observe(len(batch))
+                await rollup_service.refresh(session, {record["date"] for record in records})
                 await session.commit()
+                DB_LOAD_SECONDS.observe(time.perf_counter() - started)
+                DB_LOAD_ROWS.inc(len(records))
                 return len(records)
             except Exception as e:
                 await session.rollback()
                 logger.error(f"Ошибка при сохранении в БД: {e}", exc_info=True)
                 return 0
 
+    async def _parse(self, file_path: Path, report_date: date) -> Optional[pd.DataFrame]:
+        if self.executor is None:
+            return self.parse_xls_file(file_path, report_date)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _parse_report, file_path, report_date)
+
+    async def _process_file(self, file_path: Path, report_date: date) -> int:
+        df = await self._parse(file_path, report_date)
+        if df is None:
+            return 0
+        count = await self.save_to_database(df)
+        logger.info(f"Обработан файл {file_path.name}, сохранено {count} записей")
+        return count
+
     async def process_file(self, file_path: Path, semaphore: asyncio.Semaphore) -> int:
         async with semaphore:
             try:
-                date_str = file_path.stem.split("_")[-1][:8]
-                report_date = date.fromisoformat(f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}")
-                df = self.parse_xls_file(file_path, report_date)
-                if df is not None:
-                    count = await self.save_to_database(df)
-                    logger.info(f"Обработан файл {file_path.name}, сохранено {count} записей")
-                    return count
+                report_date = report_date_from_path(file_path)
+                if self.coordinator is None:
+                    count = await self._process_file(file_path, report_date)
+                else:
+                    async with self.coordinator.leased(report_date) as token:
+                        if token is None or await self.coordinator.is_ingested(report_date):
+                            logger.info(f"Пропущен файл {file_path.name}: дата уже загружена или загружается")
+                            return 0
+                        count = await self._process_file(file_path, report_date)
+                        if count:
+                            await self.coordinator.complete(report_date, token)
+                if count:
+                    self.loaded.add(report_date)
+                return count
+            except RedisError:
+                # Redis недоступен: дату нельзя ни взять в работу, ни отметить загруженной —
+                # это ошибка вызова, а не «0 записей»
+                raise
             except Exception as e:
                 logger.error(f"Ошибка при обработке файла {file_path.name}: {e}")
             return 0
 
-    async def process_directory(self, directory: Path, max_concurrent: int = 10) -> int:
+    async def process_files(self, paths: Iterable[Path], max_concurrent: int = 10,
+                            on_progress: Optional[Callable[[Path, int], None]] = None) -> int:
         semaphore = asyncio.Semaphore(max_concurrent)
-        tasks = [
-            self.process_file(file_path, semaphore)
-            for file_path in directory.glob("*.xls")
-        ]
-        results = await asyncio.gather(*tasks)
+
+        async def run(file_path: Path) -> int:
+            count = await self.process_file(file_path, semaphore)
+            if on_progress is not None:
+                on_progress(file_path, count)
+            return count
+
+        results = await asyncio.gather(*(run(file_path) for file_path in paths))
         return sum(results)
+
+    async def process_directory(self, directory: Path, max_concurrent: int = 10) -> int:
+        return await self.process_files(directory.glob("*.xls"), max_concurrent)
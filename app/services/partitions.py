@@ -0,0 +1,93 @@
+import asyncio
+from datetime import date
+from typing import Iterable, List, Set
+from sqlalchemy import text
+from ..database import AsyncSessionLocal
+from ..models import SpimexTradingResult
+from ..utils.logger import logger
+
+TABLE_NAME = SpimexTradingResult.__tablename__
+# один и тот же ключ блокировки во всех процессах, чтобы DDL не гонялся между репликами
+PARTITION_LOCK_KEY = 0x5350494D
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(day: date) -> str:
+    return f"{TABLE_NAME}_y{day.year}m{day.month:02d}"
+
+
+def create_partition_sql(day: date) -> str:
+    start = month_start(day)
+    end = add_months(start, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {TABLE_NAME} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+class PartitionManager:
+    def __init__(self, premake_months: int = 2):
+        self.premake_months = premake_months
+        self._known: Set[date] = set()
+        self._lock = asyncio.Lock()
+
+    def _required_months(self, dates: Iterable[date]) -> List[date]:
+        months = {month_start(d) for d in dates}
+        if months:
+            # заранее создаём и будущие месяцы, чтобы вставка в начале месяца не ждала DDL
+            latest = max(months)
+            months.update(add_months(latest, i) for i in range(1, self.premake_months + 1))
+        return sorted(months - self._known)
+
+    async def ensure_partitions(self, dates: Iterable[date]) -> List[date]:
+        missing = self._required_months(dates)
+        if not missing:
+            return []
+        async with self._lock:
+            missing = [m for m in missing if m not in self._known]
+            if not missing:
+                return []
+            async with AsyncSessionLocal() as session:
+                await session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+                for month in missing:
+                    await session.execute(text(create_partition_sql(month)))
+                await session.commit()
+            self._known.update(missing)
+            logger.info(f"Проверены партиции: {', '.join(partition_name(m) for m in missing)}")
+            return missing
+
+    async def list_partitions(self) -> List[str]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :table ORDER BY c.relname"
+            ), {"table": TABLE_NAME})
+            return [row[0] for row in result.fetchall()]
+
+    async def detach_partitions_before(self, before: date) -> List[str]:
+        # отсоединённая партиция становится обычной таблицей: её можно выгрузить pg_dump и удалить
+        boundary = partition_name(month_start(before))
+        detached = []
+        async with AsyncSessionLocal() as session:
+            for name in await self.list_partitions():
+                if name < boundary:
+                    await session.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name}"))
+                    detached.append(name)
+            await session.commit()
+        self._known.clear()
+        if detached:
+            logger.info(f"Отсоединены партиции: {', '.join(detached)}")
+        return detached
+
+
+partition_manager = PartitionManager()
@@ -0,0 +1,27 @@
+from datetime import date
+from typing import Iterable, Optional
+from .data_version import data_version
+from .cache_warmer import warm_after_ingestion
+from .feed import feed_broadcaster
+from ..config import COLUMNAR_ENGINE_ENABLED
+from ..utils.logger import logger
+
+
+async def on_ingestion_complete(dates: Optional[Iterable[date]] = None) -> None:
+    # всё, что должно произойти после того, как новые строки закоммичены;
+    # dates — загруженные дни, если известны: тогда сбрасываются только затронутые ключи кэша
+    dates = list(dates) if dates is not None else None
+    version = data_version.version
+    try:
+        version = await data_version.bump()
+    except Exception as e:
+        logger.error(f"Ошибка обновления версии данных: {e}")
+    if COLUMNAR_ENGINE_ENABLED:
+        from .columnar import columnar_store
+        await columnar_store.refresh()
+    await warm_after_ingestion(dates=dates)
+    # событие в ленту — последним: подписчики сразу пойдут за данными и должны попасть в прогретый кэш
+    try:
+        await feed_broadcaster.publish(version, dates)
+    except Exception as e:
+        logger.error(f"Ошибка публикации события в ленту: {e}")
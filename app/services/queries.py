@@ -0,0 +1,156 @@
+from datetime import date
+from typing import List, Optional, Dict, Any, Iterable, Sequence
+from sqlalchemy import select, and_, or_, values, column, Integer, Date, String, Select
+from ..models import SpimexTradingResult, SpimexInstrument, SpimexDeliveryBasis
+from ..utils.timing import span
+
+# Колонки, которые реально уходят в ответ API. Выбираем их как Core-строки,
+# без гидрации ORM-объектов и identity map. Названия берутся из таблиц-измерений.
+RESULT_COLUMNS = (
+    SpimexTradingResult.id,
+    SpimexTradingResult.exchange_product_id,
+    SpimexInstrument.name.label("exchange_product_name"),
+    SpimexTradingResult.oil_id,
+    SpimexTradingResult.delivery_basis_id,
+    SpimexDeliveryBasis.name.label("delivery_basis_name"),
+    SpimexTradingResult.delivery_type_id,
+    SpimexTradingResult.volume,
+    SpimexTradingResult.total,
+    SpimexTradingResult.count,
+    SpimexTradingResult.date,
+    SpimexTradingResult.created_on,
+    SpimexTradingResult.updated_on,
+)
+# LEFT JOIN: строка без названия (ключ NULL) всё равно попадает в ответ
+RESULT_FROM = SpimexTradingResult.__table__ \
+    .outerjoin(SpimexInstrument, SpimexTradingResult.instrument_key == SpimexInstrument.id) \
+    .outerjoin(SpimexDeliveryBasis, SpimexTradingResult.delivery_basis_key == SpimexDeliveryBasis.id)
+
+
+def select_results(*columns) -> Select:
+    return select(*columns, *RESULT_COLUMNS).select_from(RESULT_FROM)
+
+
+def build_filters(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None
+) -> list:
+    conditions = []
+    if start_date:
+        conditions.append(SpimexTradingResult.date >= start_date)
+    if end_date:
+        conditions.append(SpimexTradingResult.date <= end_date)
+    if oil_id:
+        conditions.append(SpimexTradingResult.oil_id == oil_id)
+    if delivery_type_id:
+        conditions.append(SpimexTradingResult.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        conditions.append(SpimexTradingResult.delivery_basis_id == delivery_basis_id)
+    return conditions
+
+
+def dynamics_query(
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None
+) -> Select:
+    conditions = build_filters(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    return select_results() \
+        .where(and_(*conditions)) \
+        .order_by(SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+
+
+def trading_results_query(
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None,
+        limit: int = 100
+) -> Select:
+    conditions = build_filters(oil_id=oil_id, delivery_type_id=delivery_type_id,
+                               delivery_basis_id=delivery_basis_id)
+    query = select_results()
+    if conditions:
+        query = query.where(and_(*conditions))
+    return query.order_by(SpimexTradingResult.date.desc(), SpimexTradingResult.id.desc()).limit(limit)
+
+
+def export_query(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None,
+        min_id: Optional[int] = None,
+        max_id: Optional[int] = None
+) -> Select:
+    conditions = build_filters(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    if min_id is not None:
+        conditions.append(SpimexTradingResult.id >= min_id)
+    if max_id is not None:
+        conditions.append(SpimexTradingResult.id <= max_id)
+    query = select_results()
+    if conditions:
+        query = query.where(and_(*conditions))
+    return query.order_by(SpimexTradingResult.date, SpimexTradingResult.id)
+
+
+def dynamics_batch_query(filters: Sequence[Dict[str, Any]]) -> Select:
+    # Все фильтры одним запросом: набор фильтров приходит как VALUES (idx, ...) и соединяется с таблицей,
+    # idx в результате показывает, какому фильтру принадлежит строка.
+    t = SpimexTradingResult
+    f = values(
+        column("idx", Integer),
+        column("start_date", Date),
+        column("end_date", Date),
+        column("oil_id", String),
+        column("delivery_type_id", String),
+        column("delivery_basis_id", String),
+        name="f"
+    ).data([
+        (idx, item["start_date"], item["end_date"], item.get("oil_id") or None,
+         item.get("delivery_type_id") or None, item.get("delivery_basis_id") or None)
+        for idx, item in enumerate(filters)
+    ])
+    on_clause = and_(
+        t.date >= f.c.start_date,
+        t.date <= f.c.end_date,
+        or_(f.c.oil_id.is_(None), t.oil_id == f.c.oil_id),
+        or_(f.c.delivery_type_id.is_(None), t.delivery_type_id == f.c.delivery_type_id),
+        or_(f.c.delivery_basis_id.is_(None), t.delivery_basis_id == f.c.delivery_basis_id),
+    )
+    # общий диапазон дат константами, чтобы работало отсечение партиций
+    overall = build_filters(min(item["start_date"] for item in filters), max(item["end_date"] for item in filters))
+    return select(f.c.idx, *RESULT_COLUMNS) \
+        .select_from(RESULT_FROM.join(f, on_clause)) \
+        .where(and_(*overall)) \
+        .order_by(f.c.idx, t.date.desc(), t.id)
+
+
+def row_to_result(row: Sequence[Any]) -> Dict[str, Any]:
+    (id_, exchange_product_id, exchange_product_name, oil_id, delivery_basis_id, delivery_basis_name,
+     delivery_type_id, volume, total, count, date_, created_on, updated_on) = row
+    return {
+        "id": id_,
+        "exchange_product_id": exchange_product_id,
+        "exchange_product_name": exchange_product_name,
+        "oil_id": oil_id,
+        "delivery_basis_id": delivery_basis_id,
+        "delivery_basis_name": delivery_basis_name,
+        "delivery_type_id": delivery_type_id,
+        "volume": float(volume) if volume is not None else None,
+        "total": float(total) if total is not None else None,
+        "count": count,
+        "date": date_.isoformat(),
+        "created_on": created_on.isoformat() if created_on else None,
+        "updated_on": updated_on.isoformat() if updated_on else None
+    }
+
+
+def rows_to_results(rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    with span("hydrate"):
+        return [row_to_result(row) for row in rows]
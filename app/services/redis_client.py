@@ -0,0 +1,30 @@
+from typing import Dict
+import redis.asyncio as redis
+from ..config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+
+# Один клиент (и один пул соединений) на процесс для каждого режима декодирования.
+# Сервисы берут клиента отсюда, а не создают свой: запросный TradingService
+# иначе открывал бы новые пулы на каждый HTTP-запрос.
+_clients: Dict[bool, redis.Redis] = {}
+
+
+def get_redis(decode: bool = True) -> redis.Redis:
+    client = _clients.get(decode)
+    if client is None:
+        client = redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            password=REDIS_PASSWORD,
+            decode_responses=decode
+        )
+        _clients[decode] = client
+    return client
+
+
+async def close_redis():
+    # закрывает общие пулы; вызывается при остановке процесса
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,267 @@
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Dict, Any, Sequence
+from sqlalchemy import select, insert, delete, func, and_, text, literal, literal_column, Date, cast, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import SpimexTradingResult, SpimexDailyRollup, SpimexMonthlyRollup, SpimexTradingDay
+from .partitions import month_start, add_months
+
+GRANULARITIES = {
+    "day": (SpimexDailyRollup, SpimexDailyRollup.date),
+    "month": (SpimexMonthlyRollup, SpimexMonthlyRollup.month),
+}
+
+
+ROLLUP_LOCK_NAMESPACE = 0x524F4C4C
+# литерал, а не bind-параметр: выражение должно совпадать в SELECT и GROUP BY
+EMPTY = literal_column("''")
+
+
+def _month_lock_key(month: date) -> int:
+    return month.year * 100 + month.month
+
+
+def _daily_source(dates: List[date]):
+    t = SpimexTradingResult
+    keys = (
+        t.date,
+        func.coalesce(t.oil_id, EMPTY),
+        func.coalesce(t.delivery_basis_id, EMPTY),
+        func.coalesce(t.delivery_type_id, EMPTY),
+    )
+    return select(*keys, func.sum(t.volume), func.sum(t.total), func.sum(t.count)) \
+        .where(t.date.in_(dates)) \
+        .group_by(*keys)
+
+
+def _trading_days_source(dates: List[date]):
+    t = SpimexTradingResult
+    return select(t.date, func.count(), func.sum(t.volume), func.sum(t.total), func.sum(t.count)) \
+        .where(t.date.in_(dates)) \
+        .group_by(t.date)
+
+
+def _monthly_source(month: date):
+    d = SpimexDailyRollup
+    return select(
+        cast(literal(month), Date),
+        d.oil_id,
+        d.delivery_basis_id,
+        d.delivery_type_id,
+        func.sum(d.volume),
+        func.sum(d.total),
+        func.sum(d.count),
+    ).where(and_(d.date >= month, d.date < add_months(month, 1))) \
+        .group_by(d.oil_id, d.delivery_basis_id, d.delivery_type_id)
+
+
+class RollupService:
+    columns = ["oil_id", "delivery_basis_id", "delivery_type_id", "volume", "total", "count"]
+
+    async def refresh(self, session: AsyncSession, dates: Iterable[date]) -> None:
+        # Пересчитываются только затронутые дни и их месяцы, в той же транзакции, что и вставка.
+        # Блокировка по месяцу сериализует параллельную загрузку файлов одного месяца,
+        # иначе месячный агрегат посчитался бы без ещё не закоммиченных соседних дней.
+        dates = sorted(set(dates))
+        if not dates:
+            return
+        months = sorted({month_start(d) for d in dates})
+        for month in months:
+            await session.execute(text("SELECT pg_advisory_xact_lock(:namespace, :key)"),
+                                  {"namespace": ROLLUP_LOCK_NAMESPACE, "key": _month_lock_key(month)})
+
+        await session.execute(delete(SpimexDailyRollup).where(SpimexDailyRollup.date.in_(dates)))
+        await session.execute(
+            insert(SpimexDailyRollup).from_select(["date"] + self.columns, _daily_source(dates))
+        )
+        # календарь торговых дней с дневными итогами
+        await session.execute(delete(SpimexTradingDay).where(SpimexTradingDay.date.in_(dates)))
+        await session.execute(
+            insert(SpimexTradingDay).from_select(["date", "rows", "volume", "total", "count"],
+                                                 _trading_days_source(dates))
+        )
+        for month in months:
+            await session.execute(delete(SpimexMonthlyRollup).where(SpimexMonthlyRollup.month == month))
+            await session.execute(
+                insert(SpimexMonthlyRollup).from_select(["month"] + self.columns, _monthly_source(month))
+            )
+
+
+def _whole_months(start_date: date, end_date: date) -> bool:
+    return start_date == month_start(start_date) and end_date == add_months(end_date, 1) - timedelta(days=1)
+
+
+def _series_conditions(model, oil_id: Optional[str], delivery_type_id: Optional[str],
+                       delivery_basis_id: Optional[str]) -> list:
+    conditions = []
+    if oil_id:
+        conditions.append(model.oil_id == oil_id)
+    if delivery_type_id:
+        conditions.append(model.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        conditions.append(model.delivery_basis_id == delivery_basis_id)
+    return conditions
+
+
+def _month_parts(start_date: date, end_date: date):
+    # целые месяцы внутри периода (первый, последний) или None и дневные отрезки по краям
+    first = start_date if start_date == month_start(start_date) else add_months(month_start(start_date), 1)
+    last = end_date if end_date == add_months(end_date, 1) - timedelta(days=1) \
+        else month_start(end_date) - timedelta(days=1)
+    if first > last:
+        return None, [(start_date, end_date)]
+    edges = []
+    if start_date < first:
+        edges.append((start_date, first - timedelta(days=1)))
+    if last < end_date:
+        edges.append((last + timedelta(days=1), end_date))
+    return (first, month_start(last)), edges
+
+
+def series_query(
+        granularity: str,
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None
+):
+    if granularity == "month" and not _whole_months(start_date, end_date):
+        return _partial_month_series_query(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+    model, period = GRANULARITIES[granularity]
+    conditions = [period >= start_date, period <= end_date] + \
+        _series_conditions(model, oil_id, delivery_type_id, delivery_basis_id)
+    return select(
+        period,
+        func.sum(model.volume),
+        func.sum(model.total),
+        func.sum(model.count),
+    ).where(and_(*conditions)).group_by(period).order_by(period)
+
+
+def _partial_month_series_query(start_date: date, end_date: date, oil_id: Optional[str],
+                                delivery_type_id: Optional[str], delivery_basis_id: Optional[str]):
+    # Период не по границам месяцев: целые месяцы — из месячных агрегатов, неполные крайние месяцы —
+    # из дневных только за дни периода. Иначе в ряд попали бы дни за его пределами.
+    months, edges = _month_parts(start_date, end_date)
+    filters = (oil_id, delivery_type_id, delivery_basis_id)
+    d, m = SpimexDailyRollup, SpimexMonthlyRollup
+    parts = [
+        select(
+            cast(func.date_trunc(literal_column("'month'"), d.date), Date).label("period"),
+            d.volume, d.total, d.count,
+        ).where(and_(d.date >= lo, d.date <= hi, *_series_conditions(d, *filters)))
+        for lo, hi in edges
+    ]
+    if months:
+        parts.append(
+            select(m.month.label("period"), m.volume, m.total, m.count)
+            .where(and_(m.month >= months[0], m.month <= months[1], *_series_conditions(m, *filters)))
+        )
+    rows = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+    return select(
+        rows.c.period,
+        func.sum(rows.c.volume),
+        func.sum(rows.c.total),
+        func.sum(rows.c.count),
+    ).group_by(rows.c.period).order_by(rows.c.period)
+
+
+def series_rows_to_results(rows) -> List[Dict[str, Any]]:
+    results = []
+    for period, volume, total, count in rows:
+        volume = float(volume) if volume is not None else None
+        total = float(total) if total is not None else None
+        results.append({
+            "period": period.isoformat(),
+            "volume": volume,
+            "total": total,
+            "count": int(count) if count is not None else 0,
+            "avg_price": round(total / volume, 2) if volume and total is not None else None
+        })
+    return results
+
+
+AGGREGATE_DIMENSIONS = ("oil_id", "delivery_basis_id", "delivery_type_id", "period")
+AGGREGATE_METRICS = ("volume", "total", "count", "vwap")
+AGGREGATE_BUCKETS = ("day", "week", "month", "year")
+
+
+def aggregate_query(
+        start_date: date,
+        end_date: date,
+        group_by: Sequence[str] = (),
+        bucket: str = "month",
+        order_by: Optional[str] = "total",
+        order: str = "desc",
+        limit: int = 20,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None
+):
+    # Один GROUP BY по агрегатам (строк в разы меньше, чем сделок). Период из целых месяцев без разбивки
+    # мельче месяца читается из месячных агрегатов, остальное — из дневных.
+    if _whole_months(start_date, end_date) and ("period" not in group_by or bucket in ("month", "year")):
+        model, period = SpimexMonthlyRollup, SpimexMonthlyRollup.month
+    else:
+        model, period = SpimexDailyRollup, SpimexDailyRollup.date
+
+    keys = []
+    for dimension in group_by:
+        if dimension == "period":
+            # литерал, а не bind-параметр: выражение должно совпадать в SELECT и GROUP BY
+            column = period if bucket == "day" or (bucket == "month" and model is SpimexMonthlyRollup) \
+                else cast(func.date_trunc(literal_column(f"'{bucket}'"), period), Date)
+        else:
+            column = getattr(model, dimension)
+        keys.append(column.label(dimension))
+
+    volume, total = func.sum(model.volume), func.sum(model.total)
+    metrics = {
+        "volume": volume.label("volume"),
+        "total": total.label("total"),
+        "count": func.sum(model.count).label("count"),
+        "vwap": (total / func.nullif(volume, 0)).label("vwap"),
+    }
+    conditions = [period >= start_date, period <= end_date]
+    if oil_id:
+        conditions.append(model.oil_id == oil_id)
+    if delivery_type_id:
+        conditions.append(model.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        conditions.append(model.delivery_basis_id == delivery_basis_id)
+
+    query = select(*keys, *metrics.values()).where(and_(*conditions))
+    if keys:
+        query = query.group_by(*(key.element for key in keys))
+    # top-N по метрике, при равенстве — по ключам группы, чтобы порядок был детерминированным
+    ordering = []
+    if order_by:
+        metric = metrics[order_by]
+        ordering.append((metric.desc() if order == "desc" else metric.asc()).nulls_last())
+    ordering += [key.element for key in keys]
+    return query.order_by(*ordering).limit(limit)
+
+
+def aggregate_rows_to_results(rows, group_by: Sequence[str],
+                              metrics: Sequence[str] = AGGREGATE_METRICS) -> List[Dict[str, Any]]:
+    results = []
+    for row in rows:
+        values = row._mapping
+        item: Dict[str, Any] = {}
+        for dimension in group_by:
+            value = values[dimension]
+            # в агрегатах пустое значение измерения хранится как ''
+            item[dimension] = value.isoformat() if dimension == "period" else (value or None)
+        for metric in metrics:
+            value = values[metric]
+            if metric == "count":
+                item[metric] = int(value) if value is not None else 0
+            elif metric == "vwap":
+                item[metric] = round(float(value), 2) if value is not None else None
+            else:
+                item[metric] = float(value) if value is not None else None
+        results.append(item)
+    return results
+
+
+rollup_service = RollupService()
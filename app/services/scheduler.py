@@ -0,0 +1,172 @@
+import asyncio
+import os
+import socket
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional, Set
+from uuid import uuid4
+import redis.asyncio as redis
+from sqlalchemy import select
+from ..config import (
+    EXCHANGE_TZ, SCHEDULER_PUBLISH_TIME, SCHEDULER_DEADLINE, SCHEDULER_TICK_SECONDS,
+    SCHEDULER_BACKOFF_INITIAL, SCHEDULER_BACKOFF_MAX, SCHEDULER_LEASE_SECONDS
+)
+from .redis_client import get_redis
+from ..database import AsyncSessionLocal
+from ..models import SpimexTradingDay
+from .post_ingestion import on_ingestion_complete
+from .work_queue import ingestion_queue
+from ..utils.logger import logger
+
+LEADER_KEY = "trading_meta:scheduler_leader"
+
+# продлить аренду, только если она всё ещё наша
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    # Лидер среди реплик: ключ в Redis с TTL. Кто поставил его первым (SET NX), тот и лидер,
+    # пока продлевает аренду; если процесс упал, через lease_seconds лидером становится другая реплика.
+    def __init__(self, key: str = LEADER_KEY, lease_seconds: float = SCHEDULER_LEASE_SECONDS):
+        self.key = key
+        self.lease_ms = int(lease_seconds * 1000)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.redis: Optional[redis.Redis] = None
+
+    def _get_redis(self) -> redis.Redis:
+        if self.redis is None:
+            self.redis = get_redis()
+        return self.redis
+
+    async def acquire(self) -> bool:
+        redis_client = self._get_redis()
+        if await redis_client.eval(RENEW_SCRIPT, 1, self.key, self.owner, self.lease_ms):
+            return True
+        return bool(await redis_client.set(self.key, self.owner, nx=True, px=self.lease_ms))
+
+    async def release(self):
+        try:
+            await self._get_redis().eval(RELEASE_SCRIPT, 1, self.key, self.owner)
+        except Exception as e:
+            logger.error(f"Ошибка освобождения лидерства планировщика: {e}")
+
+    async def close(self):
+        self.redis = None
+
+
+class IngestionScheduler:
+    # Ежедневная загрузка нового бюллетеня: после времени публикации (по бирже) лидер ищет файл за сегодня,
+    # при неудаче повторяет с экспоненциальной задержкой до дедлайна, загружает только этот файл
+    # и сбрасывает в кэше лишь ключи, в период которых попадает новая дата.
+    def __init__(self, lease: Optional[LeaderLease] = None, tick_seconds: float = SCHEDULER_TICK_SECONDS,
+                 backoff_initial: float = SCHEDULER_BACKOFF_INITIAL, backoff_max: float = SCHEDULER_BACKOFF_MAX):
+        self.lease = lease or LeaderLease()
+        self.tick_seconds = tick_seconds
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.backoff = backoff_initial
+        self.next_attempt: Optional[datetime] = None
+        self.done: Set[date] = set()
+        self._stopped = asyncio.Event()
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(EXCHANGE_TZ)
+
+    def due(self, now: datetime) -> Optional[date]:
+        # дата, за которую пора искать бюллетень, или None
+        day = now.date()
+        if day.weekday() >= 5 or day in self.done:
+            return None
+        if not SCHEDULER_PUBLISH_TIME <= now.time() <= SCHEDULER_DEADLINE:
+            return None
+        return day
+
+    async def is_ingested(self, day: date) -> bool:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(SpimexTradingDay.date).where(SpimexTradingDay.date == day))
+            return result.first() is not None
+
+    async def ingest(self, day: date) -> Optional[int]:
+        # None — бюллетень ещё не опубликован, не скачался или не записался; иначе число записанных строк
+        from .downloader import ReportDownloader
+        from .parser import ReportParser
+
+        downloader = ReportDownloader()
+        links = await downloader.get_all_bulletins(day, day)
+        if not links:
+            return None
+        url, report_date = links[0]
+        # файлы и строки за дату загружаются под её арендой в общей очереди — параллельно с ручной
+        # загрузкой или воркерами очереди, без дублей
+        async with ingestion_queue.leased(report_date) as acquired:
+            if not acquired:
+                return None
+            saved = await downloader.download_and_save(url, report_date, asyncio.Semaphore(1))
+            if not saved:
+                return None
+            count = await ReportParser().process_files([Path(saved)], 1)
+        if not count:
+            # парсер глотает ошибки разбора и записи в БД и возвращает 0; в опубликованном бюллетене строки
+            # есть всегда, поэтому это сбой, и дату нужно повторить, а не отметить загруженной
+            return None
+        await on_ingestion_complete(dates=[report_date])
+        return count
+
+    def _retry_later(self, now: datetime):
+        self.next_attempt = now + timedelta(seconds=self.backoff)
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+
+    def _finish(self, day: date):
+        self.done = {d for d in self.done if d >= day - timedelta(days=7)} | {day}
+        self.next_attempt = None
+        self.backoff = self.backoff_initial
+
+    async def tick(self, now: Optional[datetime] = None) -> Optional[int]:
+        now = now or self.now()
+        day = self.due(now)
+        # аренда продлевается и во время ожидания повтора, чтобы другая реплика не начала свой опрос
+        if day is None or not await self.lease.acquire():
+            return None
+        if self.next_attempt is not None and now < self.next_attempt:
+            return None
+        if await self.is_ingested(day):
+            self._finish(day)
+            return 0
+        count = await self.ingest(day)
+        if count is None:
+            logger.info(f"Бюллетень за {day} ещё не загружен, повтор через {self.backoff:.0f} с")
+            self._retry_later(now)
+            return None
+        logger.info(f"Планировщик загрузил бюллетень за {day}: {count} записей")
+        self._finish(day)
+        return count
+
+    async def run(self):
+        logger.info(f"Планировщик загрузки запущен ({self.lease.owner})")
+        while not self._stopped.is_set():
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Ошибка планировщика загрузки: {e}", exc_info=True)
+                self._retry_later(self.now())
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.tick_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        self._stopped.set()
+        await self.lease.release()
+        await self.lease.close()
@@ -1,83 +1,389 @@
 import json
-from datetime import date, datetime, time
-from typing import List, Optional, Dict, Any
-from sqlalchemy import select, desc, and_
+import re
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from time import perf_counter, monotonic
+from typing import List, Optional, Dict, Any, Union, Callable, Awaitable, Iterable, AsyncIterator, Tuple, TYPE_CHECKING
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
 import redis.asyncio as redis
-from ..models import SpimexTradingResult
-from ..database import AsyncSessionLocal
-from ..config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
+from ..models import SpimexTradingDay
+from .queries import dynamics_query, dynamics_batch_query, trading_results_query, row_to_result, rows_to_results
+from .rollups import series_query, series_rows_to_results, aggregate_query, aggregate_rows_to_results, AGGREGATE_METRICS
+from ..database import ReadSessionLocal
+from .admission import DbGate, db_miss_gate
+from .redis_client import get_redis
+from ..config import EXCHANGE_TZ, CACHE_RESET_TIME, COLUMNAR_ENGINE_ENABLED
 from ..utils.logger import logger
+from ..utils.serialization import dumps, loads
+from ..utils.metrics import CACHE_REQUESTS, CACHE_SECONDS
+from ..utils.timing import record_span
+
+if TYPE_CHECKING:
+    from .columnar import ColumnarStore, ColumnarSnapshot
+
+
+CACHE_PATTERN = "trading:*"
+# служебные ключи вне trading:*, чтобы не удалялись вместе с кэшем
+RESET_MARKER_KEY = "trading_meta:cache_reset_on"
+# частоты запросов для прогрева: отдельный ZSET на каждый биржевой день, trading_stats:queries:{день}
+QUERY_STATS_KEY = "trading_stats:queries"
+# версия формата значений в кэше: для dynamics/trading_results там лежит готовое тело ответа
+CACHE_FORMAT = "v2"
+QUERY_STATS_LIMIT = 1000
+# сколько дней статистики учитывается и вес каждого предыдущего дня относительно следующего
+QUERY_STATS_DAYS = 7
+QUERY_STATS_DECAY = 0.5
+QUERY_STATS_FLUSH_SECONDS = 10
+# запросы, чей конец периода ближе этого к сегодняшнему дню, считаются окном "последние N дней"
+RELATIVE_WINDOW_SLACK = timedelta(days=3)
+# даты из параметров в ключе кэша: "..._end_date_2025-07-11_..._start_date_2025-07-01"
+KEY_DATE_PATTERN = re.compile(r"(?:^|_)(start_date|end_date|day)_(\d{4}-\d{2}-\d{2})(?=_|$)")
+
+
+def exchange_today() -> date:
+    # «сегодня» по бирже: окна «последние N дней», метка сброса и дневная статистика меняются в полночь по Москве
+    return datetime.now(EXCHANGE_TZ).date()
+
+
+class QueryStats:
+    # Частоты запросов копятся в памяти процесса и уходят в Redis одной пачкой не чаще раза в flush_interval
+    # секунд, а не записью на каждый запрос. Дневные ZSET живут days дней; при чтении старшие дни берутся
+    # с весом decay ** возраст, поэтому накопленные за прошлое частоты не вытесняют новые популярные запросы.
+    def __init__(self, flush_interval: float = QUERY_STATS_FLUSH_SECONDS, days: int = QUERY_STATS_DAYS,
+                 decay: float = QUERY_STATS_DECAY, limit: int = QUERY_STATS_LIMIT):
+        self.flush_interval = flush_interval
+        self.days = days
+        self.decay = decay
+        self.limit = limit
+        self.pending: Counter = Counter()
+        self._flushed_at = monotonic()
+
+    @staticmethod
+    def key(day: date) -> str:
+        return f"{QUERY_STATS_KEY}:{day.isoformat()}"
+
+    def add(self, member: str):
+        self.pending[member] += 1
+
+    def due(self) -> bool:
+        return bool(self.pending) and monotonic() - self._flushed_at >= self.flush_interval
+
+    async def flush(self, redis_client: redis.Redis):
+        pending, self.pending = self.pending, Counter()
+        self._flushed_at = monotonic()
+        if not pending:
+            return
+        key = self.key(exchange_today())
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for member, count in pending.items():
+                pipe.zincrby(key, count, member)
+            pipe.zremrangebyrank(key, 0, -self.limit - 1)
+            pipe.expire(key, self.days * 86400)
+            await pipe.execute()
+
+    async def top(self, redis_client: redis.Redis, n: int) -> List[Tuple[str, float]]:
+        # (запрос, частота) по убыванию частоты за последние days дней с затуханием
+        today = exchange_today()
+        weights = {self.key(today - timedelta(days=age)): self.decay ** age for age in range(self.days)}
+        ranked = await redis_client.zunion(weights, withscores=True)
+        return list(reversed(ranked))[:n]
+
+
+query_stats = QueryStats()
 
 
 class TradingService:
-    def __init__(self):
+    # день, за который плановый сброс уже сверен с Redis; общий для всех экземпляров процесса
+    # (сервис создаётся на каждый запрос), до смены дня запросы за меткой сброса в Redis не ходят
+    reset_checked_on: Optional[str] = None
+
+    def __init__(self, record_queries: bool = True, session_factory: Optional[Callable[[], AsyncSession]] = None,
+                 columnar: Optional["ColumnarStore"] = None, db_gate: Optional[DbGate] = db_miss_gate):
         self.redis: Optional[redis.Redis] = None
+        # готовые тела ответов читаются без декодирования: байты из Redis сразу уходят в ответ
+        self.redis_bytes: Optional[redis.Redis] = None
+        # по умолчанию пул чтения (или реплика)
+        self.session_factory = session_factory
+        # снимок истории в памяти; None — общий columnar_store, если включён COLUMNAR_ENGINE_ENABLED
+        self.columnar = columnar
+        # ограничение одновременных запросов в БД на промахах кэша; None — без ограничения (прогрев кэша)
+        self.db_gate = db_gate
         self.cache_ttl = 3600
-        self.cache_reset_time = time(14, 11)  # без привязки в часовому поясу
+        self.cache_reset_time = CACHE_RESET_TIME  # по биржевому времени (EXCHANGE_TZ)
+        self.record_queries = record_queries
+
+    def _session(self) -> AsyncSession:
+        return (self.session_factory or ReadSessionLocal)()
+
+    @asynccontextmanager
+    async def _db(self) -> AsyncIterator[AsyncSession]:
+        # сессия для промаха кэша; при перегрузке — Overloaded (503) вместо ожидания в очереди пула
+        if self.db_gate is None:
+            async with self._session() as session:
+                yield session
+            return
+        async with self.db_gate.acquire():
+            async with self._session() as session:
+                yield session
+
+    async def _snapshot(self) -> Optional["ColumnarSnapshot"]:
+        store = self.columnar
+        if store is None:
+            if not COLUMNAR_ENGINE_ENABLED:
+                return None
+            # NumPy и снимок загружаются, только если движок включён
+            from .columnar import columnar_store as store
+        return await store.current()
 
     async def _get_redis(self) -> redis.Redis:
         if self.redis is None:
-            self.redis = redis.Redis(
-                host=REDIS_HOST,
-                port=REDIS_PORT,
-                db=REDIS_DB,
-                password=REDIS_PASSWORD,
-                decode_responses=True
-            )
-        try:
-            await self.redis.ping()
-        except Exception as e:
-            logger.error(f"Ошибка подключения к Redis: {e}")
-            self.redis = None
-            raise
+            self.redis = get_redis()
         return self.redis
 
+    async def _get_redis_bytes(self) -> redis.Redis:
+        if self.redis_bytes is None:
+            self.redis_bytes = get_redis(decode=False)
+        return self.redis_bytes
+
     async def _get_cache_key(self, method: str, **params) -> str:
         param_str = "_".join([f"{k}_{v}" for k, v in sorted(params.items())])
-        return f"trading:{method}:{param_str}"
+        return f"trading:{CACHE_FORMAT}:{method}:{param_str}"
 
     async def _should_reset_cache(self) -> bool:
-        now = datetime.now().time()
+        now = datetime.now(EXCHANGE_TZ).time()
         return now >= self.cache_reset_time
 
     async def _clear_cache_if_needed(self):
-        if await self._should_reset_cache():
+        if not await self._should_reset_cache():
+            return
+        today = exchange_today().isoformat()
+        if TradingService.reset_checked_on == today:
+            return
+        try:
             redis_client = await self._get_redis()
-            pattern = "trading:*"
-            keys = await redis_client.keys(pattern)
-            if keys:
-                await redis_client.delete(*keys)
-                logger.info(f"Кэш очищен: удалено {len(keys)} ключей")
+            # сбрасываем один раз в день: метку атомарно ставит первый запрос после cache_reset_time
+            previous = await redis_client.set(RESET_MARKER_KEY, today, get=True)
+            TradingService.reset_checked_on = today
+            if previous != today:
+                await self.invalidate_cache()
+        except Exception as e:
+            logger.error(f"Ошибка сброса кэша: {e}")
+
+    async def invalidate_cache(self) -> int:
+        redis_client = await self._get_redis()
+        deleted = 0
+        batch = []
+        async for key in redis_client.scan_iter(match=CACHE_PATTERN, count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                deleted += await redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await redis_client.unlink(*batch)
+        logger.info(f"Кэш очищен: удалено {deleted} ключей")
+        return deleted
+
+    @staticmethod
+    def _key_affected(cache_key: str, dates: List[date]) -> bool:
+        # trading:{CACHE_FORMAT}:{method}:{params}; ключ без дат (последние дни, последние торги) зависит от любой
+        # новой даты, ключ с периодом — только если новая дата попадает в период
+        params = cache_key.split(":", 3)[3] if cache_key.count(":") >= 3 else ""
+        found = dict(KEY_DATE_PATTERN.findall(params))
+        if "day" in found:
+            return found["day"] in {d.isoformat() for d in dates}
+        if "start_date" not in found or "end_date" not in found:
+            return True
+        start, end = date.fromisoformat(found["start_date"]), date.fromisoformat(found["end_date"])
+        return any(start <= d <= end for d in dates)
+
+    async def invalidate_dates(self, dates: Iterable[date]) -> int:
+        # точечный сброс после загрузки отдельных дат: остальные ключи остаются в кэше
+        dates = list(dates)
+        redis_client = await self._get_redis()
+        deleted = 0
+        batch = []
+        async for key in redis_client.scan_iter(match=CACHE_PATTERN, count=1000):
+            if not self._key_affected(key, dates):
+                continue
+            batch.append(key)
+            if len(batch) >= 1000:
+                deleted += await redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await redis_client.unlink(*batch)
+        logger.info(f"Кэш за {', '.join(d.isoformat() for d in dates)}: удалено {deleted} ключей")
+        return deleted
+
+    @staticmethod
+    def _normalize_query(params: Dict[str, Any]) -> Dict[str, Any]:
+        # окно, заканчивающееся "сегодня", запоминаем как длину окна, чтобы прогрев сдвигал его вперёд
+        end_date = params.get("end_date")
+        if not end_date or date.fromisoformat(end_date) < exchange_today() - RELATIVE_WINDOW_SLACK:
+            return params
+        normalized = {k: v for k, v in params.items() if k not in ("start_date", "end_date")}
+        normalized["window_days"] = (date.fromisoformat(end_date) - date.fromisoformat(params["start_date"])).days
+        return normalized
+
+    async def _record_query(self, method: str, params: Dict[str, Any]):
+        await self._record_queries(method, [params])
+
+    async def _record_queries(self, method: str, params_list: List[Dict[str, Any]]):
+        if not self.record_queries:
+            return
+        for params in params_list:
+            query_stats.add(json.dumps({"method": method, "params": self._normalize_query(params)}, sort_keys=True))
+        if not query_stats.due():
+            return
+        try:
+            await query_stats.flush(await self._get_redis())
+        except Exception as e:
+            logger.debug(f"Не удалось записать статистику запроса: {e}")
 
-    async def _get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _cache_method(cache_key: str) -> str:
+        # trading:{CACHE_FORMAT}:{method}:{params}
+        parts = cache_key.split(":", 3)
+        return parts[2] if len(parts) > 2 else "unknown"
+
+    async def _read_cache(self, cache_key: str, raw: bool = False) -> Optional[Union[str, bytes]]:
+        started = perf_counter()
+        method = self._cache_method(cache_key)
         try:
-            redis_client = await self._get_redis()
+            redis_client = await (self._get_redis_bytes() if raw else self._get_redis())
             data = await redis_client.get(cache_key)
-            if data:
-                return json.loads(data)
+            CACHE_REQUESTS.inc(method=method, result="hit" if data else "miss")
+            return data or None
         except Exception as e:
+            CACHE_REQUESTS.inc(method=method, result="error")
             logger.error(f"Ошибка получения из кэша: {e}")
+            return None
+        finally:
+            elapsed = perf_counter() - started
+            CACHE_SECONDS.observe(elapsed, operation="get")
+            record_span("cache", elapsed)
+
+    async def _get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        data = await self._read_cache(cache_key)
+        if data:
+            try:
+                return loads(data)
+            except Exception as e:
+                logger.error(f"Ошибка получения из кэша: {e}")
         return None
 
-    async def _set_cache(self, cache_key: str, data: Dict[str, Any]):
+    async def _get_raw_from_cache(self, cache_key: str) -> Optional[bytes]:
+        # без декодирования: значение уже является телом ответа
+        return await self._read_cache(cache_key, raw=True)
+
+    async def _set_cache(self, cache_key: str, data: Union[Dict[str, Any], bytes]):
+        started = perf_counter()
         try:
             redis_client = await self._get_redis()
-            await redis_client.setex(cache_key, self.cache_ttl, json.dumps(data))
+            await redis_client.setex(cache_key, self.cache_ttl, data if isinstance(data, bytes) else dumps(data))
         except Exception as e:
             logger.error(f"Ошибка сохранения в кэш: {e}")
+        finally:
+            elapsed = perf_counter() - started
+            CACHE_SECONDS.observe(elapsed, operation="set")
+            record_span("cache", elapsed)
+
+    async def _get_many_from_cache(self, cache_keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        started = perf_counter()
+        method = self._cache_method(cache_keys[0]) if cache_keys else "unknown"
+        try:
+            redis_client = await self._get_redis()
+            values = await redis_client.mget(cache_keys)
+            hits = sum(1 for data in values if data)
+            CACHE_REQUESTS.inc(hits, method=method, result="hit")
+            CACHE_REQUESTS.inc(len(values) - hits, method=method, result="miss")
+            return [loads(data) if data else None for data in values]
+        except Exception as e:
+            CACHE_REQUESTS.inc(len(cache_keys), method=method, result="error")
+            logger.error(f"Ошибка получения из кэша: {e}")
+        finally:
+            elapsed = perf_counter() - started
+            CACHE_SECONDS.observe(elapsed, operation="mget")
+            record_span("cache", elapsed)
+        return [None] * len(cache_keys)
+
+    async def _set_many_cache(self, items: Dict[str, Dict[str, Any]]):
+        started = perf_counter()
+        try:
+            redis_client = await self._get_redis()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for cache_key, data in items.items():
+                    pipe.setex(cache_key, self.cache_ttl, dumps(data))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения в кэш: {e}")
+        finally:
+            elapsed = perf_counter() - started
+            CACHE_SECONDS.observe(elapsed, operation="mset")
+            record_span("cache", elapsed)
+
+    @staticmethod
+    def _dynamics_params(
+            start_date: date,
+            end_date: date,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "oil_id": oil_id or "",
+            "delivery_type_id": delivery_type_id or "",
+            "delivery_basis_id": delivery_basis_id or ""
+        }
+
+    @staticmethod
+    def _trading_results_params(
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None,
+            limit: int = 100
+    ) -> Dict[str, Any]:
+        return {
+            "oil_id": oil_id or "",
+            "delivery_type_id": delivery_type_id or "",
+            "delivery_basis_id": delivery_basis_id or "",
+            "limit": limit
+        }
+
+    async def _get_payload(self, method: str, params: Dict[str, Any],
+                           load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> bytes:
+        # готовое тело ответа {"results": [...], "count": N}: при попадании в кэш байты отдаются без разбора,
+        # при промахе сериализуются один раз и для ответа, и для кэша
+        await self._clear_cache_if_needed()
+        cache_key = await self._get_cache_key(method, **params)
+        await self._record_query(method, params)
+
+        cached_data = await self._get_raw_from_cache(cache_key)
+        if cached_data:
+            return cached_data
+
+        results = await load()
+        payload = dumps({"results": results, "count": len(results)})
+        await self._set_cache(cache_key, payload)
+        return payload
 
     async def get_last_trading_dates(self, limit: int = 10) -> List[date]:
         await self._clear_cache_if_needed()
-        cache_key = await self._get_cache_key("last_trading_dates", limit=limit)
+        params = {"limit": limit}
+        cache_key = await self._get_cache_key("last_trading_dates", **params)
+        await self._record_query("last_trading_dates", params)
         cached_data = await self._get_from_cache(cache_key)
 
         if cached_data:
             return [date.fromisoformat(d) for d in cached_data["dates"]]
 
-        async with AsyncSessionLocal() as session:
-            query = select(SpimexTradingResult.date) \
-                .distinct() \
-                .order_by(desc(SpimexTradingResult.date)) \
+        async with self._db() as session:
+            # календарь торговых дней: чтение limit строк по первичному ключу вместо DISTINCT по всей таблице
+            query = select(SpimexTradingDay.date) \
+                .order_by(desc(SpimexTradingDay.date)) \
                 .limit(limit)
 
             result = await session.execute(query)
@@ -88,6 +394,37 @@ class TradingService:
 
             return dates
 
+    async def get_trading_day(self, day: date) -> Dict[str, Any]:
+        await self._clear_cache_if_needed()
+        params = {"day": day.isoformat()}
+        cache_key = await self._get_cache_key("trading_day", **params)
+
+        cached_data = await self._get_from_cache(cache_key)
+        if cached_data:
+            return cached_data
+
+        async with self._db() as session:
+            query = select(
+                SpimexTradingDay.rows,
+                SpimexTradingDay.volume,
+                SpimexTradingDay.total,
+                SpimexTradingDay.count
+            ).where(SpimexTradingDay.date == day)
+            result = await session.execute(query)
+            row = result.first()
+
+            summary = {
+                "date": day.isoformat(),
+                "is_trading_day": row is not None,
+                "rows": row[0] if row else 0,
+                "volume": float(row[1]) if row and row[1] is not None else None,
+                "total": float(row[2]) if row and row[2] is not None else None,
+                "count": row[3] if row and row[3] is not None else 0
+            }
+            await self._set_cache(cache_key, summary)
+
+            return summary
+
     async def get_dynamics(
             self,
             start_date: date,
@@ -97,64 +434,83 @@ class TradingService:
             delivery_basis_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
 
+        snapshot = await self._snapshot()
+        if snapshot is not None:
+            return snapshot.dynamics(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+
         await self._clear_cache_if_needed()
 
-        cache_key = await self._get_cache_key(
-            "dynamics",
-            start_date=start_date.isoformat(),
-            end_date=end_date.isoformat(),
-            oil_id=oil_id or "",
-            delivery_type_id=delivery_type_id or "",
-            delivery_basis_id=delivery_basis_id or ""
-        )
+        params = self._dynamics_params(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+        cache_key = await self._get_cache_key("dynamics", **params)
+        await self._record_query("dynamics", params)
 
         cached_data = await self._get_from_cache(cache_key)
         if cached_data:
             return cached_data["results"]
 
-        async with AsyncSessionLocal() as session:
-            conditions = [
-                SpimexTradingResult.date >= start_date,
-                SpimexTradingResult.date <= end_date
-            ]
+        results = await self._load_dynamics(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+        await self._set_cache(cache_key, {"results": results, "count": len(results)})
+        return results
 
-            if oil_id:
-                conditions.append(SpimexTradingResult.oil_id == oil_id)
-            if delivery_type_id:
-                conditions.append(SpimexTradingResult.delivery_type_id == delivery_type_id)
-            if delivery_basis_id:
-                conditions.append(SpimexTradingResult.delivery_basis_id == delivery_basis_id)
+    async def get_dynamics_json(
+            self,
+            start_date: date,
+            end_date: date,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None
+    ) -> bytes:
+        snapshot = await self._snapshot()
+        if snapshot is not None:
+            results = snapshot.dynamics(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+            return dumps({"results": results, "count": len(results)})
+        params = self._dynamics_params(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+        return await self._get_payload("dynamics", params, lambda: self._load_dynamics(
+            start_date, end_date, oil_id, delivery_type_id, delivery_basis_id))
+
+    async def _load_dynamics(
+            self,
+            start_date: date,
+            end_date: date,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        async with self._db() as session:
+            query = dynamics_query(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+            result = await session.execute(query)
+            return rows_to_results(result.fetchall())
 
-            query = select(SpimexTradingResult) \
-                .where(and_(*conditions)) \
-                .order_by(SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+    async def get_dynamics_batch(self, filters: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        snapshot = await self._snapshot()
+        if snapshot is not None:
+            return [snapshot.dynamics(**item) for item in filters]
 
-            result = await session.execute(query)
-            records = result.scalars().fetchall()
-
-            results = []
-            for record in records:
-                results.append({
-                    "id": record.id,
-                    "exchange_product_id": record.exchange_product_id,
-                    "exchange_product_name": record.exchange_product_name,
-                    "oil_id": record.oil_id,
-                    "delivery_basis_id": record.delivery_basis_id,
-                    "delivery_basis_name": record.delivery_basis_name,
-                    "delivery_type_id": record.delivery_type_id,
-                    "volume": float(record.volume) if record.volume else None,
-                    "total": float(record.total) if record.total else None,
-                    "count": record.count,
-                    "date": record.date.isoformat(),
-                    "created_on": record.created_on.isoformat() if record.created_on else None,
-                    "updated_on": record.updated_on.isoformat() if record.updated_on else None
-                })
+        await self._clear_cache_if_needed()
 
-            cache_data = {"results": results}
-            await self._set_cache(cache_key, cache_data)
+        params_list = [self._dynamics_params(**item) for item in filters]
+        cache_keys = [await self._get_cache_key("dynamics", **params) for params in params_list]
+        await self._record_queries("dynamics", params_list)
 
+        # попадания в кэш одним MGET, промахи одним SQL-запросом
+        results: List[Optional[List[Dict[str, Any]]]] = [
+            cached["results"] if cached else None for cached in await self._get_many_from_cache(cache_keys)
+        ]
+        missing_keys = list(dict.fromkeys(key for key, result in zip(cache_keys, results) if result is None))
+        if not missing_keys:
             return results
 
+        missing_filters = [filters[cache_keys.index(key)] for key in missing_keys]
+        grouped: List[List[Dict[str, Any]]] = [[] for _ in missing_keys]
+        async with self._db() as session:
+            result = await session.execute(dynamics_batch_query(missing_filters))
+            for row in result.fetchall():
+                grouped[row[0]].append(row_to_result(row[1:]))
+
+        loaded = dict(zip(missing_keys, grouped))
+        await self._set_many_cache({key: {"results": rows, "count": len(rows)} for key, rows in loaded.items()})
+        return [result if result is not None else loaded[key] for key, result in zip(cache_keys, results)]
+
     async def get_trading_results(
             self,
             oil_id: Optional[str] = None,
@@ -163,63 +519,180 @@ class TradingService:
             limit: int = 100
     ) -> List[Dict[str, Any]]:
 
+        snapshot = await self._snapshot()
+        if snapshot is not None:
+            return snapshot.trading_results(oil_id, delivery_type_id, delivery_basis_id, limit)
+
+        await self._clear_cache_if_needed()
+
+        params = self._trading_results_params(oil_id, delivery_type_id, delivery_basis_id, limit)
+        cache_key = await self._get_cache_key("trading_results", **params)
+        await self._record_query("trading_results", params)
+
+        cached_data = await self._get_from_cache(cache_key)
+        if cached_data:
+            return cached_data["results"]
+
+        results = await self._load_trading_results(oil_id, delivery_type_id, delivery_basis_id, limit)
+        await self._set_cache(cache_key, {"results": results, "count": len(results)})
+        return results
+
+    async def get_trading_results_json(
+            self,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None,
+            limit: int = 100
+    ) -> bytes:
+        snapshot = await self._snapshot()
+        if snapshot is not None:
+            results = snapshot.trading_results(oil_id, delivery_type_id, delivery_basis_id, limit)
+            return dumps({"results": results, "count": len(results)})
+        params = self._trading_results_params(oil_id, delivery_type_id, delivery_basis_id, limit)
+        return await self._get_payload("trading_results", params, lambda: self._load_trading_results(
+            oil_id, delivery_type_id, delivery_basis_id, limit))
+
+    async def _load_trading_results(
+            self,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None,
+            limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        async with self._db() as session:
+            query = trading_results_query(oil_id, delivery_type_id, delivery_basis_id, limit)
+            result = await session.execute(query)
+            return rows_to_results(result.fetchall())
+
+    async def get_series(
+            self,
+            start_date: date,
+            end_date: date,
+            granularity: str = "day",
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+
         await self._clear_cache_if_needed()
 
-        cache_key = await self._get_cache_key(
-            "trading_results",
-            oil_id=oil_id or "",
-            delivery_type_id=delivery_type_id or "",
-            delivery_basis_id=delivery_basis_id or "",
-            limit=limit
-        )
+        params = {
+            "granularity": granularity,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "oil_id": oil_id or "",
+            "delivery_type_id": delivery_type_id or "",
+            "delivery_basis_id": delivery_basis_id or ""
+        }
+        cache_key = await self._get_cache_key("series", **params)
+        await self._record_query("series", params)
 
         cached_data = await self._get_from_cache(cache_key)
         if cached_data:
             return cached_data["results"]
 
-        async with AsyncSessionLocal() as session:
-            conditions = []
+        async with self._db() as session:
+            query = series_query(granularity, start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+            result = await session.execute(query)
+            results = series_rows_to_results(result.fetchall())
+
+            cache_data = {"results": results}
+            await self._set_cache(cache_key, cache_data)
+
+            return results
 
-            if oil_id:
-                conditions.append(SpimexTradingResult.oil_id == oil_id)
-            if delivery_type_id:
-                conditions.append(SpimexTradingResult.delivery_type_id == delivery_type_id)
-            if delivery_basis_id:
-                conditions.append(SpimexTradingResult.delivery_basis_id == delivery_basis_id)
+    async def get_aggregates(
+            self,
+            start_date: date,
+            end_date: date,
+            group_by: Iterable[str] = ("delivery_basis_id",),
+            bucket: str = "month",
+            metrics: Iterable[str] = AGGREGATE_METRICS,
+            order_by: Optional[str] = "total",
+            order: str = "desc",
+            limit: int = 20,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
 
-            query = select(SpimexTradingResult)
-            if conditions:
-                query = query.where(and_(*conditions))
+        await self._clear_cache_if_needed()
+
+        group_by, metrics = list(group_by), list(metrics)
+        params = {
+            "group_by": ",".join(group_by),
+            "bucket": bucket,
+            "metrics": ",".join(metrics),
+            "order_by": order_by or "",
+            "order": order,
+            "limit": limit,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "oil_id": oil_id or "",
+            "delivery_type_id": delivery_type_id or "",
+            "delivery_basis_id": delivery_basis_id or ""
+        }
+        cache_key = await self._get_cache_key("aggregates", **params)
+        await self._record_query("aggregates", params)
 
-            query = query.order_by(desc(SpimexTradingResult.date), desc(SpimexTradingResult.id)).limit(limit)
+        cached_data = await self._get_from_cache(cache_key)
+        if cached_data:
+            return cached_data["results"]
 
+        async with self._db() as session:
+            query = aggregate_query(start_date, end_date, group_by, bucket, order_by, order, limit,
+                                    oil_id, delivery_type_id, delivery_basis_id)
             result = await session.execute(query)
-            records = result.scalars().fetchall()
-
-            results = []
-            for record in records:
-                results.append({
-                    "id": record.id,
-                    "exchange_product_id": record.exchange_product_id,
-                    "exchange_product_name": record.exchange_product_name,
-                    "oil_id": record.oil_id,
-                    "delivery_basis_id": record.delivery_basis_id,
-                    "delivery_basis_name": record.delivery_basis_name,
-                    "delivery_type_id": record.delivery_type_id,
-                    "volume": float(record.volume) if record.volume else None,
-                    "total": float(record.total) if record.total else None,
-                    "count": record.count,
-                    "date": record.date.isoformat(),
-                    "created_on": record.created_on.isoformat() if record.created_on else None,
-                    "updated_on": record.updated_on.isoformat() if record.updated_on else None
-                })
+            results = aggregate_rows_to_results(result.fetchall(), group_by, metrics)
 
             cache_data = {"results": results}
             await self._set_cache(cache_key, cache_data)
 
             return results
 
+    async def get_price_analytics(
+            self,
+            start_date: date,
+            end_date: date,
+            oil_id: Optional[str] = None,
+            delivery_type_id: Optional[str] = None,
+            delivery_basis_id: Optional[str] = None,
+            resample: str = "week",
+            window: int = 5
+    ) -> Dict[str, Any]:
+
+        await self._clear_cache_if_needed()
+
+        params = {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "oil_id": oil_id or "",
+            "delivery_type_id": delivery_type_id or "",
+            "delivery_basis_id": delivery_basis_id or "",
+            "resample": resample,
+            "window": window
+        }
+        cache_key = await self._get_cache_key("price_analytics", **params)
+        await self._record_query("price_analytics", params)
+
+        cached_data = await self._get_from_cache(cache_key)
+        if cached_data:
+            return cached_data
+
+        # NumPy нужен только аналитике: не загружаем его при старте воркера
+        from .analytics import PriceAnalytics, price_series_query
+
+        async with self._db() as session:
+            query = price_series_query(start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+            result = await session.execute(query)
+            analytics = PriceAnalytics.from_rows(result.fetchall())
+            results = analytics.compute(resample=resample, window=window)
+
+            await self._set_cache(cache_key, results)
+
+            return results
+
     async def close(self):
-        if self.redis:
-            await self.redis.close()
-            self.redis = None
+        # пулы общие для процесса (redis_client), сервис только отпускает ссылки
+        self.redis = None
+        self.redis_bytes = None
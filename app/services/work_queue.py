@@ -0,0 +1,371 @@
+import asyncio
+import os
+import socket
+from contextlib import asynccontextmanager
+from datetime import date
+from pathlib import Path
+from typing import Optional, Set, Tuple, Iterable, List, Dict, Any, AsyncIterator
+from uuid import uuid4
+import redis.asyncio as redis
+from sqlalchemy import select
+from ..config import (
+    REPORTS_DIR, INGEST_LEASE_SECONDS, INGEST_MAX_ATTEMPTS, INGEST_WORKER_POLL_SECONDS
+)
+from .redis_client import get_redis
+from ..database import AsyncSessionLocal
+from ..models import SpimexTradingDay
+from .post_ingestion import on_ingestion_complete
+from ..utils.logger import logger
+
+KEY_PREFIX = "trading_meta:ingest"
+# ключи передаются каждому скрипту в одном порядке: KEYS[1]..KEYS[7]
+QUEUE_KEYS = tuple(f"{KEY_PREFIX}:{name}" for name in
+                   ("pending", "running", "owners", "urls", "attempts", "failed", "workers"))
+
+# Время берётся у Redis, а не у узлов: сроки аренд не зависят от расхождения часов.
+# Просроченные аренды (воркер упал и перестал присылать пульс) возвращают дату в очередь.
+_PRELUDE = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+for _, day in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[2], day)
+    redis.call('HDEL', KEYS[3], day)
+    if redis.call('HEXISTS', KEYS[4], day) == 1 then
+        redis.call('ZADD', KEYS[1], 0, day)
+    end
+end
+"""
+# даты в ISO, при равном счёте ZSET упорядочен по строке — т.е. по дате
+ENQUEUE_SCRIPT = _PRELUDE + """
+local added = 0
+for i = 1, #ARGV, 2 do
+    local day = ARGV[i]
+    redis.call('HSET', KEYS[4], day, ARGV[i + 1])
+    redis.call('HDEL', KEYS[5], day)
+    redis.call('ZREM', KEYS[6], day)
+    if not redis.call('ZSCORE', KEYS[2], day) then
+        added = added + redis.call('ZADD', KEYS[1], 'NX', 0, day)
+    end
+end
+return added
+"""
+# ARGV[1] — токен аренды: свой на каждое взятие даты, а не на процесс, поэтому задачи одного процесса
+# (эндпоинты, планировщик, воркер) тоже не берут одну дату дважды и не отпускают чужую аренду
+CLAIM_SCRIPT = _PRELUDE + """
+local day = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+if not day then
+    return false
+end
+redis.call('ZREM', KEYS[1], day)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), day)
+redis.call('HSET', KEYS[3], day, ARGV[1])
+return {day, redis.call('HGET', KEYS[4], day)}
+"""
+# аренда конкретной даты вне очереди (эндпоинты загрузки, планировщик); занятая дата не берётся никем
+LEASE_SCRIPT = _PRELUDE + """
+if redis.call('HEXISTS', KEYS[3], ARGV[3]) == 1 then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[3])
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[1])
+return 1
+"""
+# ARGV[1] — воркер (отмечается живым), дальше пары дата, токен аренды
+HEARTBEAT_SCRIPT = _PRELUDE + """
+redis.call('HSET', KEYS[7], ARGV[1], now)
+local renewed = 0
+for i = 3, #ARGV, 2 do
+    if redis.call('HGET', KEYS[3], ARGV[i]) == ARGV[i + 1] then
+        redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), ARGV[i])
+        renewed = renewed + 1
+    end
+end
+return renewed
+"""
+COMPLETE_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('HDEL', KEYS[3], ARGV[2])
+redis.call('HDEL', KEYS[4], ARGV[2])
+redis.call('HDEL', KEYS[5], ARGV[2])
+return 1
+"""
+# аренда отпущена без загрузки: дата из очереди возвращается в неё
+RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('HDEL', KEYS[3], ARGV[2])
+if redis.call('HEXISTS', KEYS[4], ARGV[2]) == 1 then
+    redis.call('ZADD', KEYS[1], 0, ARGV[2])
+end
+return 1
+"""
+FAIL_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[2]) ~= ARGV[1] then
+    return -1
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('HDEL', KEYS[3], ARGV[2])
+local attempts = redis.call('HINCRBY', KEYS[5], ARGV[2], 1)
+if attempts >= tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[4], ARGV[2])
+    redis.call('ZADD', KEYS[6], 0, ARGV[2])
+else
+    redis.call('ZADD', KEYS[1], 0, ARGV[2])
+end
+return attempts
+"""
+
+
+async def ingested_dates(start_date: date, end_date: date) -> Set[date]:
+    # дни, которые уже есть в БД (календарь торговых дней ведёт rollup_service)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(SpimexTradingDay.date).where(SpimexTradingDay.date.between(start_date, end_date))
+        )
+        return {row[0] for row in result.fetchall()}
+
+
+class IngestionQueue:
+    # Общая для всех реплик очередь дат бюллетеней в Redis. Дата в работе — под арендой владельца
+    # (running: дата -> срок аренды, owners: дата -> владелец); владелец продлевает аренду пульсом.
+    # Одну дату одновременно загружает только один процесс, даты упавшего воркера подхватывают остальные.
+    def __init__(self, lease_seconds: float = INGEST_LEASE_SECONDS, max_attempts: int = INGEST_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.lease_ms = int(lease_seconds * 1000)
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.redis: Optional[redis.Redis] = None
+
+    def _get_redis(self) -> redis.Redis:
+        if self.redis is None:
+            self.redis = get_redis()
+        return self.redis
+
+    async def _eval(self, script: str, *args) -> Any:
+        return await self._get_redis().eval(script, len(QUEUE_KEYS), *QUEUE_KEYS, *args)
+
+    async def enqueue(self, reports: Iterable[Tuple[str, date]]) -> int:
+        # (url, дата) -> очередь; возвращает число новых дат (уже ждущие и взятые в работу не дублируются)
+        args = []
+        for url, report_date in reports:
+            args += [report_date.isoformat(), url]
+        if not args:
+            return 0
+        return int(await self._eval(ENQUEUE_SCRIPT, *args))
+
+    def _token(self) -> str:
+        # владелец в owners: процесс (видно в статусе) и конкретное взятие даты
+        return f"{self.owner}/{uuid4().hex[:12]}"
+
+    async def claim(self) -> Optional[Tuple[date, str, str]]:
+        # (дата, url, токен аренды) или None, если очередь пуста
+        token = self._token()
+        claimed = await self._eval(CLAIM_SCRIPT, token, self.lease_ms)
+        if not claimed:
+            return None
+        day, url = claimed
+        return date.fromisoformat(day), url, token
+
+    async def lease(self, day: date) -> Optional[str]:
+        # токен аренды или None, если дату уже держит кто-то другой (в том числе задача этого же процесса)
+        token = self._token()
+        if await self._eval(LEASE_SCRIPT, token, self.lease_ms, day.isoformat()):
+            return token
+        return None
+
+    async def heartbeat(self, leases: Optional[Dict[date, str]] = None) -> int:
+        # продлевает аренды (дата -> токен) и отмечает воркер живым; возвращает число продлённых аренд
+        args = []
+        for day, token in (leases or {}).items():
+            args += [day.isoformat(), token]
+        return int(await self._eval(HEARTBEAT_SCRIPT, self.owner, self.lease_ms, *args))
+
+    async def complete(self, day: date, token: str) -> bool:
+        return bool(await self._eval(COMPLETE_SCRIPT, token, day.isoformat()))
+
+    async def release(self, day: date, token: str) -> bool:
+        return bool(await self._eval(RELEASE_SCRIPT, token, day.isoformat()))
+
+    async def fail(self, day: date, token: str) -> int:
+        # номер неудачной попытки; после max_attempts дата уходит в failed (-1 — аренда уже не наша)
+        return int(await self._eval(FAIL_SCRIPT, token, day.isoformat(), self.max_attempts))
+
+    async def in_progress(self) -> int:
+        # даты под арендой, включая просроченные: их ещё могут вернуть в очередь
+        return int(await self._get_redis().zcard(QUEUE_KEYS[1]))
+
+    @asynccontextmanager
+    async def leased(self, day: date) -> AsyncIterator[Optional[str]]:
+        # аренда даты на время блока: токен для complete() или None — дату уже загружает кто-то другой
+        token = await self.lease(day)
+        if token is None:
+            yield None
+            return
+
+        async def beat():
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                await self.heartbeat({day: token})
+
+        heartbeat = asyncio.create_task(beat())
+        try:
+            yield token
+        finally:
+            heartbeat.cancel()
+            try:
+                await self.release(day, token)
+            except Exception as e:
+                # работа в блоке уже сделана; неотпущенная аренда истечёт сама
+                logger.error(f"Не удалось отпустить аренду {day}: {e}")
+
+    async def is_ingested(self, day: date) -> bool:
+        return day in await ingested_dates(day, day)
+
+    async def enqueue_range(self, start_date: date, end_date: date) -> Dict[str, int]:
+        # бюллетени с сайта биржи за период, кроме уже загруженных в БД
+        from .downloader import ReportDownloader
+
+        reports = await ReportDownloader().get_all_bulletins(start_date, end_date)
+        loaded = await ingested_dates(start_date, end_date) if reports else set()
+        new = [(url, report_date) for url, report_date in reports if report_date not in loaded]
+        return {"found": len(reports), "already_loaded": len(reports) - len(new), "queued": await self.enqueue(new)}
+
+    async def status(self) -> Dict[str, Any]:
+        async with self._get_redis().pipeline(transaction=True) as pipe:
+            pipe.zcard(QUEUE_KEYS[0])
+            pipe.hgetall(QUEUE_KEYS[2])
+            pipe.zrange(QUEUE_KEYS[5], 0, -1)
+            pipe.hgetall(QUEUE_KEYS[6])
+            pipe.time()
+            pending, owners, failed, workers, (seconds, micros) = await pipe.execute()
+        now = seconds * 1000 + micros // 1000
+        return {
+            "pending": pending,
+            "running": dict(sorted(owners.items())),
+            "failed": failed,
+            # живые воркеры — пульс не старше срока аренды
+            "workers": sorted(owner for owner, seen in workers.items() if now - int(seen) <= self.lease_ms),
+        }
+
+    async def close(self):
+        self.redis = None
+
+
+class QueueWorker:
+    # Забирает даты из общей очереди и загружает их (скачать бюллетень -> разобрать -> записать в БД).
+    # Несколько воркеров на разных узлах делят один диапазон без пересечений; пропускная способность
+    # растёт с числом узлов, пока её не ограничит сайт биржи или запись в Postgres.
+    def __init__(self, queue: Optional[IngestionQueue] = None, concurrency: int = 4,
+                 poll_seconds: float = INGEST_WORKER_POLL_SECONDS, reports_dir: str = REPORTS_DIR,
+                 refresh: bool = True):
+        self.queue = queue or ingestion_queue
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.reports_dir = reports_dir
+        self.refresh = refresh
+        # дата -> токен аренды
+        self.held: Dict[date, str] = {}
+        self.loaded: Set[date] = set()
+        self.rows = 0
+        self.failed: List[date] = []
+        self._stopped = asyncio.Event()
+
+    async def ingest(self, day: date, url: str) -> Optional[int]:
+        # None — бюллетень не скачался; иначе число записанных строк (0 — ошибка разбора или записи)
+        from .downloader import ReportDownloader
+        from .parser import ReportParser
+
+        os.makedirs(self.reports_dir, exist_ok=True)
+        saved = await ReportDownloader(reports_dir=self.reports_dir).download_and_save(url, day, asyncio.Semaphore(1))
+        if not saved:
+            return None
+        return await ReportParser().process_files([Path(saved)], 1)
+
+    async def process(self, day: date, url: str, token: str) -> Optional[int]:
+        self.held[day] = token
+        try:
+            if await self.queue.is_ingested(day):
+                await self.queue.complete(day, token)
+                return 0
+            count = await self.ingest(day, url)
+            if not count:
+                # None — бюллетень не скачался, 0 — парсер проглотил ошибку разбора или записи в БД
+                # (в опубликованном бюллетене строки есть всегда): дата возвращается в очередь на повтор
+                attempts = await self.queue.fail(day, token)
+                if attempts >= self.queue.max_attempts:
+                    logger.error(f"Бюллетень за {day} не загружен за {attempts} попыток")
+                    self.failed.append(day)
+                return None
+            await self.queue.complete(day, token)
+            self.rows += count
+            self.loaded.add(day)
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка загрузки бюллетеня за {day}: {e}", exc_info=True)
+            await self.queue.fail(day, token)
+            return None
+        finally:
+            self.held.pop(day, None)
+
+    async def flush(self):
+        # версия данных, снимок и кэш — один раз на пачку загруженных дат, а не на каждую
+        if not self.loaded:
+            return
+        dates, self.loaded = self.loaded, set()
+        if self.refresh:
+            await on_ingestion_complete(dates=sorted(dates))
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                held = dict(self.held)
+                renewed = await self.queue.heartbeat(held)
+                if renewed < len(held):
+                    logger.warning(f"Потеряны аренды {len(held) - renewed} дат: пульс опоздал дольше срока аренды")
+            except Exception as e:
+                logger.error(f"Ошибка пульса воркера очереди: {e}")
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+
+    async def _slot(self, drain: bool):
+        while not self._stopped.is_set():
+            try:
+                claimed = await self.queue.claim()
+            except Exception as e:
+                logger.error(f"Ошибка очереди загрузки: {e}")
+                claimed = None
+            else:
+                if claimed is not None:
+                    await self.process(*claimed)
+                    continue
+                await self.flush()
+                # очередь пуста; пока другие узлы держат даты, ждать — даты упавшего узла вернутся в очередь
+                if drain and not await self.queue.in_progress():
+                    return
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, drain: bool = False) -> int:
+        # drain=True — выйти, когда очередь опустеет (CLI); иначе ждать новые даты до stop()
+        logger.info(f"Воркер очереди загрузки запущен ({self.queue.owner}, {self.concurrency} дат одновременно)")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.gather(*(self._slot(drain) for _ in range(self.concurrency)))
+        finally:
+            heartbeat.cancel()
+            await self.flush()
+        return self.rows
+
+    def stop(self):
+        self._stopped.set()
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.middleware import AdmissionMiddleware
+from app.main import app
+from app.services.admission import DbGate, Overloaded, RateLimiter, endpoint_class
+from app.utils.metrics import ADMISSION_REJECTED
+
+
+class TestEndpointClass:
+    @pytest.mark.parametrize("path, expected", [
+        ("/trading/dynamics/", "heavy"),
+        ("/trading/dynamics/batch/", "heavy"),
+        ("/trading/analytics/", "heavy"),
+        ("/trading/aggregates/", "heavy"),
+        ("/trading/results/", "light"),
+        ("/trading/days/2025-07-11", "light"),
+        ("/process-reports/", "ingest"),
+        ("/ingest/queue/", "ingest"),
+        ("/metrics", None),
+        ("/docs", None),
+    ])
+    def test_endpoint_class(self, path, expected):
+        assert endpoint_class(path) == expected
+
+
+class TestRateLimiter:
+    @pytest.fixture
+    def limiter(self):
+        limiter = RateLimiter(limits={"heavy": (5, 10)})
+        limiter.redis = AsyncMock()
+        return limiter
+
+    @pytest.mark.asyncio
+    async def test_allowed(self, limiter):
+        limiter.redis.eval.return_value = [1, "0"]
+        assert await limiter.check("ip:1.2.3.4", "heavy") is None
+        args = limiter.redis.eval.await_args[0]
+        assert args[1:] == (1, "trading_meta:ratelimit:heavy:ip:1.2.3.4", 5, 10, 1)
+
+    @pytest.mark.asyncio
+    async def test_rejected_with_retry_after(self, limiter):
+        limiter.redis.eval.return_value = [0, "0.4"]
+        before = ADMISSION_REJECTED.value(reason="rate_limit", endpoint_class="heavy")
+        assert await limiter.check("ip:1.2.3.4", "heavy") == 0.4
+        assert ADMISSION_REJECTED.value(reason="rate_limit", endpoint_class="heavy") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_redis_down_lets_requests_through(self, limiter):
+        limiter.redis.eval.side_effect = ConnectionError("redis down")
+        assert await limiter.check("ip:1.2.3.4", "heavy") is None
+
+    def test_client_key_hides_api_key(self):
+        key = RateLimiter.client_key("secret-token", "10.0.0.1")
+        assert key.startswith("key:") and "secret" not in key
+        assert RateLimiter.client_key(None, "10.0.0.1") == "ip:10.0.0.1"
+
+
+class TestAdmissionMiddleware:
+    @pytest.fixture
+    def limiter(self):
+        limiter = MagicMock()
+        limiter.client_key = RateLimiter.client_key
+        limiter.check = AsyncMock(return_value=None)
+        return limiter
+
+    @pytest.fixture
+    def client(self, limiter):
+        test_app = FastAPI()
+
+        @test_app.get("/trading/dynamics/")
+        async def dynamics():
+            return {"ok": True}
+
+        @test_app.get("/metrics")
+        async def metrics():
+            return {"ok": True}
+
+        test_app.add_middleware(AdmissionMiddleware, enabled=True, limiter=limiter, trust_forwarded=True)
+        return TestClient(test_app)
+
+    def test_allowed_request_passes(self, client, limiter):
+        response = client.get("/trading/dynamics/", headers={"X-Forwarded-For": "10.1.1.1, 10.0.0.1"})
+        assert response.status_code == 200
+        limiter.check.assert_awaited_once_with("ip:10.1.1.1", "heavy")
+
+    def test_over_limit_gets_429(self, client, limiter):
+        limiter.check.return_value = 2.3
+        response = client.get("/trading/dynamics/", headers={"X-API-Key": "abc"})
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "3"
+        assert limiter.check.await_args[0][0].startswith("key:")
+
+    def test_unclassified_paths_skip_limiter(self, client, limiter):
+        assert client.get("/metrics").status_code == 200
+        limiter.check.assert_not_awaited()
+
+
+class TestDbGate:
+    @pytest.mark.asyncio
+    async def test_rejects_when_all_slots_busy(self):
+        gate = DbGate(limit=1, wait_ms=10, retry_after=2)
+        release = asyncio.Event()
+
+        async def hold():
+            async with gate.acquire():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc_info:
+            async with gate.acquire():
+                pass
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {"Retry-After": "2"}
+
+        release.set()
+        await holder
+        async with gate.acquire():
+            pass
+
+    @pytest.mark.asyncio
+    async def test_disabled_gate(self):
+        gate = DbGate(limit=0)
+        async with gate.acquire():
+            async with gate.acquire():
+                pass
+
+    @patch('app.api.endpoints.TradingService')
+    def test_endpoint_returns_503_with_retry_after(self, mock_service):
+        mock_service.return_value.get_dynamics_json = AsyncMock(side_effect=Overloaded(retry_after=2))
+        response = TestClient(app).post("/trading/dynamics/", json={"start_date": "2025-07-01",
+                                                                    "end_date": "2025-07-11"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "2"
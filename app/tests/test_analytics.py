@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+from datetime import date
+from app.services.analytics import PriceAnalytics, price_series_query
+
+
+class TestAnalytics:
+    @pytest.fixture
+    def rows(self):
+        return [
+            (date(2025, 7, 1), 100.0, 5000000.0, 1),
+            (date(2025, 7, 1), 50.0, 3000000.0, 2),
+            (date(2025, 7, 2), 0.0, 0.0, 1),
+            (date(2025, 7, 7), 10.0, 700000.0, 1),
+            (date(2025, 8, 1), 20.0, 1000000.0, 1),
+        ]
+
+    def test_price_series_query(self):
+        compiled = str(price_series_query(date(2025, 7, 1), date(2025, 7, 31), oil_id="A100NVY06"))
+        assert "CAST(spimex_trading_results.volume AS FLOAT)" in compiled
+        assert "exchange_product_name" not in compiled
+        assert "oil_id = :oil_id_1" in compiled
+
+    def test_daily_vwap_and_price_range(self, rows):
+        daily = PriceAnalytics.from_rows(rows).compute(resample="week", window=2)["daily"]
+        assert [d["date"] for d in daily] == ["2025-07-01", "2025-07-02", "2025-07-07", "2025-08-01"]
+        assert daily[0]["vwap"] == pytest.approx(53333.33)
+        assert daily[0]["min_price"] == 50000.0
+        assert daily[0]["max_price"] == 60000.0
+        assert daily[0]["count"] == 3
+        assert daily[1]["vwap"] is None
+        # окно в 2 торговых дня пропускает день без цены
+        assert daily[2]["rolling_vwap"] == 70000.0
+        assert daily[3]["rolling_vwap"] == 60000.0
+
+    @pytest.mark.parametrize("resample, periods", [
+        ("week", ["2025-06-30", "2025-07-07", "2025-07-28"]),
+        ("month", ["2025-07-01", "2025-08-01"]),
+    ])
+    def test_bands(self, rows, resample, periods):
+        bands = PriceAnalytics.from_rows(rows).compute(resample=resample)["bands"]
+        assert [b["period"] for b in bands] == periods
+        assert bands[0]["open"] == pytest.approx(53333.33)
+        assert bands[0]["min_price"] == 50000.0
+
+    def test_monthly_band_open_close(self, rows):
+        july = PriceAnalytics.from_rows(rows).compute(resample="month")["bands"][0]
+        assert july["open"] == pytest.approx(53333.33)
+        assert july["close"] == 70000.0
+        assert july["max_price"] == 70000.0
+        assert july["vwap"] == pytest.approx(8700000.0 / 160.0, rel=1e-4)
+
+    def test_rolling_mean(self):
+        values = np.array([1.0, np.nan, 3.0, 5.0])
+        assert PriceAnalytics.rolling_mean(values, 2).tolist() == [1.0, 1.0, 3.0, 4.0]
+
+    def test_empty(self):
+        assert PriceAnalytics.from_rows([]).compute() == {"daily": [], "bands": []}
@@ -0,0 +1,99 @@
+import json
+import pytest
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.cache_warmer import CacheWarmer, warm_after_ingestion
+from app.services.trading_service import TradingService, query_stats, exchange_today
+
+
+class TestCacheWarmer:
+    @pytest.fixture
+    def mock_redis(self):
+        redis_client = AsyncMock()
+        # ZUNION возвращает по возрастанию частоты
+        redis_client.zunion.return_value = [
+            (json.dumps({"method": "dynamics", "params": {
+                "window_days": 30, "oil_id": "A100NVY06", "delivery_type_id": "", "delivery_basis_id": ""
+            }}), 12.0),
+            (json.dumps({"method": "trading_results", "params": {
+                "oil_id": "", "delivery_type_id": "060F", "delivery_basis_id": "", "limit": 100
+            }}), 3.0),
+            ("not json", 1.0),
+        ][::-1]
+        return redis_client
+
+    @pytest.fixture
+    def warmer(self, mock_redis):
+        query_stats.pending.clear()
+        warmer = CacheWarmer(top_n=10, concurrency=2, top_oil_ids=1, windows=(7, 30))
+        warmer.trading_service._get_redis = AsyncMock(return_value=mock_redis)
+        return warmer
+
+    def test_warmer_does_not_record_queries(self, warmer):
+        assert warmer.trading_service.record_queries is False
+
+    @pytest.mark.asyncio
+    async def test_plan(self, warmer):
+        queries = await warmer.plan()
+        today = exchange_today()
+        methods = [method for method, _ in queries]
+
+        assert queries[0] == ("last_trading_dates", {"limit": 10})
+        assert methods.count("trading_results") == 1
+        # окно 30 дней из статистики совпадает с типовым и не дублируется
+        dynamics = [params for method, params in queries if method == "dynamics"]
+        assert len(dynamics) == 2
+        assert {"start_date": (today - timedelta(days=30)).isoformat(), "end_date": today.isoformat(),
+                "oil_id": "A100NVY06", "delivery_type_id": "", "delivery_basis_id": ""} in dynamics
+
+    @pytest.mark.asyncio
+    async def test_warm_runs_each_query(self, warmer):
+        with patch.object(TradingService, "get_last_trading_dates", AsyncMock()) as mock_dates, \
+                patch.object(TradingService, "get_dynamics", AsyncMock()) as mock_dynamics, \
+                patch.object(TradingService, "get_trading_results",
+                             AsyncMock(side_effect=Exception("db down"))) as mock_results:
+            warmed = await warmer.warm()
+
+        assert warmed == 3
+        mock_dates.assert_awaited_once_with(limit=10)
+        assert mock_dynamics.await_count == 2
+        assert isinstance(mock_dynamics.call_args.kwargs["start_date"], date)
+        mock_results.assert_awaited_once_with(oil_id=None, delivery_type_id="060F", delivery_basis_id=None,
+                                              limit=100)
+
+    @pytest.mark.asyncio
+    async def test_run_aggregates_query(self, warmer):
+        with patch.object(TradingService, "get_aggregates", AsyncMock()) as mock_aggregates:
+            await warmer._run_query("aggregates", {
+                "group_by": "delivery_basis_id,period", "bucket": "month", "metrics": "total,vwap",
+                "order_by": "", "order": "desc", "limit": 20, "start_date": "2025-06-01",
+                "end_date": "2025-06-30", "oil_id": "", "delivery_type_id": "", "delivery_basis_id": ""
+            })
+        kwargs = mock_aggregates.call_args.kwargs
+        assert kwargs["group_by"] == ["delivery_basis_id", "period"]
+        assert kwargs["metrics"] == ["total", "vwap"]
+        assert kwargs["order_by"] is None and kwargs["limit"] == 20
+        assert kwargs["start_date"] == date(2025, 6, 1)
+
+    @pytest.mark.asyncio
+    async def test_warm_after_ingestion_invalidates_first(self):
+        warmer = MagicMock()
+        warmer.trading_service.invalidate_cache = AsyncMock(return_value=5)
+        warmer.warm = AsyncMock(return_value=4)
+        warmer.close = AsyncMock()
+
+        assert await warm_after_ingestion(warmer) == 4
+        warmer.trading_service.invalidate_cache.assert_awaited_once()
+        warmer.close.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_warm_after_ingestion_invalidates_dates(self):
+        warmer = MagicMock()
+        warmer.trading_service.invalidate_cache = AsyncMock()
+        warmer.trading_service.invalidate_dates = AsyncMock(return_value=3)
+        warmer.warm = AsyncMock(return_value=4)
+        warmer.close = AsyncMock()
+
+        assert await warm_after_ingestion(warmer, dates=[date(2025, 7, 11)]) == 4
+        warmer.trading_service.invalidate_dates.assert_awaited_once_with([date(2025, 7, 11)])
+        warmer.trading_service.invalidate_cache.assert_not_awaited()
@@ -0,0 +1,91 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.columnar import ColumnarSnapshot, ColumnarStore
+from app.services.queries import rows_to_results
+from app.services.trading_service import TradingService
+
+CREATED = datetime(2025, 7, 23, 15, 42, 19, 760432)
+
+
+def _row(id_, day, oil_id="A100NVY06", basis_id="NVY060F", type_id="060F", volume=100.0, count=1):
+    return (id_, f"{oil_id}{type_id}", f"Продукт {oil_id}", oil_id, basis_id, f"Базис {basis_id}", type_id,
+            volume, volume * 50000 if volume is not None else None, count, day, CREATED, None)
+
+
+class TestColumnarSnapshot:
+    @pytest.fixture
+    def rows(self):
+        # порядок выгрузки снимка: date desc, id
+        return [
+            _row(5, date(2025, 7, 11)),
+            _row(7, date(2025, 7, 11), oil_id="B200ABC01", basis_id="ABC010F"),
+            _row(9, date(2025, 7, 11), type_id="011F", volume=None, count=None),
+            _row(2, date(2025, 7, 10)),
+            _row(3, date(2025, 7, 10), oil_id="B200ABC01"),
+            _row(1, date(2025, 7, 1)),
+        ]
+
+    @pytest.fixture
+    def snapshot(self, rows):
+        return ColumnarSnapshot(rows, version=3)
+
+    def test_dynamics_matches_sql_order(self, snapshot, rows):
+        assert snapshot.dynamics(date(2025, 7, 1), date(2025, 7, 11)) == rows_to_results(rows)
+        assert [r["id"] for r in snapshot.dynamics(date(2025, 7, 2), date(2025, 7, 10))] == [2, 3]
+        assert snapshot.dynamics(date(2025, 7, 12), date(2025, 7, 31)) == []
+
+    def test_dynamics_filters(self, snapshot):
+        assert [r["id"] for r in snapshot.dynamics(date(2025, 7, 1), date(2025, 7, 11),
+                                                   oil_id="A100NVY06")] == [5, 9, 2, 1]
+        assert [r["id"] for r in snapshot.dynamics(date(2025, 7, 1), date(2025, 7, 11), oil_id="A100NVY06",
+                                                   delivery_type_id="011F")] == [9]
+        assert snapshot.dynamics(date(2025, 7, 1), date(2025, 7, 11), oil_id="UNKNOWN") == []
+
+    def test_nulls_preserved(self, snapshot):
+        row = snapshot.dynamics(date(2025, 7, 11), date(2025, 7, 11), delivery_type_id="011F")[0]
+        assert (row["volume"], row["total"], row["count"], row["updated_on"]) == (None, None, None, None)
+        assert row["created_on"] == CREATED.isoformat()
+
+    @pytest.mark.parametrize("kwargs, expected", [
+        ({"limit": 100}, [9, 7, 5, 3, 2, 1]),
+        # внутри дня id по убыванию, как в trading_results_query
+        ({"limit": 2}, [9, 7]),
+        ({"limit": 4}, [9, 7, 5, 3]),
+        ({"oil_id": "B200ABC01", "limit": 10}, [7, 3]),
+        ({"delivery_basis_id": "NVY060F", "limit": 3}, [9, 5, 3]),
+    ])
+    def test_trading_results(self, snapshot, kwargs, expected):
+        assert [r["id"] for r in snapshot.trading_results(**kwargs)] == expected
+
+    def test_rejects_unsorted_rows(self, rows):
+        with pytest.raises(ValueError):
+            ColumnarSnapshot(list(reversed(rows)))
+
+
+class TestColumnarStore:
+    @pytest.mark.asyncio
+    async def test_reload_when_data_version_changes(self):
+        store = ColumnarStore()
+        store.snapshot = ColumnarSnapshot([], version=1)
+        with patch("app.services.columnar.data_version.current", AsyncMock(return_value=(2, None))), \
+                patch.object(store, "refresh", AsyncMock()) as mock_refresh:
+            # пока перезагрузка идёт в фоне, отвечает старый снимок
+            assert await store.current() is store.snapshot
+            await store._refreshing
+        mock_refresh.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_trading_service_skips_cache_and_db(self):
+        snapshot = MagicMock()
+        snapshot.dynamics.return_value = [{"id": 1}]
+        store = MagicMock()
+        store.current = AsyncMock(return_value=snapshot)
+        service = TradingService(columnar=store)
+        service._get_redis = AsyncMock()
+
+        payload = await service.get_dynamics_json(date(2025, 7, 1), date(2025, 7, 11), oil_id="A100NVY06")
+
+        assert payload.replace(b" ", b"") == b'{"results":[{"id":1}],"count":1}'
+        snapshot.dynamics.assert_called_once_with(date(2025, 7, 1), date(2025, 7, 11), "A100NVY06", None, None)
+        service._get_redis.assert_not_awaited()
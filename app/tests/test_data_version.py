@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from datetime import datetime, timezone
+from app.services.data_version import DataVersion
+
+
+class TestDataVersion:
+    @pytest.mark.asyncio
+    async def test_current_reads_redis_once_per_interval(self):
+        holder = DataVersion(refresh_interval=60)
+        holder.redis = MagicMock()
+        holder.redis.mget = AsyncMock(return_value=["7", "2025-07-11T12:00:00+00:00"])
+
+        version, last_modified = await holder.current()
+        assert version == 7
+        assert last_modified == datetime(2025, 7, 11, 12, 0, tzinfo=timezone.utc)
+
+        await holder.current()
+        assert holder.redis.mget.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_current_survives_redis_errors(self):
+        holder = DataVersion(refresh_interval=0)
+        holder.redis = MagicMock()
+        holder.redis.mget = AsyncMock(side_effect=Exception("Redis недоступен"))
+
+        version, _ = await holder.current()
+        assert version == 0
+
+    @pytest.mark.asyncio
+    async def test_bump(self):
+        holder = DataVersion()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[5, True])
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=pipe)
+        context.__aexit__ = AsyncMock(return_value=False)
+        holder.redis = MagicMock()
+        holder.redis.pipeline = MagicMock(return_value=context)
+
+        assert await holder.bump() == 5
+        pipe.incr.assert_called_once()
+        assert holder.version == 5
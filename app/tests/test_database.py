@@ -0,0 +1,21 @@
+from app.database import connect_args, make_engine, engine, read_engine, DATABASE_URL
+
+
+class TestDatabase:
+    def test_make_engine_pool_settings(self):
+        test_engine = make_engine(DATABASE_URL, pool_size=3, max_overflow=2)
+
+        assert test_engine.pool.size() == 3
+        assert test_engine.pool._max_overflow == 2
+        assert test_engine.pool._recycle == 1800
+
+    def test_read_and_write_pools_are_separate(self):
+        assert engine is not read_engine
+        assert engine.pool is not read_engine.pool
+
+    def test_connect_args(self):
+        assert connect_args(200) == {"statement_cache_size": 200, "prepared_statement_cache_size": 200}
+
+        disabled = connect_args(0)
+        assert disabled["statement_cache_size"] == 0
+        assert disabled["prepared_statement_name_func"]() != disabled["prepared_statement_name_func"]()
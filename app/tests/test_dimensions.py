@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.dimensions import DimensionService
+
+
+def fake_session_factory(instrument_rows, basis_rows):
+    session = AsyncMock()
+    results = []
+    for rows in (instrument_rows, basis_rows):
+        if rows is None:
+            continue
+        results += [MagicMock(), MagicMock(fetchall=MagicMock(return_value=rows))]
+    session.execute.side_effect = results
+    context = AsyncMock()
+    context.__aenter__.return_value = session
+    return MagicMock(return_value=context), session
+
+
+def record(product_id="A100NVY060F", product_name="Бензин (АИ-100-К5)", basis_name="ст. Новоярославская"):
+    return {"exchange_product_id": product_id, "exchange_product_name": product_name,
+            "delivery_basis_name": basis_name, "oil_id": product_id[:4]}
+
+
+class TestDimensionService:
+    @pytest.mark.asyncio
+    async def test_assign_keys_replaces_names(self):
+        factory, session = fake_session_factory(
+            [(7, "A100NVY060F", "Бензин (АИ-100-К5)")], [(3, "ст. Новоярославская")])
+        service = DimensionService(session_factory=factory)
+
+        records = await service.assign_keys([record(), record()])
+
+        assert records[0]["instrument_key"] == 7
+        assert records[1]["delivery_basis_key"] == 3
+        assert "exchange_product_name" not in records[0]
+        assert "delivery_basis_name" not in records[0]
+        assert session.execute.await_count == 4
+        session.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_known_names_skip_database(self):
+        factory, session = fake_session_factory([], [])
+        service = DimensionService(session_factory=factory)
+        service.instruments[("A100NVY060F", "Бензин (АИ-100-К5)")] = 7
+        service.bases["ст. Новоярославская"] = 3
+
+        records = await service.assign_keys([record()])
+
+        assert records[0]["instrument_key"] == 7
+        factory.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_only_missing_dimension_is_upserted(self):
+        factory, session = fake_session_factory(None, [(4, "ст. Тобольск")])
+        service = DimensionService(session_factory=factory)
+        service.instruments[("A100NVY060F", "Бензин (АИ-100-К5)")] = 7
+
+        records = await service.assign_keys([record(basis_name="ст. Тобольск")])
+
+        assert records[0]["delivery_basis_key"] == 4
+        assert session.execute.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_names_get_null_keys(self):
+        service = DimensionService(session_factory=MagicMock())
+        records = await service.assign_keys([record(product_name=None, basis_name=None)])
+        assert records[0]["instrument_key"] is None
+        assert records[0]["delivery_basis_key"] is None
@@ -7,6 +7,16 @@ from app.services.parser import ReportParser
 
 
 class TestDownloader:
+    @pytest.fixture(autouse=True)
+    def mock_partitions(self):
+        with patch("app.services.parser.partition_manager.ensure_partitions", AsyncMock(return_value=[])) as mock:
+            yield mock
+
+    @pytest.fixture(autouse=True)
+    def mock_dimensions(self):
+        with patch("app.services.parser.dimension_service.assign_keys", AsyncMock()) as mock:
+            yield mock
+
     @pytest.fixture
     def parser(self):
         return ReportParser()
@@ -1,12 +1,22 @@
+import json
+import os
+import subprocess
+import sys
 import pytest
-from unittest.mock import patch, AsyncMock
+from pathlib import Path
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
-from datetime import date
+from redis.exceptions import ConnectionError as RedisConnectionError
+from datetime import date, datetime, timezone
 from app.main import app
 
 client = TestClient(app)
 
 
+def _payload(results):
+    return json.dumps({"results": results or [], "count": len(results or [])}).encode()
+
+
 class TestEndpoints:
     @pytest.mark.parametrize(
         "params, mocked_report, exp_status, exp_response",
@@ -55,10 +65,16 @@ class TestEndpoints:
                     500,
                     {"detail": "Processing failed"}
             ),
+            (
+                    RedisConnectionError("Connection refused"),
+                    503,
+                    {"detail": "Очередь загрузки недоступна: Connection refused"}
+            ),
         ]
     )
+    @patch('app.api.ingestion.on_ingestion_complete', new_callable=AsyncMock)
     @patch('app.services.parser.ReportParser.process_directory')
-    def test_process_reports(self, mock_process, mocked_report, exp_status, exp_response):
+    def test_process_reports(self, mock_process, mock_warm, mocked_report, exp_status, exp_response):
         if isinstance(mocked_report, Exception):
             mock_process.side_effect = mocked_report
         else:
@@ -67,6 +83,41 @@ class TestEndpoints:
         response = client.post("/process-reports/")
         assert response.status_code == exp_status
         assert response.json() == exp_response
+        assert mock_warm.await_count == (1 if exp_status == 200 else 0)
+
+    @patch('app.api.ingestion.on_ingestion_complete', new_callable=AsyncMock)
+    @patch('app.services.parser.ReportParser.process_directory', autospec=True)
+    def test_process_reports_refreshes_loaded_dates(self, mock_process, mock_warm):
+        async def process_directory(parser, directory):
+            parser.loaded.update({date(2025, 7, 11), date(2025, 7, 10)})
+            return 5
+
+        mock_process.side_effect = process_directory
+        assert client.post("/process-reports/").status_code == 200
+        # сброс кэша и событие ленты — только за загруженные даты, а не «последний день»
+        mock_warm.assert_awaited_once_with(dates=[date(2025, 7, 10), date(2025, 7, 11)])
+
+    @patch('app.api.ingestion.ingestion_queue')
+    def test_ingest_queue(self, mock_queue):
+        mock_queue.enqueue_range = AsyncMock(return_value={"found": 3, "already_loaded": 1, "queued": 2})
+        mock_queue.status = AsyncMock(return_value={"pending": 2, "running": {}, "failed": [], "workers": []})
+
+        response = client.post("/ingest/queue/", params={"start_date": "2025-07-01", "end_date": "2025-07-11"})
+        assert response.json() == {"found": 3, "already_loaded": 1, "queued": 2}
+        mock_queue.enqueue_range.assert_awaited_once_with(date(2025, 7, 1), date(2025, 7, 11))
+        assert client.get("/ingest/queue/").json()["pending"] == 2
+
+    @patch('app.api.ingestion.ingestion_queue')
+    def test_ingest_queue_redis_down(self, mock_queue):
+        mock_queue.enqueue_range = AsyncMock(side_effect=RedisConnectionError("Connection refused"))
+        mock_queue.status = AsyncMock(side_effect=RedisConnectionError("Connection refused"))
+
+        response = client.post("/ingest/queue/", params={"start_date": "2025-07-01", "end_date": "2025-07-11"})
+        assert response.status_code == 503
+        assert response.json() == {"detail": "Очередь загрузки недоступна: Connection refused"}
+        assert client.get("/ingest/queue/").status_code == 503
+        assert client.post("/ingest/queue/", params={"start_date": "2025-07-12",
+                                                     "end_date": "2025-07-11"}).status_code == 400
 
     @pytest.mark.parametrize(
         "params, mocked_dates, exp_status, exp_response",
@@ -166,9 +217,9 @@ class TestEndpoints:
         mock_service_instance.close = AsyncMock()
 
         if isinstance(mocked_response, Exception):
-            mock_service_instance.get_dynamics = AsyncMock(side_effect=mocked_response)
+            mock_service_instance.get_dynamics_json = AsyncMock(side_effect=mocked_response)
         else:
-            mock_service_instance.get_dynamics = AsyncMock(return_value=mocked_response)
+            mock_service_instance.get_dynamics_json = AsyncMock(return_value=_payload(mocked_response))
 
         response = client.post("/trading/dynamics/", json=request_data)
         assert response.status_code == exp_status
@@ -226,9 +277,9 @@ class TestEndpoints:
         mock_service_instance.close = AsyncMock()
 
         if isinstance(mocked_response, Exception):
-            mock_service_instance.get_trading_results = AsyncMock(side_effect=mocked_response)
+            mock_service_instance.get_trading_results_json = AsyncMock(side_effect=mocked_response)
         else:
-            mock_service_instance.get_trading_results = AsyncMock(return_value=mocked_response)
+            mock_service_instance.get_trading_results_json = AsyncMock(return_value=_payload(mocked_response))
 
         response = client.post("/trading/results/", json=request_data)
         assert response.status_code == exp_status
@@ -238,3 +289,225 @@ class TestEndpoints:
             assert response.json()["results"][0]["oil_id"] == exp_response["results"][0]["oil_id"]
         elif exp_status >= 400 and exp_response:
             assert response.json() == exp_response
+
+    @pytest.mark.parametrize(
+        "request_data, mocked_response, exp_status",
+        [
+            (
+                    {"start_date": "2025-07-01", "end_date": "2025-07-11", "granularity": "day"},
+                    [{"period": "2025-07-01", "volume": 1500, "total": 119221500, "count": 1, "avg_price": 79481}],
+                    200
+            ),
+            (
+                    {"start_date": "2025-07-12", "end_date": "2025-07-11"},
+                    None,
+                    400
+            ),
+            (
+                    {"start_date": "2025-07-01", "end_date": "2025-07-11", "granularity": "week"},
+                    None,
+                    422
+            ),
+        ]
+    )
+    @patch('app.api.endpoints.TradingService')
+    def test_get_series(self, mock_trading_service, request_data, mocked_response, exp_status):
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_series = AsyncMock(return_value=mocked_response)
+
+        response = client.post("/trading/series/", json=request_data)
+        assert response.status_code == exp_status
+        if exp_status == 200:
+            assert response.json()["count"] == 1
+            assert response.json()["results"][0]["period"] == "2025-07-01"
+
+    @pytest.mark.parametrize(
+        "request_data, exp_status",
+        [
+            ({"start_date": "2025-06-01", "end_date": "2025-06-30"}, 200),
+            ({"start_date": "2025-06-30", "end_date": "2025-06-01"}, 400),
+            ({"start_date": "2025-06-01", "end_date": "2025-06-30", "group_by": ["oil_id", "oil_id"]}, 400),
+            ({"start_date": "2025-06-01", "end_date": "2025-06-30", "group_by": ["price"]}, 422),
+            ({"start_date": "2025-06-01", "end_date": "2025-06-30", "limit": 0}, 422),
+        ]
+    )
+    @patch('app.api.endpoints.TradingService')
+    def test_get_aggregates(self, mock_trading_service, request_data, exp_status):
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_aggregates = AsyncMock(return_value=[
+            {"delivery_basis_id": "NVY", "volume": 150.0, "total": 8000000.0, "count": 3, "vwap": 53333.33}
+        ])
+
+        response = client.post("/trading/aggregates/", json=request_data)
+        assert response.status_code == exp_status
+        if exp_status == 200:
+            assert response.json()["count"] == 1
+            kwargs = mock_service_instance.get_aggregates.call_args.kwargs
+            assert kwargs["group_by"] == ["delivery_basis_id"]
+            assert kwargs["order_by"] == "total" and kwargs["limit"] == 20
+
+    @patch('app.api.endpoints.TradingService')
+    def test_get_price_analytics(self, mock_trading_service):
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_price_analytics = AsyncMock(return_value={
+            "daily": [{"date": "2025-07-01", "volume": 150.0, "total": 8000000.0, "count": 3, "vwap": 53333.33,
+                       "min_price": 50000.0, "max_price": 60000.0, "rolling_vwap": 53333.33}],
+            "bands": []
+        })
+
+        response = client.post("/trading/analytics/", json={
+            "start_date": "2025-07-01", "end_date": "2025-07-11", "oil_id": "TRD-RFF060", "resample": "month"
+        })
+        assert response.status_code == 200
+        assert response.json()["daily"][0]["vwap"] == 53333.33
+        assert mock_service_instance.get_price_analytics.call_args.kwargs["resample"] == "month"
+
+    @patch('app.api.endpoints.TradingService')
+    def test_get_trading_day(self, mock_trading_service):
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_trading_day = AsyncMock(return_value={
+            "date": "2025-07-12", "is_trading_day": False, "rows": 0, "volume": None, "total": None, "count": 0
+        })
+
+        response = client.get("/trading/days/2025-07-12")
+        assert response.status_code == 200
+        assert response.json()["is_trading_day"] is False
+        mock_service_instance.get_trading_day.assert_awaited_once_with(date(2025, 7, 12))
+
+        assert client.get("/trading/days/not-a-date").status_code == 422
+
+    @pytest.mark.parametrize(
+        "filters, exp_status, exp_keys",
+        [
+            (
+                    [{"start_date": "2025-07-01", "end_date": "2025-07-11", "oil_id": "TRD-RFF060", "key": "jet"},
+                     {"start_date": "2025-07-01", "end_date": "2025-07-11", "delivery_basis_id": "RFF060C"}],
+                    200,
+                    ["jet", "1"]
+            ),
+            (
+                    [{"start_date": "2025-07-12", "end_date": "2025-07-11"}],
+                    400,
+                    None
+            ),
+            (
+                    [{"start_date": "2025-07-01", "end_date": "2025-07-11", "key": "a"},
+                     {"start_date": "2025-07-01", "end_date": "2025-07-11", "key": "a"}],
+                    400,
+                    None
+            ),
+            (
+                    [],
+                    422,
+                    None
+            ),
+        ]
+    )
+    @patch('app.api.endpoints.TradingService')
+    def test_get_dynamics_batch(self, mock_trading_service, filters, exp_status, exp_keys):
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_dynamics_batch = AsyncMock(return_value=[[], []])
+
+        response = client.post("/trading/dynamics/batch/", json={"filters": filters})
+        assert response.status_code == exp_status
+        if exp_status == 200:
+            assert list(response.json()["results"]) == exp_keys
+            assert response.json()["results"]["jet"] == {"results": [], "count": 0}
+            assert "key" not in mock_service_instance.get_dynamics_batch.call_args[0][0][0]
+
+    @patch('app.api.endpoints.data_version.current', new_callable=AsyncMock)
+    @patch('app.api.endpoints.TradingService')
+    def test_get_dynamics_conditional(self, mock_trading_service, mock_version):
+        mock_version.return_value = (3, datetime(2025, 7, 11, 12, 0, tzinfo=timezone.utc))
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_dynamics_json = AsyncMock(return_value=_payload([]))
+        params = {"start_date": "2025-07-01", "end_date": "2025-07-11", "oil_id": "TRD-RFF060"}
+
+        response = client.get("/trading/dynamics/", params=params)
+        assert response.status_code == 200
+        assert response.json() == {"results": [], "count": 0}
+        etag = response.headers["etag"]
+        assert etag.startswith('"3-')
+        assert response.headers["last-modified"] == "Fri, 11 Jul 2025 12:00:00 GMT"
+
+        # тот же запрос с пустым фильтром и в другом порядке — тот же ETag
+        same = client.get("/trading/dynamics/", params={"oil_id": "TRD-RFF060", "delivery_type_id": "",
+                                                        "end_date": "2025-07-11", "start_date": "2025-07-01"})
+        assert same.headers["etag"] == etag
+
+        not_modified = client.get("/trading/dynamics/", params=params, headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.headers["etag"] == etag
+        by_date = client.get("/trading/dynamics/", params=params,
+                             headers={"If-Modified-Since": "Fri, 11 Jul 2025 12:00:00 GMT"})
+        assert by_date.status_code == 304
+        assert mock_service_instance.get_dynamics_json.await_count == 2
+
+        # после новой загрузки версия меняется, старый ETag больше не подходит
+        mock_version.return_value = (4, datetime(2025, 7, 12, 12, 0, tzinfo=timezone.utc))
+        changed = client.get("/trading/dynamics/", params=params, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+
+        assert client.get("/trading/dynamics/", params={"start_date": "2025-07-12",
+                                                        "end_date": "2025-07-11"}).status_code == 400
+
+    @patch('app.api.endpoints.data_version.current', new_callable=AsyncMock)
+    @patch('app.api.endpoints.TradingService')
+    def test_get_trading_results_conditional(self, mock_trading_service, mock_version):
+        mock_version.return_value = (1, datetime(2025, 7, 11, 12, 0, tzinfo=timezone.utc))
+        mock_service_instance = mock_trading_service.return_value
+        mock_service_instance.close = AsyncMock()
+        mock_service_instance.get_trading_results_json = AsyncMock(return_value=_payload([]))
+
+        response = client.get("/trading/results/", params={"oil_id": "TRD-RFF060", "limit": 10})
+        assert response.status_code == 200
+        assert mock_service_instance.get_trading_results_json.call_args.kwargs["limit"] == 10
+
+        not_modified = client.get("/trading/results/", params={"oil_id": "TRD-RFF060", "limit": 10},
+                                  headers={"If-None-Match": f'W/{response.headers["etag"]}, "other"'})
+        assert not_modified.status_code == 304
+        assert mock_service_instance.get_trading_results_json.await_count == 1
+        assert client.get("/trading/results/", params={"limit": 1001}).status_code == 422
+
+    @patch('app.api.endpoints.ExportService')
+    def test_export_trading_results(self, mock_export_service):
+        async def stream():
+            yield b"id,oil_id\n"
+            yield b"1,TRD-RFF060\n"
+
+        mock_export_service.return_value.stream = MagicMock(return_value=stream())
+
+        response = client.get("/trading/export/", params={"start_date": "2025-07-01", "oil_id": "TRD-RFF060"})
+        assert response.status_code == 200
+        assert response.content == b"id,oil_id\n1,TRD-RFF060\n"
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "spimex_trading_results.csv" in response.headers["content-disposition"]
+        query, export_format = mock_export_service.return_value.stream.call_args[0]
+        assert export_format == "csv"
+        assert "spimex_trading_results.oil_id" in str(query)
+
+        assert client.get("/trading/export/", params={"start_date": "2025-07-12",
+                                                      "end_date": "2025-07-11"}).status_code == 400
+        assert client.get("/trading/export/", params={"format": "xml"}).status_code == 422
+        with patch('app.api.endpoints.pyarrow_available', return_value=False):
+            assert client.get("/trading/export/", params={"format": "parquet"}).status_code == 501
+
+    @pytest.mark.parametrize("ingestion_enabled", ["true", "false"])
+    def test_startup_skips_ingestion_stack(self, ingestion_enabled):
+        # чистый интерпретатор: в процессе pytest парсер уже импортирован другими тестами
+        code = ("import sys, app.main; "
+                "print(sorted(m for m in ('pandas', 'numpy', 'bs4', 'aiohttp', 'pyarrow') if m in sys.modules)); "
+                "print(sorted(r.path for r in app.main.app.routes if 'reports' in r.path))")
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=Path(__file__).resolve().parents[2],
+                                         env={**os.environ, "INGESTION_API_ENABLED": ingestion_enabled})
+        loaded, routes = output.decode().strip().splitlines()[-2:]
+        assert loaded == "[]"
+        expected = ["/download-reports/", "/process-reports/"] if ingestion_enabled == "true" else []
+        assert routes == str(expected)
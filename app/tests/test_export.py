@@ -0,0 +1,83 @@
+import io
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.export import ExportService, compile_query
+from app.services.queries import export_query
+
+
+def _engine(driver_connection):
+    conn = MagicMock()
+    conn.get_raw_connection = AsyncMock(return_value=MagicMock(driver_connection=driver_connection))
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=conn)
+    context.__aexit__ = AsyncMock(return_value=False)
+    engine = MagicMock()
+    engine.connect = MagicMock(return_value=context)
+    return engine
+
+
+async def _collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+class TestExport:
+    def test_compile_query(self):
+        sql, args = compile_query(export_query(start_date=date(2025, 7, 1), oil_id="TRD-RFF060", min_id=100))
+
+        assert "$1" in sql and "$3" in sql
+        assert args == [date(2025, 7, 1), "TRD-RFF060", 100]
+        assert "ORDER BY spimex_trading_results.date, spimex_trading_results.id" in sql
+
+    @pytest.mark.asyncio
+    async def test_stream_csv(self):
+        connection = MagicMock()
+
+        async def copy_from_query(sql, *args, output, **kwargs):
+            assert kwargs == {"format": "csv", "header": True}
+            for chunk in (b"id,oil_id\n", b"1,A\n", b"2,B\n"):
+                await output(chunk)
+
+        connection.copy_from_query = copy_from_query
+        with patch('app.services.export.read_engine', _engine(connection)):
+            body = await _collect(ExportService(queue_size=1).stream(export_query(), "csv"))
+
+        assert body == b"id,oil_id\n1,A\n2,B\n"
+
+    @pytest.mark.asyncio
+    async def test_stream_csv_propagates_errors(self):
+        connection = MagicMock()
+        connection.copy_from_query = AsyncMock(side_effect=Exception("COPY failed"))
+        with patch('app.services.export.read_engine', _engine(connection)):
+            with pytest.raises(Exception, match="COPY failed"):
+                await _collect(ExportService().stream(export_query(), "csv"))
+
+    @pytest.mark.asyncio
+    async def test_stream_parquet(self):
+        pq = pytest.importorskip("pyarrow.parquet")
+        row = (1, "A100NVY060F", "Бензин", "A100", "NVY060F", "ст. Новоярославская", "F", Decimal("100.00"),
+               Decimal("500000.00"), 1, date(2025, 8, 4), datetime(2025, 8, 4, 12, 0), None)
+
+        async def batches(query):
+            yield [row] * 3
+            yield [row] * 2
+
+        service = ExportService()
+        with patch.object(service, '_fetch_batches', batches):
+            body = await _collect(service.stream(export_query(), "parquet"))
+
+        table = pq.read_table(io.BytesIO(body))
+        assert table.num_rows == 5
+        assert table.column("volume")[0].as_py() == Decimal("100.00")
+        assert table.column("date")[0].as_py() == date(2025, 8, 4)
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            ExportService().stream(export_query(), "xml")
+
+    def test_arrow_formats_without_pyarrow(self):
+        with patch('app.services.export.pyarrow_available', return_value=False):
+            with pytest.raises(RuntimeError):
+                ExportService().stream(export_query(), "parquet")
+            assert ExportService().stream(export_query(), "csv") is not None
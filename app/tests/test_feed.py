@@ -0,0 +1,164 @@
+import asyncio
+import json
+import pytest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.admission import Overloaded
+from app.services.feed import FeedBroadcaster, format_event, parse_message, FEED_CHANNEL, FEED_HISTORY_KEY
+from app.utils.metrics import FEED_EVENTS
+
+DAY = {"date": "2025-07-11", "rows": 120, "volume": 1500.0, "total": 80000000.0, "count": 45}
+
+
+def message(event_id: int, day: str = "2025-07-11") -> str:
+    return f"{event_id} " + json.dumps({"version": event_id, "dates": [day]})
+
+
+async def take(stream, count: int):
+    return [await stream.__anext__() for _ in range(count)]
+
+
+class TestFeedBroadcaster:
+    @pytest.fixture
+    def broadcaster(self):
+        broadcaster = FeedBroadcaster(heartbeat=0.05, queue_size=2)
+        broadcaster.redis = AsyncMock()
+        broadcaster.redis.lrange.return_value = []
+        # без подписки на Redis: события подаются через _deliver
+        broadcaster._ensure_listener = MagicMock()
+        return broadcaster
+
+    def test_format_event(self):
+        assert parse_message('7 {"version": 3}') == (7, '{"version": 3}')
+        assert format_event(7, '{"version": 3}') == 'id: 7\nevent: trading_day\ndata: {"version": 3}\n\n'
+
+    @pytest.mark.asyncio
+    async def test_publish(self, broadcaster):
+        broadcaster.redis.eval.return_value = 12
+        with patch("app.services.feed.trading_days_summary", AsyncMock(return_value=[DAY])) as mock_summary:
+            assert await broadcaster.publish(41, [date(2025, 7, 11)]) == 12
+        mock_summary.assert_awaited_once_with([date(2025, 7, 11)])
+        args = broadcaster.redis.eval.await_args[0]
+        assert args[1:4] == (2, "trading_meta:feed:last_id", FEED_HISTORY_KEY)
+        assert args[5:] == (100, FEED_CHANNEL)
+        event = json.loads(args[4])
+        assert event["version"] == 41 and event["dates"] == ["2025-07-11"] and event["days"] == [DAY]
+
+    @pytest.mark.asyncio
+    async def test_publish_without_new_days(self, broadcaster):
+        with patch("app.services.feed.trading_days_summary", AsyncMock(return_value=[])):
+            assert await broadcaster.publish(41, [date(2025, 7, 12)]) is None
+        broadcaster.redis.eval.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_last_event_then_live_events(self, broadcaster):
+        broadcaster.redis.lrange.return_value = [message(5)]
+        stream = broadcaster.stream()
+        assert await take(stream, 2) == ["retry: 5000\n\n", format_event(*parse_message(message(5)))]
+        broadcaster.redis.lrange.assert_awaited_once_with(FEED_HISTORY_KEY, 0, 0)
+
+        # повтор уже отправленного события отсекается по id
+        broadcaster._deliver(*parse_message(message(5)))
+        broadcaster._deliver(*parse_message(message(6, "2025-07-14")))
+        assert await stream.__anext__() == format_event(*parse_message(message(6, "2025-07-14")))
+        assert await stream.__anext__() == ": ping\n\n"
+        await stream.aclose()
+        assert not broadcaster.subscribers
+
+    @pytest.mark.asyncio
+    async def test_stream_replays_missed_events(self, broadcaster):
+        broadcaster.redis.lrange.return_value = [message(7), message(6), message(5), message(4)]
+        stream = broadcaster.stream(last_event_id=5)
+        events = await take(stream, 3)
+        assert events[1:] == [format_event(*parse_message(message(6))), format_event(*parse_message(message(7)))]
+        broadcaster.redis.lrange.assert_awaited_once_with(FEED_HISTORY_KEY, 0, -1)
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_slow_client_is_disconnected(self, broadcaster):
+        stream = broadcaster.stream()
+        await take(stream, 1)
+        before = FEED_EVENTS.value(result="dropped_client")
+        for event_id in (1, 2, 3):
+            broadcaster._deliver(*parse_message(message(event_id)))
+        assert FEED_EVENTS.value(result="dropped_client") == before + 1
+        assert not broadcaster.subscribers
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+
+    @pytest.mark.asyncio
+    async def test_listener_fans_out_from_pubsub(self):
+        broadcaster = FeedBroadcaster(heartbeat=1)
+        broadcaster.redis = MagicMock()
+        broadcaster.redis.lrange = AsyncMock(return_value=[])
+        pubsub = MagicMock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.aclose = AsyncMock()
+
+        async def listen():
+            yield {"type": "subscribe", "data": 1}
+            yield {"type": "message", "data": message(9)}
+            await asyncio.Event().wait()
+
+        pubsub.listen = listen
+        broadcaster.redis.pubsub.return_value = pubsub
+        broadcaster.redis.close = AsyncMock()
+
+        streams = [broadcaster.stream() for _ in range(2)]
+        for stream in streams:
+            await stream.__anext__()
+        for stream in streams:
+            assert await stream.__anext__() == format_event(*parse_message(message(9)))
+        pubsub.subscribe.assert_awaited_once_with(FEED_CHANNEL)
+
+        await broadcaster.close()
+        for stream in streams:
+            with pytest.raises(StopAsyncIteration):
+                await stream.__anext__()
+        pubsub.aclose.assert_awaited()
+
+    def test_check_capacity(self, broadcaster):
+        broadcaster.max_clients = 1
+        broadcaster.check_capacity()
+        broadcaster.subscribers.add(asyncio.Queue())
+        with pytest.raises(Overloaded):
+            broadcaster.check_capacity()
+
+
+class TestFeedEndpoint:
+    @patch("app.api.endpoints.feed_broadcaster")
+    def test_feed_passes_last_event_id(self, mock_broadcaster):
+        async def stream(last_event_id):
+            yield f"id: {last_event_id}\n\n"
+
+        mock_broadcaster.stream = MagicMock(side_effect=stream)
+        response = TestClient(app).get("/trading/feed/", headers={"Last-Event-ID": "17"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["cache-control"] == "no-cache"
+        assert response.text == "id: 17\n\n"
+        mock_broadcaster.stream.assert_called_once_with(17)
+
+    @patch("app.api.endpoints.feed_broadcaster")
+    def test_feed_over_capacity(self, mock_broadcaster):
+        mock_broadcaster.check_capacity.side_effect = Overloaded(retry_after=5)
+        response = TestClient(app).get("/trading/feed/")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "5"
+
+
+class TestPostIngestion:
+    @pytest.mark.asyncio
+    async def test_event_published_after_warm_up(self):
+        from app.services.post_ingestion import on_ingestion_complete
+
+        calls = []
+        with patch("app.services.post_ingestion.data_version.bump", AsyncMock(return_value=42)), \
+                patch("app.services.post_ingestion.warm_after_ingestion",
+                      AsyncMock(side_effect=lambda **kwargs: calls.append("warm"))), \
+                patch("app.services.post_ingestion.feed_broadcaster.publish",
+                      AsyncMock(side_effect=lambda *args: calls.append(("publish",) + args))):
+            await on_ingestion_complete(dates=iter([date(2025, 7, 11)]))
+        assert calls == ["warm", ("publish", 42, [date(2025, 7, 11)])]
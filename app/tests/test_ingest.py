@@ -0,0 +1,99 @@
+import io
+import pytest
+from pathlib import Path
+from datetime import date
+from unittest.mock import patch, AsyncMock
+from app import ingest
+from app.ingest import Progress, build_parser, select_reports
+
+
+class TestIngestCli:
+    def test_parser_options(self):
+        args = build_parser().parse_args([
+            "process", "--workers", "4", "--processes", "2", "--batch-size", "500", "--start-date", "2024-01-01"
+        ])
+        assert args.command == "process"
+        assert (args.workers, args.processes, args.batch_size) == (4, 2, 500)
+        assert args.start_date == date(2024, 1, 1)
+        assert args.end_date is None
+
+    @pytest.mark.parametrize("argv", [
+        ["process", "--workers", "0"],
+        ["download", "--start-date", "01.01.2024"],
+        [],
+    ])
+    def test_parser_rejects(self, argv):
+        with pytest.raises(SystemExit):
+            build_parser().parse_args(argv)
+
+    def test_select_reports_by_date(self, tmp_path):
+        for name in ("oil_xls_20240101.xls", "oil_xls_20240215.xls", "oil_xls_20240301.xls", "notes.xls"):
+            (tmp_path / name).write_bytes(b"")
+        paths = select_reports(str(tmp_path), date(2024, 2, 1), date(2024, 3, 1))
+        assert [p.name for p in paths] == ["oil_xls_20240215.xls", "oil_xls_20240301.xls"]
+
+    def test_progress_logs_every_tenth(self):
+        progress = Progress("process", 20, stream=io.StringIO())
+        with patch("app.ingest.logger.info") as mock_info:
+            for _ in range(20):
+                progress.update(rows=5)
+        assert mock_info.call_count == 10
+        assert "20/20 файлов, 100 строк" in mock_info.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_sync_processes_only_new_files(self, tmp_path):
+        old = tmp_path / "oil_xls_20240101.xls"
+        old.write_bytes(b"")
+        new = tmp_path / "oil_xls_20240102.xls"
+        args = build_parser().parse_args(["sync", "--reports-dir", str(tmp_path), "--start-date", "2024-01-01",
+                                          "--end-date", "2024-01-02"])
+        with patch("app.ingest.download", AsyncMock(return_value=([old, new], 0))), \
+                patch("app.ingest.process", AsyncMock(return_value=(7, [date(2024, 1, 2)]))) as mock_process, \
+                patch("app.ingest.on_ingestion_complete", AsyncMock()) as mock_complete, \
+                patch("app.ingest.dispose_engines", AsyncMock()):
+            code = await ingest.run(args)
+
+        assert code == 0
+        assert mock_process.await_args[0][0] == [new]
+        # по умолчанию даты берутся под аренду в общей очереди
+        assert mock_process.await_args[0][4] is True
+        # сбрасываются только ключи кэша за загруженные даты
+        mock_complete.assert_awaited_once_with(dates=[date(2024, 1, 2)])
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("argv, coordinator", [([], ingest.ingestion_queue), (["--no-coordinate"], None)])
+    async def test_process_coordinates_through_queue(self, argv, coordinator):
+        args = build_parser().parse_args(["process", *argv])
+        with patch("app.ingest.ReportParser") as mock_parser:
+            mock_parser.return_value.process_files = AsyncMock(return_value=3)
+            await ingest.process([Path("oil_xls_20240101.xls")], args.workers, args.processes, args.batch_size,
+                                 not args.no_coordinate)
+        assert mock_parser.call_args.kwargs["coordinator"] is coordinator
+
+    @pytest.mark.asyncio
+    async def test_failed_downloads_exit_code(self, tmp_path):
+        args = build_parser().parse_args(["download", "--reports-dir", str(tmp_path)])
+        with patch("app.ingest.download", AsyncMock(return_value=([], 2))), \
+                patch("app.ingest.on_ingestion_complete", AsyncMock()) as mock_complete, \
+                patch("app.ingest.dispose_engines", AsyncMock()):
+            code = await ingest.run(args)
+
+        assert code == 1
+        mock_complete.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_rebuild_one_transaction_per_month(self):
+        mock_session = AsyncMock()
+        mock_context_manager = AsyncMock()
+        mock_context_manager.__aenter__.return_value = mock_session
+
+        with patch("app.ingest.AsyncSessionLocal", return_value=mock_context_manager), \
+                patch("app.ingest.rollup_service.refresh", AsyncMock()) as mock_refresh:
+            months = await ingest.rebuild(date(2024, 1, 30), date(2024, 3, 2))
+
+        assert months == 3
+        assert mock_session.commit.await_count == 3
+        first, second, third = (call.args[1] for call in mock_refresh.await_args_list)
+        assert first == [date(2024, 1, 30), date(2024, 1, 31)]
+        assert len(second) == 29
+        assert third == [date(2024, 3, 1), date(2024, 3, 2)]
@@ -0,0 +1,58 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.metrics import Counter, Histogram, Registry, HTTP_REQUEST_SECONDS
+
+
+class TestMetrics:
+    def test_counter_render(self):
+        counter = Counter("test_total", "Тестовый счётчик", ("result",))
+        counter.inc(result="hit")
+        counter.inc(2, result="hit")
+        counter.inc(result='mi"ss')
+
+        assert counter.value(result="hit") == 3
+        assert counter.render().splitlines() == [
+            "# HELP test_total Тестовый счётчик",
+            "# TYPE test_total counter",
+            'test_total{result="hit"} 3',
+            'test_total{result="mi\\"ss"} 1',
+        ]
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "Тестовая гистограмма", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        lines = histogram.render().splitlines()[2:]
+        assert lines == [
+            'test_seconds_bucket{le="0.1"} 2',
+            'test_seconds_bucket{le="1"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            "test_seconds_sum 3.65",
+            "test_seconds_count 4",
+        ]
+
+    def test_histogram_time(self):
+        histogram = Histogram("test_seconds", "Тестовая гистограмма", ("operation",))
+        with histogram.time(operation="get"):
+            pass
+        assert histogram.count(operation="get") == 1
+
+    def test_registry_render(self):
+        registry = Registry()
+        registry.counter("a_total", "a").inc()
+        registry.histogram("b_seconds", "b", buckets=(1,)).observe(0.5)
+        text = registry.render()
+        assert "a_total 1\n" in text
+        assert text.endswith("b_seconds_count 1\n")
+
+    def test_metrics_endpoint_and_route_labels(self):
+        client = TestClient(app)
+        before = HTTP_REQUEST_SECONDS.count(method="GET", route="/metrics", status=200)
+        client.get("/metrics")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE spimex_cache_requests_total counter" in response.text
+        assert HTTP_REQUEST_SECONDS.count(method="GET", route="/metrics", status=200) == before + 2
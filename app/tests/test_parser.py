@@ -1,5 +1,7 @@
+import asyncio
 import pytest
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import date
 from unittest.mock import patch, AsyncMock
@@ -7,6 +9,16 @@ from app.services.parser import ReportParser
 
 
 class TestParser:
+    @pytest.fixture(autouse=True)
+    def mock_partitions(self):
+        with patch("app.services.parser.partition_manager.ensure_partitions", AsyncMock(return_value=[])) as mock:
+            yield mock
+
+    @pytest.fixture(autouse=True)
+    def mock_dimensions(self):
+        with patch("app.services.parser.dimension_service.assign_keys", AsyncMock()) as mock:
+            yield mock
+
     @pytest.fixture
     def parser(self):
         return ReportParser()
@@ -128,3 +140,53 @@ class TestParser:
                 result = await parser.process_directory(Path("test_dir"))
 
         assert result == test_case["exp_result"]
+
+    @pytest.mark.asyncio
+    async def test_save_to_database_in_batches(self):
+        parser = ReportParser(batch_size=2)
+        df = pd.DataFrame([{
+            "exchange_product_id": f"A100NVY06{i}F",
+            "exchange_product_name": "Бензин (АИ-100-К5)",
+            "oil_id": "A100NVY06",
+            "delivery_basis_id": "NVY060F",
+            "delivery_basis_name": "ст. Новоярославская",
+            "delivery_type_id": "060F",
+            "volume": 100.0,
+            "total": 500000.0,
+            "count": 1,
+            "date": date(2025, 8, 4),
+        } for i in range(5)])
+        mock_session = AsyncMock()
+        mock_context_manager = AsyncMock()
+        mock_context_manager.__aenter__.return_value = mock_session
+
+        with patch("app.services.parser.AsyncSessionLocal", return_value=mock_context_manager), \
+                patch("app.services.parser.rollup_service.refresh", AsyncMock()):
+            result = await parser.save_to_database(df)
+
+        assert result == 5
+        assert mock_session.run_sync.await_count == 3
+        mock_session.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_process_file_in_executor(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        parser = ReportParser(executor=executor)
+        with patch("app.services.parser._parse_report", return_value=pd.DataFrame([{"date": date(2025, 8, 4)}])) \
+                as mock_parse, \
+                patch.object(ReportParser, "save_to_database", AsyncMock(return_value=1)):
+            result = await parser.process_file(Path("oil_xls_20250804.xls"), asyncio.Semaphore(1))
+        executor.shutdown()
+
+        assert result == 1
+        mock_parse.assert_called_once_with(Path("oil_xls_20250804.xls"), date(2025, 8, 4))
+
+    @pytest.mark.asyncio
+    async def test_process_files_reports_progress(self, parser):
+        progress = []
+        with patch.object(ReportParser, "process_file", AsyncMock(side_effect=[3, 0])):
+            result = await parser.process_files([Path("a.xls"), Path("b.xls")],
+                                                on_progress=lambda path, count: progress.append((path.name, count)))
+
+        assert result == 3
+        assert sorted(progress) == [("a.xls", 3), ("b.xls", 0)]
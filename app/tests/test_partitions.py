@@ -0,0 +1,61 @@
+import pytest
+from datetime import date
+from unittest.mock import AsyncMock, patch
+from app.services.partitions import (
+    PartitionManager,
+    add_months,
+    create_partition_sql,
+    partition_name
+)
+
+
+class TestPartitions:
+    @pytest.fixture
+    def manager(self):
+        return PartitionManager(premake_months=2)
+
+    @pytest.fixture
+    def mock_session(self):
+        session = AsyncMock()
+        session.__aenter__ = AsyncMock(return_value=session)
+        session.__aexit__ = AsyncMock(return_value=None)
+        return session
+
+    @pytest.mark.parametrize("day, months, expected", [
+        (date(2025, 7, 11), 1, date(2025, 8, 1)),
+        (date(2025, 12, 31), 1, date(2026, 1, 1)),
+        (date(2025, 1, 15), 14, date(2026, 3, 1)),
+    ])
+    def test_add_months(self, day, months, expected):
+        assert add_months(day, months) == expected
+
+    def test_create_partition_sql(self):
+        sql = create_partition_sql(date(2025, 12, 5))
+        assert partition_name(date(2025, 12, 5)) == "spimex_trading_results_y2025m12"
+        assert "PARTITION OF spimex_trading_results" in sql
+        assert "FROM ('2025-12-01') TO ('2026-01-01')" in sql
+
+    @pytest.mark.asyncio
+    async def test_ensure_partitions_creates_future_months_once(self, manager, mock_session):
+        with patch("app.services.partitions.AsyncSessionLocal", return_value=mock_session):
+            created = await manager.ensure_partitions([date(2025, 7, 1), date(2025, 7, 11)])
+            assert created == [date(2025, 7, 1), date(2025, 8, 1), date(2025, 9, 1)]
+            # advisory lock + три CREATE TABLE
+            assert mock_session.execute.await_count == 4
+            mock_session.commit.assert_awaited_once()
+
+            assert await manager.ensure_partitions([date(2025, 7, 15)]) == []
+            assert mock_session.execute.await_count == 4
+
+    @pytest.mark.asyncio
+    async def test_detach_partitions_before(self, manager, mock_session):
+        with patch("app.services.partitions.AsyncSessionLocal", return_value=mock_session), \
+                patch.object(PartitionManager, "list_partitions", AsyncMock(return_value=[
+                    "spimex_trading_results_y2023m01",
+                    "spimex_trading_results_y2023m02",
+                    "spimex_trading_results_y2024m01",
+                ])):
+            detached = await manager.detach_partitions_before(date(2024, 1, 20))
+
+        assert detached == ["spimex_trading_results_y2023m01", "spimex_trading_results_y2023m02"]
+        assert "DETACH PARTITION" in str(mock_session.execute.call_args[0][0])
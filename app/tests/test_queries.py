@@ -0,0 +1,72 @@
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from app.services.queries import (
+    RESULT_COLUMNS,
+    dynamics_batch_query,
+    dynamics_query,
+    trading_results_query,
+    row_to_result,
+    rows_to_results
+)
+
+
+class TestQueries:
+    @pytest.fixture
+    def sample_row(self):
+        return (
+            1, "A100NVY060F", "Бензин (АИ-100-К5)", "A100NVY06", "NVY060F", "ст. Новоярославская", "060F",
+            Decimal("100.00"), Decimal("500000.00"), 1, date(2025, 8, 4),
+            datetime(2025, 8, 4, 12, 0), None
+        )
+
+    def test_dynamics_query_selects_only_columns(self):
+        query = dynamics_query(date(2025, 8, 1), date(2025, 8, 4), oil_id="A100NVY06")
+        compiled = str(query)
+        assert len(query.selected_columns) == len(RESULT_COLUMNS)
+        assert "date >= :date_1" in compiled
+        assert "oil_id = :oil_id_1" in compiled
+        assert "delivery_type_id" not in compiled.split("WHERE")[1]
+        assert "ORDER BY spimex_trading_results.date DESC, spimex_trading_results.id" in compiled
+
+    def test_trading_results_query_without_filters(self):
+        compiled = str(trading_results_query(limit=5))
+        assert "WHERE" not in compiled
+        assert "LIMIT :param_1" in compiled
+
+    def test_row_to_result(self, sample_row):
+        result = row_to_result(sample_row)
+        assert result["volume"] == 100.0
+        assert isinstance(result["total"], float)
+        assert result["date"] == "2025-08-04"
+        assert result["created_on"] == "2025-08-04T12:00:00"
+        assert result["updated_on"] is None
+
+    def test_row_to_result_keeps_zero_volume(self, sample_row):
+        row = sample_row[:7] + (Decimal("0"),) + sample_row[8:]
+        assert row_to_result(row)["volume"] == 0.0
+
+    def test_rows_to_results(self, sample_row):
+        assert rows_to_results([sample_row, sample_row])[1]["id"] == 1
+        assert rows_to_results([]) == []
+
+    def test_dynamics_batch_query(self):
+        query = dynamics_batch_query([
+            {"start_date": date(2025, 7, 1), "end_date": date(2025, 7, 11), "oil_id": "A100NVY06"},
+            {"start_date": date(2025, 6, 1), "end_date": date(2025, 6, 30), "delivery_basis_id": "NVY060F"},
+        ])
+        compiled = str(query)
+        assert "JOIN (VALUES" in compiled
+        assert "f.oil_id IS NULL OR spimex_trading_results.oil_id = f.oil_id" in compiled
+        assert "ORDER BY f.idx" in compiled
+        params = query.compile().params
+        # общий диапазон для отсечения партиций
+        assert params["date_1"] == date(2025, 6, 1)
+        assert params["date_2"] == date(2025, 7, 11)
+
+    def test_names_come_from_dimension_tables(self):
+        compiled = str(dynamics_query(date(2025, 8, 1), date(2025, 8, 4)))
+        assert "LEFT OUTER JOIN spimex_instruments" in compiled
+        assert "LEFT OUTER JOIN spimex_delivery_bases" in compiled
+        assert "spimex_instruments.name AS exchange_product_name" in compiled
+        assert "spimex_delivery_bases.name AS delivery_basis_name" in compiled
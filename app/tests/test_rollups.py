@@ -0,0 +1,115 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from sqlalchemy.dialects import postgresql
+from app.services.rollups import (
+    RollupService, series_query, series_rows_to_results, aggregate_query, aggregate_rows_to_results
+)
+
+
+class TestRollups:
+    @pytest.fixture
+    def rollup_service(self):
+        return RollupService()
+
+    @pytest.mark.asyncio
+    async def test_refresh_touches_only_affected_dates(self, rollup_service):
+        session = AsyncMock()
+        await rollup_service.refresh(session, [date(2025, 7, 11), date(2025, 7, 10), date(2025, 8, 1)])
+
+        statements = [str(call.args[0]) for call in session.execute.call_args_list]
+        # 2 блокировки месяцев, пересчёт дней и календаря (delete + insert), пересчёт двух месяцев
+        assert len(statements) == 2 + 2 + 2 + 4
+        assert all("pg_advisory_xact_lock" in s for s in statements[:2])
+        assert statements[2].startswith("DELETE FROM spimex_daily_rollups")
+        assert "INSERT INTO spimex_daily_rollups" in statements[3]
+        assert "FROM spimex_trading_results" in statements[3]
+        assert statements[4].startswith("DELETE FROM spimex_trading_days")
+        assert "INSERT INTO spimex_trading_days" in statements[5]
+        assert "INSERT INTO spimex_monthly_rollups" in statements[7]
+        assert "FROM spimex_daily_rollups" in statements[7]
+
+    @pytest.mark.asyncio
+    async def test_refresh_without_dates(self, rollup_service):
+        session = AsyncMock()
+        await rollup_service.refresh(session, [])
+        session.execute.assert_not_called()
+
+    @pytest.mark.parametrize("granularity, table", [
+        ("day", "spimex_daily_rollups"),
+        ("month", "spimex_monthly_rollups"),
+    ])
+    def test_series_query(self, granularity, table):
+        compiled = str(series_query(granularity, date(2025, 1, 15), date(2025, 7, 1), oil_id="A100NVY06"))
+        assert f"FROM {table}" in compiled
+        assert "oil_id = :oil_id_1" in compiled
+        assert "GROUP BY" in compiled
+
+    def test_month_series_mid_month_range(self):
+        # 15.01–10.03: февраль из месячных агрегатов, январь и март — только дни внутри периода
+        query = series_query("month", date(2025, 1, 15), date(2025, 3, 10))
+        compiled = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        assert "spimex_daily_rollups.date >= '2025-01-15' AND spimex_daily_rollups.date <= '2025-01-31'" in compiled
+        assert "spimex_daily_rollups.date >= '2025-03-01' AND spimex_daily_rollups.date <= '2025-03-10'" in compiled
+        assert "spimex_monthly_rollups.month >= '2025-02-01' AND spimex_monthly_rollups.month <= '2025-02-01'" \
+            in compiled
+        assert "CAST(date_trunc('month', spimex_daily_rollups.date) AS DATE)" in compiled
+
+    def test_month_series_within_one_month(self):
+        compiled = str(series_query("month", date(2025, 1, 15), date(2025, 1, 20)))
+        assert "spimex_monthly_rollups" not in compiled
+
+    def test_month_series_whole_months(self):
+        compiled = str(series_query("month", date(2025, 1, 1), date(2025, 3, 31)))
+        assert "spimex_daily_rollups" not in compiled
+
+    def test_series_rows_to_results(self):
+        rows = [
+            (date(2025, 7, 1), Decimal("100"), Decimal("5000000"), 3),
+            (date(2025, 7, 2), Decimal("0"), Decimal("0"), 0),
+        ]
+        results = series_rows_to_results(rows)
+        assert results[0] == {
+            "period": "2025-07-01", "volume": 100.0, "total": 5000000.0, "count": 3, "avg_price": 50000.0
+        }
+        assert results[1]["avg_price"] is None
+
+    @pytest.mark.parametrize("start_date, end_date, group_by, bucket, table", [
+        (date(2025, 6, 1), date(2025, 6, 30), ["delivery_basis_id"], "month", "spimex_monthly_rollups"),
+        (date(2025, 1, 1), date(2025, 12, 31), ["period"], "year", "spimex_monthly_rollups"),
+        (date(2025, 6, 1), date(2025, 6, 30), ["period"], "week", "spimex_daily_rollups"),
+        (date(2025, 6, 10), date(2025, 6, 30), ["delivery_basis_id"], "month", "spimex_daily_rollups"),
+    ])
+    def test_aggregate_query_source(self, start_date, end_date, group_by, bucket, table):
+        compiled = str(aggregate_query(start_date, end_date, group_by, bucket))
+        assert f"FROM {table}" in compiled
+
+    def test_aggregate_query_top_n(self):
+        query = aggregate_query(date(2025, 6, 1), date(2025, 6, 20), ["delivery_basis_id", "period"], "week",
+                                order_by="vwap", limit=20, oil_id="A100NVY06")
+        compiled = str(query.compile(dialect=postgresql.dialect()))
+        assert "date_trunc('week', spimex_daily_rollups.date)" in compiled
+        assert "GROUP BY spimex_daily_rollups.delivery_basis_id, CAST(date_trunc('week'" in compiled
+        assert "ORDER BY vwap DESC NULLS LAST, spimex_daily_rollups.delivery_basis_id" in compiled
+        assert "nullif(sum(spimex_daily_rollups.volume)" in compiled
+        assert "LIMIT" in compiled
+        assert "spimex_daily_rollups.oil_id = " in compiled
+
+    def test_aggregate_query_without_groups(self):
+        compiled = str(aggregate_query(date(2025, 6, 1), date(2025, 6, 30), [], order_by=None))
+        assert "GROUP BY" not in compiled
+        assert "ORDER BY" not in compiled
+
+    def test_aggregate_rows_to_results(self):
+        rows = [
+            SimpleNamespace(_mapping={"delivery_basis_id": "NVY", "period": date(2025, 6, 1), "volume": Decimal("150"),
+                                      "total": Decimal("8000000"), "count": 3, "vwap": Decimal("53333.3333")}),
+            SimpleNamespace(_mapping={"delivery_basis_id": "", "period": date(2025, 6, 1), "volume": Decimal("0"),
+                                      "total": Decimal("0"), "count": None, "vwap": None}),
+        ]
+        results = aggregate_rows_to_results(rows, ["delivery_basis_id", "period"], ["total", "count", "vwap"])
+        assert results[0] == {"delivery_basis_id": "NVY", "period": "2025-06-01",
+                              "total": 8000000.0, "count": 3, "vwap": 53333.33}
+        assert results[1] == {"delivery_basis_id": None, "period": "2025-06-01", "total": 0.0, "count": 0, "vwap": None}
@@ -0,0 +1,153 @@
+import pytest
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.config import EXCHANGE_TZ
+from app.services.scheduler import IngestionScheduler, LeaderLease
+
+
+def _moscow(day: date, at: time) -> datetime:
+    return datetime.combine(day, at, tzinfo=EXCHANGE_TZ)
+
+
+FRIDAY = date(2025, 7, 11)
+
+
+def _queue(acquired: bool = True) -> MagicMock:
+    @asynccontextmanager
+    async def leased(day):
+        yield "fake/1" if acquired else None
+
+    queue = MagicMock()
+    queue.leased = leased
+    return queue
+
+
+class TestIngestionScheduler:
+    @pytest.fixture
+    def lease(self):
+        lease = MagicMock()
+        lease.acquire = AsyncMock(return_value=True)
+        return lease
+
+    @pytest.fixture
+    def scheduler(self, lease):
+        scheduler = IngestionScheduler(lease=lease, backoff_initial=60, backoff_max=200)
+        scheduler.is_ingested = AsyncMock(return_value=False)
+        return scheduler
+
+    @pytest.mark.parametrize("now, expected", [
+        (_moscow(FRIDAY, time(10, 0)), None),
+        (_moscow(FRIDAY, time(14, 30)), FRIDAY),
+        (_moscow(FRIDAY, time(23, 59)), None),
+        (_moscow(date(2025, 7, 12), time(15, 0)), None),
+    ])
+    def test_due_by_exchange_time(self, scheduler, now, expected):
+        assert scheduler.due(now) == expected
+
+    @pytest.mark.asyncio
+    async def test_backoff_until_published(self, scheduler):
+        scheduler.ingest = AsyncMock(side_effect=[None, None, 120])
+        start = _moscow(FRIDAY, time(14, 30))
+
+        assert await scheduler.tick(start) is None
+        assert scheduler.next_attempt == _moscow(FRIDAY, time(14, 31))
+        # до следующей попытки сайт не опрашивается
+        assert await scheduler.tick(_moscow(FRIDAY, time(14, 30, 30))) is None
+        assert scheduler.ingest.await_count == 1
+
+        assert await scheduler.tick(_moscow(FRIDAY, time(14, 31))) is None
+        assert scheduler.next_attempt == _moscow(FRIDAY, time(14, 33))
+        assert scheduler.backoff == 200
+
+        assert await scheduler.tick(_moscow(FRIDAY, time(14, 33))) == 120
+        assert FRIDAY in scheduler.done
+        assert scheduler.backoff == 60
+        assert await scheduler.tick(_moscow(FRIDAY, time(15, 0))) is None
+        assert scheduler.ingest.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_follower_does_nothing(self, scheduler, lease):
+        lease.acquire.return_value = False
+        scheduler.ingest = AsyncMock()
+
+        assert await scheduler.tick(_moscow(FRIDAY, time(14, 30))) is None
+        scheduler.ingest.assert_not_awaited()
+        scheduler.is_ingested.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_already_ingested_by_other_replica(self, scheduler):
+        scheduler.is_ingested.return_value = True
+        scheduler.ingest = AsyncMock()
+
+        assert await scheduler.tick(_moscow(FRIDAY, time(14, 30))) == 0
+        scheduler.ingest.assert_not_awaited()
+        assert FRIDAY in scheduler.done
+
+    @pytest.mark.asyncio
+    async def test_ingest_single_bulletin(self, scheduler, tmp_path):
+        downloader = MagicMock()
+        downloader.get_all_bulletins = AsyncMock(return_value=[("https://spimex.com/x.xls", FRIDAY)])
+        downloader.download_and_save = AsyncMock(return_value=str(tmp_path / "oil_xls_20250711.xls"))
+        parser = MagicMock()
+        parser.process_files = AsyncMock(return_value=42)
+
+        with patch("app.services.downloader.ReportDownloader", return_value=downloader), \
+                patch("app.services.parser.ReportParser", return_value=parser), \
+                patch("app.services.scheduler.ingestion_queue", _queue()), \
+                patch("app.services.scheduler.on_ingestion_complete", AsyncMock()) as mock_complete:
+            assert await scheduler.ingest(FRIDAY) == 42
+
+        downloader.get_all_bulletins.assert_awaited_once_with(FRIDAY, FRIDAY)
+        assert [p.name for p in parser.process_files.await_args[0][0]] == ["oil_xls_20250711.xls"]
+        mock_complete.assert_awaited_once_with(dates=[FRIDAY])
+
+    @pytest.mark.asyncio
+    async def test_zero_rows_is_retried(self, scheduler, tmp_path):
+        # ошибка записи в БД: парсер вернул 0 строк — дата не отмечается загруженной
+        downloader = MagicMock()
+        downloader.get_all_bulletins = AsyncMock(return_value=[("https://spimex.com/x.xls", FRIDAY)])
+        downloader.download_and_save = AsyncMock(return_value=str(tmp_path / "oil_xls_20250711.xls"))
+        parser = MagicMock()
+        parser.process_files = AsyncMock(side_effect=[0, 42])
+
+        with patch("app.services.downloader.ReportDownloader", return_value=downloader), \
+                patch("app.services.parser.ReportParser", return_value=parser), \
+                patch("app.services.scheduler.ingestion_queue", _queue()), \
+                patch("app.services.scheduler.on_ingestion_complete", AsyncMock()) as mock_complete:
+            assert await scheduler.tick(_moscow(FRIDAY, time(14, 30))) is None
+            mock_complete.assert_not_awaited()
+            assert FRIDAY not in scheduler.done
+            assert scheduler.next_attempt == _moscow(FRIDAY, time(14, 31))
+
+            assert await scheduler.tick(_moscow(FRIDAY, time(14, 31))) == 42
+        assert FRIDAY in scheduler.done
+        mock_complete.assert_awaited_once_with(dates=[FRIDAY])
+
+    @pytest.mark.asyncio
+    async def test_ingest_skips_date_leased_elsewhere(self, scheduler):
+        downloader = MagicMock()
+        downloader.get_all_bulletins = AsyncMock(return_value=[("https://spimex.com/x.xls", FRIDAY)])
+        downloader.download_and_save = AsyncMock()
+
+        with patch("app.services.downloader.ReportDownloader", return_value=downloader), \
+                patch("app.services.scheduler.ingestion_queue", _queue(acquired=False)):
+            assert await scheduler.ingest(FRIDAY) is None
+        downloader.download_and_save.assert_not_awaited()
+
+
+class TestLeaderLease:
+    @pytest.mark.asyncio
+    async def test_acquire_renews_or_sets_nx(self):
+        lease = LeaderLease(lease_seconds=10)
+        redis_client = AsyncMock()
+        lease._get_redis = MagicMock(return_value=redis_client)
+
+        redis_client.eval.return_value = 1
+        assert await lease.acquire() is True
+        redis_client.set.assert_not_awaited()
+
+        redis_client.eval.return_value = 0
+        redis_client.set.return_value = None
+        assert await lease.acquire() is False
+        redis_client.set.assert_awaited_once_with(lease.key, lease.owner, nx=True, px=10000)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.middleware import ServerTimingMiddleware
+from app.utils.profiler import SamplingProfiler
+from app.utils.serialization import dumps
+from app.utils.timing import span, record_span, start_collecting, server_timing_header
+
+
+def _app(**middleware_options) -> FastAPI:
+    test_app = FastAPI()
+
+    @test_app.get("/work")
+    async def work():
+        with span("db"):
+            await asyncio.sleep(0.01)
+        # дочерние задачи наследуют контекст запроса
+        await asyncio.gather(*(asyncio.create_task(_cache_call()) for _ in range(2)))
+        dumps({"ok": True})
+        return {"ok": True}
+
+    test_app.add_middleware(ServerTimingMiddleware, **middleware_options)
+    return test_app
+
+
+async def _cache_call():
+    record_span("cache", 0.002)
+
+
+class TestTiming:
+    def test_span_outside_request_is_noop(self):
+        with span("db"):
+            pass
+        record_span("cache", 1.0)
+
+    def test_spans_and_header(self):
+        async def run():
+            spans = start_collecting()
+            with span("db"):
+                pass
+            record_span("db", 0.5)
+            record_span("cache", 0.001)
+            return spans
+
+        spans = asyncio.run(run())
+        assert spans["db"][1] == 2
+        header = server_timing_header(spans, total=0.6)
+        assert header.startswith('db;dur=50')
+        assert 'cache;dur=1.00;desc="x1"' in header
+        assert header.endswith("total;dur=600.00")
+
+    def test_server_timing_middleware(self):
+        client = TestClient(_app(profile_sample_rate=0))
+        response = client.get("/work")
+
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        for name in ("db;dur=", 'cache;dur=4.00;desc="x2"', "serialize;dur=", "total;dur="):
+            assert name in timing
+        assert "x-profile-file" not in response.headers
+
+    def test_timing_log_built_only_when_enabled(self):
+        dumps = json.dumps
+        records = []
+
+        def spy(obj, **kwargs):
+            if isinstance(obj, dict) and "spans" in obj:
+                records.append(obj)
+            return dumps(obj, **kwargs)
+
+        with patch("app.api.middleware.json.dumps", side_effect=spy), \
+                patch("app.api.middleware.logger.log") as mock_log:
+            # быстрый запрос уходит на DEBUG, а логгер на INFO: запись не собирается
+            TestClient(_app(profile_sample_rate=0, log_threshold_ms=60_000)).get("/work")
+            assert records == []
+            mock_log.assert_not_called()
+
+            TestClient(_app(profile_sample_rate=0, log_threshold_ms=0)).get("/work")
+            assert len(records) == 1
+            assert mock_log.call_args[0][1].startswith("request_timing ")
+
+    def test_profile_by_header(self, tmp_path):
+        client = TestClient(_app(profile_header_enabled=True, profile_dir=str(tmp_path), profile_interval_ms=1))
+        response = client.get("/work", headers={"X-Profile": "1"})
+
+        profile = tmp_path / response.headers["x-profile-file"]
+        assert profile.exists()
+
+        disabled = TestClient(_app(profile_header_enabled=False, profile_dir=str(tmp_path)))
+        assert "x-profile-file" not in disabled.get("/work", headers={"X-Profile": "1"}).headers
+
+    def test_sampling_profiler_folded_output(self):
+        profiler = SamplingProfiler(interval=0.001).start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        profiler.stop()
+
+        assert profiler.samples > 0
+        stack, count = profiler.folded().splitlines()[0].rsplit(" ", 1)
+        assert "test_timing.py:TestTiming.test_sampling_profiler_folded_output" in stack
+        assert int(count) > 0
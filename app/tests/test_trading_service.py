@@ -1,7 +1,14 @@
+import json
 import pytest
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from unittest.mock import AsyncMock, patch, MagicMock
-from app.services.trading_service import TradingService
+from app.services.trading_service import TradingService, QueryStats, exchange_today
+from app.config import EXCHANGE_TZ
+
+
+async def _async_iter(items):
+    for item in items:
+        yield item
 
 
 class TestTradingService:
@@ -11,7 +18,15 @@ class TestTradingService:
 
     @pytest.fixture
     def mock_redis(self):
-        return AsyncMock()
+        redis_client = AsyncMock()
+        pipe = AsyncMock()
+        pipe.__aenter__.return_value = pipe
+        pipe.zincrby = MagicMock()
+        pipe.zremrangebyrank = MagicMock()
+        pipe.expire = MagicMock()
+        redis_client.pipeline = MagicMock(return_value=pipe)
+        redis_client.scan_iter = MagicMock(side_effect=lambda **kwargs: _async_iter([]))
+        return redis_client
 
     @pytest.fixture
     def mock_session(self):
@@ -58,12 +73,15 @@ class TestTradingService:
 
         with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
                 patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
-                patch('app.services.trading_service.AsyncSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
                 patch('app.services.trading_service.TradingService._set_cache') as mock_set_cache:
             result = await trading_service.get_last_trading_dates()
 
             assert result == test_dates
             mock_session.execute.assert_called_once()
+            called_query = str(mock_session.execute.call_args[0][0])
+            assert "FROM spimex_trading_days" in called_query
+            assert "DISTINCT" not in called_query
             mock_set_cache.assert_called_once()
 
     @pytest.mark.asyncio
@@ -87,15 +105,13 @@ class TestTradingService:
     @pytest.mark.asyncio
     async def test_get_dynamics_from_db(self, trading_service, mock_redis, mock_session, sample_trading_result):
         mock_result = MagicMock()
-        mock_scalars = MagicMock()
-        mock_scalars.fetchall.return_value = [MagicMock(**sample_trading_result)]
-        mock_result.scalars.return_value = mock_scalars
+        mock_result.fetchall.return_value = [tuple(sample_trading_result.values())]
 
         mock_session.execute.return_value = mock_result
 
         with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
                 patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
-                patch('app.services.trading_service.AsyncSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
                 patch('app.services.trading_service.TradingService._set_cache') as mock_set_cache:
             result = await trading_service.get_dynamics(
                 start_date=date(2025, 8, 1),
@@ -126,15 +142,13 @@ class TestTradingService:
     @pytest.mark.asyncio
     async def test_get_trading_results_from_db(self, trading_service, mock_redis, mock_session, sample_trading_result):
         mock_result = MagicMock()
-        mock_scalars = MagicMock()
-        mock_scalars.fetchall.return_value = [MagicMock(**sample_trading_result)]
-        mock_result.scalars.return_value = mock_scalars
+        mock_result.fetchall.return_value = [tuple(sample_trading_result.values())]
 
         mock_session.execute.return_value = mock_result
 
         with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
                 patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
-                patch('app.services.trading_service.AsyncSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
                 patch('app.services.trading_service.TradingService._set_cache') as mock_set_cache:
             result = await trading_service.get_trading_results(
                 oil_id="A100NVY06",
@@ -149,15 +163,13 @@ class TestTradingService:
     @pytest.mark.asyncio
     async def test_get_trading_results_with_filters(self, trading_service, mock_redis, mock_session):
         mock_result = MagicMock()
-        mock_scalars = MagicMock()
-        mock_scalars.fetchall.return_value = []
-        mock_result.scalars.return_value = mock_scalars
+        mock_result.fetchall.return_value = []
 
         mock_session.execute.return_value = mock_result
 
         with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
                 patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
-                patch('app.services.trading_service.AsyncSessionLocal', return_value=mock_session):
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session):
             await trading_service.get_trading_results(
                 oil_id="A100NVY06",
                 delivery_type_id="060F",
@@ -166,4 +178,302 @@ class TestTradingService:
             called_query = mock_session.execute.call_args[0][0]
             assert "oil_id = :oil_id_1" in str(called_query)
             assert "delivery_type_id = :delivery_type_id_1" in str(called_query)
-            assert "delivery_basis_id = :delivery_basis_id_1" in str(called_query)
\ No newline at end of file
+            assert "delivery_basis_id = :delivery_basis_id_1" in str(called_query)
+
+    @pytest.mark.asyncio
+    async def test_get_series_from_db(self, trading_service, mock_redis, mock_session):
+        mock_result = MagicMock()
+        mock_result.fetchall.return_value = [(date(2025, 7, 1), 150.0, 7500000.0, 2)]
+        mock_session.execute.return_value = mock_result
+
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.TradingService._set_cache') as mock_set_cache:
+            result = await trading_service.get_series(
+                start_date=date(2025, 7, 1),
+                end_date=date(2025, 7, 31),
+                granularity="month",
+                oil_id="A100NVY06")
+
+            assert result == [{
+                "period": "2025-07-01", "volume": 150.0, "total": 7500000.0, "count": 2, "avg_price": 50000.0
+            }]
+            assert "spimex_monthly_rollups" in str(mock_session.execute.call_args[0][0])
+            mock_set_cache.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_get_aggregates_from_db(self, trading_service, mock_redis, mock_session):
+        mock_result = MagicMock()
+        mock_result.fetchall.return_value = [
+            MagicMock(_mapping={"delivery_basis_id": "NVY", "total": 7500000.0, "vwap": 50000.0})
+        ]
+        mock_session.execute.return_value = mock_result
+
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.TradingService._set_cache') as mock_set_cache:
+            result = await trading_service.get_aggregates(
+                start_date=date(2025, 6, 1),
+                end_date=date(2025, 6, 30),
+                group_by=["delivery_basis_id"],
+                metrics=["total", "vwap"],
+                limit=5)
+
+            assert result == [{"delivery_basis_id": "NVY", "total": 7500000.0, "vwap": 50000.0}]
+            query = str(mock_session.execute.call_args[0][0])
+            assert "spimex_monthly_rollups" in query and "LIMIT" in query
+            cache_key = mock_set_cache.call_args[0][0]
+            assert cache_key.startswith("trading:v2:aggregates:")
+            assert "group_by_delivery_basis_id" in cache_key and "metrics_total,vwap" in cache_key
+            assert trading_service._key_affected(cache_key, [date(2025, 6, 15)])
+            assert not trading_service._key_affected(cache_key, [date(2025, 7, 1)])
+
+
+    @pytest.fixture(autouse=True)
+    def reset_checked_on(self):
+        TradingService.reset_checked_on = None
+        yield
+        TradingService.reset_checked_on = None
+
+    @pytest.mark.asyncio
+    async def test_cache_reset_once_per_day(self, trading_service, mock_redis):
+        mock_redis.set.return_value = datetime.now(EXCHANGE_TZ).date().isoformat()
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._should_reset_cache', return_value=True), \
+                patch('app.services.trading_service.TradingService.invalidate_cache') as mock_invalidate:
+            await trading_service._clear_cache_if_needed()
+            mock_invalidate.assert_not_called()
+
+            TradingService.reset_checked_on = None
+            mock_redis.set.return_value = "2000-01-01"
+            await trading_service._clear_cache_if_needed()
+            mock_invalidate.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_cache_reset_checked_in_redis_once_per_day(self, mock_redis):
+        mock_redis.set.return_value = datetime.now(EXCHANGE_TZ).date().isoformat()
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._should_reset_cache', return_value=True):
+            # сервис создаётся на каждый запрос: метка запоминается в процессе, а не в экземпляре
+            for _ in range(3):
+                await TradingService()._clear_cache_if_needed()
+        mock_redis.set.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_cache_uses_scan(self, trading_service, mock_redis):
+        mock_redis.scan_iter = MagicMock(side_effect=lambda **kwargs: _async_iter(["trading:a", "trading:b"]))
+        mock_redis.unlink.return_value = 2
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis):
+            assert await trading_service.invalidate_cache() == 2
+        mock_redis.unlink.assert_awaited_once_with("trading:a", "trading:b")
+        mock_redis.keys.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_dates_only_affected_keys(self, trading_service, mock_redis):
+        keys = [
+            "trading:v2:last_trading_dates:limit_10",
+            "trading:v2:trading_results:delivery_basis_id__delivery_type_id__limit_100_oil_id_A",
+            "trading:v2:trading_day:day_2025-07-11",
+            "trading:v2:trading_day:day_2025-07-10",
+            "trading:v2:dynamics:delivery_basis_id__delivery_type_id__end_date_2025-07-31_oil_id_A_start_date_2025-07-01",
+            "trading:v2:dynamics:delivery_basis_id__delivery_type_id__end_date_2025-06-30_oil_id_A_start_date_2025-06-01",
+            "trading:v2:series:delivery_basis_id__delivery_type_id__end_date_2025-12-31_granularity_month_oil_id_"
+            "_start_date_2025-01-01",
+        ]
+        mock_redis.scan_iter = MagicMock(side_effect=lambda **kwargs: _async_iter(keys))
+        mock_redis.unlink.return_value = 5
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis):
+            assert await trading_service.invalidate_dates([date(2025, 7, 11)]) == 5
+        mock_redis.unlink.assert_awaited_once_with(keys[0], keys[1], keys[2], keys[4], keys[6])
+
+    @pytest.mark.parametrize("day, affected", [
+        (date(2025, 1, 10), False),
+        (date(2025, 1, 15), True),
+        (date(2025, 3, 10), True),
+        (date(2025, 3, 20), False),
+    ])
+    def test_month_series_key_affected_only_inside_period(self, day, affected):
+        # месячный ряд за 15.01–10.03 не включает дни за пределами периода, даже из тех же месяцев
+        key = ("trading:v2:series:delivery_basis_id__delivery_type_id__end_date_2025-03-10_granularity_month_oil_id_"
+               "_start_date_2025-01-15")
+        assert TradingService._key_affected(key, [day]) is affected
+
+    @pytest.mark.parametrize("params, expected", [
+        (
+                {"start_date": "2020-01-01", "end_date": "2020-02-01", "oil_id": "A"},
+                {"start_date": "2020-01-01", "end_date": "2020-02-01", "oil_id": "A"}
+        ),
+        (
+                {"start_date": (exchange_today() - timedelta(days=30)).isoformat(),
+                 "end_date": exchange_today().isoformat(), "oil_id": "A"},
+                {"window_days": 30, "oil_id": "A"}
+        ),
+        (
+                {"limit": 10},
+                {"limit": 10}
+        ),
+    ])
+    def test_normalize_query(self, params, expected):
+        assert TradingService._normalize_query(params) == expected
+
+    @pytest.mark.parametrize("end_date, relative", [("2025-07-11", True), ("2025-07-10", False)])
+    def test_normalize_query_uses_exchange_day(self, end_date, relative):
+        # после полуночи по Москве «сегодня» уже 14-е, даже если на сервере (UTC) ещё 13-е
+        params = {"start_date": "2025-07-01", "end_date": end_date}
+        with patch('app.services.trading_service.datetime') as mock_datetime:
+            mock_datetime.now.return_value = datetime(2025, 7, 14, 0, 30, tzinfo=EXCHANGE_TZ)
+            normalized = TradingService._normalize_query(params)
+        mock_datetime.now.assert_called_once_with(EXCHANGE_TZ)
+        assert ("window_days" in normalized) is relative
+
+    @pytest.mark.asyncio
+    async def test_record_query_batched(self, trading_service, mock_redis):
+        member = '{"method": "last_trading_dates", "params": {"limit": 10}}'
+        stats = QueryStats(flush_interval=3600)
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.query_stats', stats):
+            # до истечения интервала частоты копятся в памяти, Redis не трогается
+            await trading_service._record_query("last_trading_dates", {"limit": 10})
+            await trading_service._record_query("last_trading_dates", {"limit": 10})
+            mock_redis.pipeline.assert_not_called()
+            assert stats.pending == {member: 2}
+
+            stats.flush_interval = 0
+            await trading_service._record_query("last_trading_dates", {"limit": 10})
+        key = f"trading_stats:queries:{datetime.now(EXCHANGE_TZ).date().isoformat()}"
+        pipe = mock_redis.pipeline.return_value
+        pipe.zincrby.assert_called_once_with(key, 3, member)
+        pipe.zremrangebyrank.assert_called_once_with(key, 0, -1001)
+        pipe.expire.assert_called_once_with(key, 7 * 86400)
+        assert not stats.pending
+
+    @pytest.mark.asyncio
+    async def test_query_stats_top_decays_older_days(self, mock_redis):
+        stats = QueryStats(days=3, decay=0.5)
+        mock_redis.zunion.return_value = [("old", 1.5), ("new", 4.0)]
+        assert await stats.top(mock_redis, 1) == [("new", 4.0)]
+        today = datetime.now(EXCHANGE_TZ).date()
+        mock_redis.zunion.assert_awaited_once_with({
+            stats.key(today): 1.0,
+            stats.key(today - timedelta(days=1)): 0.5,
+            stats.key(today - timedelta(days=2)): 0.25,
+        }, withscores=True)
+
+
+    @pytest.mark.parametrize("row, expected", [
+        (
+                (210, 150000.0, 9000000000.0, 640),
+                {"date": "2025-08-04", "is_trading_day": True, "rows": 210, "volume": 150000.0,
+                 "total": 9000000000.0, "count": 640}
+        ),
+        (
+                None,
+                {"date": "2025-08-04", "is_trading_day": False, "rows": 0, "volume": None, "total": None,
+                 "count": 0}
+        ),
+    ])
+    @pytest.mark.asyncio
+    async def test_get_trading_day(self, trading_service, mock_redis, mock_session, row, expected):
+        mock_result = MagicMock()
+        mock_result.first.return_value = row
+        mock_session.execute.return_value = mock_result
+
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._get_from_cache', return_value=None), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.TradingService._set_cache'):
+            assert await trading_service.get_trading_day(date(2025, 8, 4)) == expected
+
+
+    @pytest.mark.asyncio
+    async def test_get_dynamics_batch(self, trading_service, mock_redis, mock_session, sample_trading_result):
+        filters = [
+            {"start_date": date(2025, 8, 1), "end_date": date(2025, 8, 4), "oil_id": "A100NVY06"},
+            {"start_date": date(2025, 8, 1), "end_date": date(2025, 8, 4), "delivery_basis_id": "NVY060F"},
+            {"start_date": date(2025, 8, 1), "end_date": date(2025, 8, 4), "oil_id": "CACHED"},
+            {"start_date": date(2025, 8, 1), "end_date": date(2025, 8, 4), "oil_id": "A100NVY06"},
+        ]
+        mock_redis.mget.return_value = [None, None, '{"results": [{"id": 99}]}', None]
+        mock_result = MagicMock()
+        mock_result.fetchall.return_value = [(1,) + tuple(sample_trading_result.values())]
+        mock_session.execute.return_value = mock_result
+
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session), \
+                patch('app.services.trading_service.TradingService._set_many_cache') as mock_set_cache:
+            result = await trading_service.get_dynamics_batch(filters)
+
+        mock_redis.mget.assert_awaited_once()
+        mock_session.execute.assert_called_once()
+        assert result[0] == [] and result[3] == []
+        assert result[1][0]["id"] == sample_trading_result["id"]
+        assert result[2] == [{"id": 99}]
+        # повторяющийся фильтр запрашивается и кэшируется один раз
+        assert len(mock_set_cache.call_args[0][0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_get_dynamics_json_from_cache(self, trading_service, mock_redis):
+        cached = b'{"results":[],"count":0}'
+        bytes_redis = AsyncMock()
+        bytes_redis.get.return_value = cached
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._get_redis_bytes', return_value=bytes_redis), \
+                patch('app.services.trading_service.loads') as mock_loads, \
+                patch('app.services.trading_service.ReadSessionLocal') as mock_session_local:
+            result = await trading_service.get_dynamics_json(date(2025, 8, 1), date(2025, 8, 4))
+
+            # тело ответа — те же байты из Redis, без декодирования и повторного кодирования
+            assert result is cached
+            mock_redis.get.assert_not_awaited()
+            mock_loads.assert_not_called()
+            mock_session_local.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_trading_results_json_from_db(self, trading_service, mock_redis, mock_session,
+                                                    sample_trading_result):
+        mock_result = MagicMock()
+        mock_result.fetchall.return_value = [tuple(sample_trading_result.values())]
+        mock_session.execute.return_value = mock_result
+        mock_redis.get.return_value = None
+
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis), \
+                patch('app.services.trading_service.TradingService._get_redis_bytes', return_value=mock_redis), \
+                patch('app.services.trading_service.ReadSessionLocal', return_value=mock_session):
+            result = await trading_service.get_trading_results_json(oil_id="A100NVY06", limit=10)
+
+        body = json.loads(result)
+        assert body["count"] == 1
+        assert body["results"][0]["date"] == "2025-08-04"
+        # в кэш уходят те же байты, что и в ответ
+        cache_key, _, stored = mock_redis.setex.call_args[0]
+        assert cache_key.startswith("trading:v2:trading_results:")
+        assert stored == result
+
+    @pytest.mark.asyncio
+    async def test_cache_metrics(self, trading_service, mock_redis):
+        from app.utils.metrics import CACHE_REQUESTS
+        hits = CACHE_REQUESTS.value(method="trading_day", result="hit")
+        misses = CACHE_REQUESTS.value(method="trading_day", result="miss")
+        mock_redis.get.side_effect = ['{"date": "2025-08-04"}', None]
+
+        with patch('app.services.trading_service.TradingService._get_redis', return_value=mock_redis):
+            assert await trading_service._get_from_cache("trading:v2:trading_day:day_2025-08-04")
+            assert await trading_service._get_from_cache("trading:v2:trading_day:day_2025-08-05") is None
+
+        assert CACHE_REQUESTS.value(method="trading_day", result="hit") == hits + 1
+        assert CACHE_REQUESTS.value(method="trading_day", result="miss") == misses + 1
+
+    @pytest.mark.asyncio
+    async def test_services_share_redis_pool(self):
+        from app.services import redis_client
+        with patch.dict(redis_client._clients, clear=True):
+            first, second = TradingService(), TradingService()
+            assert await first._get_redis() is await second._get_redis()
+            assert await first._get_redis_bytes() is await second._get_redis_bytes()
+            assert await first._get_redis() is not await first._get_redis_bytes()
+            shared = await first._get_redis()
+            await first.close()
+            # закрытие запросного сервиса не трогает общий пул
+            assert redis_client.get_redis() is shared
@@ -0,0 +1,305 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from redis.exceptions import ConnectionError as RedisConnectionError
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.services.parser import ReportParser
+from app.services.work_queue import (
+    IngestionQueue, QueueWorker, QUEUE_KEYS, CLAIM_SCRIPT, ENQUEUE_SCRIPT, LEASE_SCRIPT, RELEASE_SCRIPT
+)
+
+DAYS = [date(2025, 7, 1) + timedelta(days=i) for i in range(10)]
+
+
+class FakeQueue:
+    # очередь в памяти с той же семантикой, что у скриптов Redis: одна дата — один владелец
+    lease_seconds = 30
+    max_attempts = 2
+
+    def __init__(self, days):
+        self.pending = list(days)
+        self.owners = {}
+        self.attempts = {}
+        self.failed = []
+        self.owner = "fake"
+
+    async def claim(self):
+        await asyncio.sleep(0)
+        if not self.pending:
+            return None
+        day = self.pending.pop(0)
+        assert day not in self.owners
+        token = f"{self.owner}/{id(asyncio.current_task())}/{day}"
+        self.owners[day] = token
+        return day, f"https://spimex.com/{day:%Y%m%d}.xls", token
+
+    async def complete(self, day, token):
+        if self.owners.get(day) != token:
+            return False
+        del self.owners[day]
+        return True
+
+    async def fail(self, day, token):
+        assert self.owners.pop(day) == token
+        self.attempts[day] = self.attempts.get(day, 0) + 1
+        if self.attempts[day] >= self.max_attempts:
+            self.failed.append(day)
+        else:
+            self.pending.append(day)
+        return self.attempts[day]
+
+    async def heartbeat(self, leases=None):
+        return sum(1 for day, token in (leases or {}).items() if self.owners.get(day) == token)
+
+    async def in_progress(self):
+        return len(self.owners)
+
+    async def is_ingested(self, day):
+        return False
+
+
+class TestIngestionQueue:
+    @pytest.fixture
+    def queue(self):
+        queue = IngestionQueue(lease_seconds=10, max_attempts=3)
+        queue.redis = AsyncMock()
+        return queue
+
+    @pytest.mark.asyncio
+    async def test_enqueue_passes_date_url_pairs(self, queue):
+        queue.redis.eval.return_value = 2
+        added = await queue.enqueue([("https://a.xls", DAYS[0]), ("https://b.xls", DAYS[1])])
+        assert added == 2
+        queue.redis.eval.assert_awaited_once_with(
+            ENQUEUE_SCRIPT, len(QUEUE_KEYS), *QUEUE_KEYS, "2025-07-01", "https://a.xls", "2025-07-02", "https://b.xls")
+
+    @pytest.mark.asyncio
+    async def test_enqueue_nothing_skips_redis(self, queue):
+        assert await queue.enqueue([]) == 0
+        queue.redis.eval.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_claim(self, queue):
+        queue.redis.eval.return_value = ["2025-07-01", "https://a.xls"]
+        day, url, token = await queue.claim()
+        assert (day, url) == (DAYS[0], "https://a.xls")
+        assert token.startswith(queue.owner + "/")
+        queue.redis.eval.assert_awaited_once_with(CLAIM_SCRIPT, len(QUEUE_KEYS), *QUEUE_KEYS, token, 10000)
+
+        queue.redis.eval.return_value = None
+        assert await queue.claim() is None
+
+    @pytest.mark.asyncio
+    async def test_leased_releases_only_own_lease(self, queue):
+        queue.lease = AsyncMock(return_value=None)
+        queue.release = AsyncMock()
+        async with queue.leased(DAYS[0]) as token:
+            assert token is None
+        queue.release.assert_not_awaited()
+
+        queue.lease.return_value = "fake/1"
+        async with queue.leased(DAYS[0]) as token:
+            assert token == "fake/1"
+        queue.release.assert_awaited_once_with(DAYS[0], "fake/1")
+
+    @pytest.mark.asyncio
+    async def test_tasks_of_one_process_do_not_share_date(self, queue):
+        # owners как в Redis: аренда выдаётся под токен взятия, а не под процесс
+        owners = {}
+
+        async def eval_script(script, numkeys, *args):
+            token, day = args[numkeys], args[-1]
+            if script == LEASE_SCRIPT:
+                if day in owners:
+                    return 0
+                owners[day] = token
+                return 1
+            if script == RELEASE_SCRIPT and owners.get(day) == token:
+                del owners[day]
+                return 1
+            return 0
+
+        queue.redis.eval.side_effect = eval_script
+        async with queue.leased(DAYS[0]) as first:
+            async with queue.leased(DAYS[0]) as second:
+                assert first and second is None
+            # выход второго блока не снимает аренду первого
+            assert owners == {"2025-07-01": first}
+        assert owners == {}
+
+
+class TestQueueWorker:
+    @pytest.mark.asyncio
+    async def test_workers_split_range_without_overlap(self):
+        queue = FakeQueue(DAYS)
+        seen = []
+
+        async def ingest(day, url):
+            seen.append(day)
+            await asyncio.sleep(0)
+            return 10
+
+        workers = [QueueWorker(queue=queue, concurrency=2, poll_seconds=0.01, refresh=False) for _ in range(3)]
+        for worker in workers:
+            worker.ingest = ingest
+        rows = await asyncio.gather(*(worker.run(drain=True) for worker in workers))
+
+        assert sorted(seen) == DAYS
+        assert sum(rows) == 100
+        assert queue.owners == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_date_is_retried_then_given_up(self):
+        queue = FakeQueue(DAYS[:2])
+        worker = QueueWorker(queue=queue, concurrency=1, refresh=False)
+        worker.ingest = AsyncMock(side_effect=lambda day, url: None if day == DAYS[0] else 5)
+
+        assert await worker.run(drain=True) == 5
+        assert queue.attempts == {DAYS[0]: 2}
+        assert worker.failed == [DAYS[0]]
+
+    @pytest.mark.asyncio
+    async def test_zero_rows_is_retried(self):
+        # 0 строк — проглоченная ошибка записи в БД: дата не завершается, а возвращается в очередь
+        queue = FakeQueue(DAYS[:1])
+        worker = QueueWorker(queue=queue, concurrency=1, refresh=False)
+        worker.ingest = AsyncMock(side_effect=[0, 5])
+
+        assert await worker.run(drain=True) == 5
+        assert queue.attempts == {DAYS[0]: 1}
+        assert worker.failed == []
+        assert queue.owners == {}
+
+    @pytest.mark.asyncio
+    async def test_refresh_once_per_batch(self):
+        queue = FakeQueue(DAYS[:3])
+        worker = QueueWorker(queue=queue, concurrency=2)
+        worker.ingest = AsyncMock(return_value=7)
+
+        with patch("app.services.work_queue.on_ingestion_complete", new_callable=AsyncMock) as mock_complete:
+            await worker.run(drain=True)
+        mock_complete.assert_awaited_once_with(dates=DAYS[:3])
+
+    @pytest.mark.asyncio
+    async def test_skips_date_already_in_database(self):
+        queue = FakeQueue(DAYS[:1])
+        queue.is_ingested = AsyncMock(return_value=True)
+        worker = QueueWorker(queue=queue, concurrency=1, refresh=False)
+        worker.ingest = AsyncMock()
+
+        assert await worker.run(drain=True) == 0
+        worker.ingest.assert_not_awaited()
+        assert queue.owners == {}
+
+
+class TestParserCoordination:
+    @staticmethod
+    def _coordinator(acquired: bool, ingested: bool = False) -> MagicMock:
+        @asynccontextmanager
+        async def leased(day):
+            yield "fake/1" if acquired else None
+
+        coordinator = MagicMock()
+        coordinator.leased = leased
+        coordinator.is_ingested = AsyncMock(return_value=ingested)
+        coordinator.complete = AsyncMock()
+        return coordinator
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("acquired, ingested, expected", [(True, False, 3), (False, False, 0), (True, True, 0)])
+    async def test_process_file_under_lease(self, acquired, ingested, expected):
+        coordinator = self._coordinator(acquired, ingested)
+        parser = ReportParser(coordinator=coordinator)
+        parser._process_file = AsyncMock(return_value=3)
+
+        count = await parser.process_file(Path("oil_xls_20250701.xls"), asyncio.Semaphore(1))
+
+        assert count == expected
+        assert parser._process_file.await_count == (1 if expected else 0)
+        assert coordinator.complete.await_count == (1 if expected else 0)
+        assert parser.loaded == ({date(2025, 7, 1)} if expected else set())
+        if expected:
+            coordinator.complete.assert_awaited_once_with(date(2025, 7, 1), "fake/1")
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_is_not_zero_rows(self):
+        # без аренды вызов должен упасть (эндпоинт ответит 503), а не вернуть «0 записей»
+        @asynccontextmanager
+        async def leased(day):
+            raise RedisConnectionError("Connection refused")
+            yield
+
+        coordinator = MagicMock()
+        coordinator.leased = leased
+        parser = ReportParser(coordinator=coordinator)
+        parser._process_file = AsyncMock(return_value=3)
+
+        with pytest.raises(RedisConnectionError):
+            await parser.process_file(Path("oil_xls_20250701.xls"), asyncio.Semaphore(1))
+        parser._process_file.assert_not_awaited()
+
+
+class TestQueueScripts:
+    # скрипты Lua целиком, на интерпретаторе fakeredis (нужны fakeredis и lupa из dev-зависимостей)
+    @pytest_asyncio.fixture
+    async def queue(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        queue = IngestionQueue(lease_seconds=10, max_attempts=2)
+        queue.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        yield queue
+        await queue.redis.aclose()
+
+    @pytest.mark.asyncio
+    async def test_claim_complete(self, queue):
+        assert await queue.enqueue([("https://b.xls", DAYS[1]), ("https://a.xls", DAYS[0])]) == 2
+        # повторная постановка не дублирует дату
+        assert await queue.enqueue([("https://a.xls", DAYS[0])]) == 0
+
+        day, url, token = await queue.claim()
+        assert (day, url) == (DAYS[0], "https://a.xls")
+        assert await queue.in_progress() == 1
+        assert await queue.complete(day, token)
+        status = await queue.status()
+        assert (status["pending"], status["running"]) == (1, {})
+
+    @pytest.mark.asyncio
+    async def test_lease_is_exclusive_per_acquisition(self, queue):
+        first = await queue.lease(DAYS[0])
+        assert first and await queue.lease(DAYS[0]) is None
+        # чужой токен того же процесса не продлевает, не завершает и не отпускает аренду
+        other = queue._token()
+        assert await queue.heartbeat({DAYS[0]: other}) == 0
+        assert not await queue.complete(DAYS[0], other)
+        assert not await queue.release(DAYS[0], other)
+        assert await queue.heartbeat({DAYS[0]: first}) == 1
+        assert await queue.release(DAYS[0], first)
+        assert await queue.lease(DAYS[0])
+
+    @pytest.mark.asyncio
+    async def test_fail_requeues_then_gives_up(self, queue):
+        await queue.enqueue([("https://a.xls", DAYS[0])])
+        day, _, token = await queue.claim()
+        assert await queue.fail(day, token) == 1
+        # повторный fail по той же аренде уже не наш
+        assert await queue.fail(day, token) == -1
+
+        day, _, token = await queue.claim()
+        assert await queue.fail(day, token) == 2
+        assert await queue.claim() is None
+        assert (await queue.status())["failed"] == ["2025-07-01"]
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_returns_to_queue(self, queue):
+        queue.lease_ms = 1
+        await queue.enqueue([("https://a.xls", DAYS[0])])
+        day, _, token = await queue.claim()
+        await asyncio.sleep(0.01)
+        # просроченная дата снова в очереди, и опоздавший владелец её уже не завершит
+        day, _, again = await queue.claim()
+        assert day == DAYS[0] and again != token
+        assert not await queue.complete(day, token)
+        assert await queue.complete(day, again)
@@ -0,0 +1,159 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Метрики в формате Prometheus без внешних зависимостей. Значения меняются из потока event loop,
+# обновление — поиск по словарю и сложение, поэтому блокировок нет.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        self._values.clear()
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # счётчики по корзинам (не накопительные, суммируются при выводе), сумма, количество
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "spimex_http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route", "status"))
+DOWNLOAD_SECONDS = registry.histogram(
+    "spimex_download_duration_seconds", "Время загрузки ресурса с сайта биржи", ("result",))
+DOWNLOAD_BYTES = registry.counter(
+    "spimex_download_bytes_total", "Скачано байт с сайта биржи")
+PARSE_FILE_SECONDS = registry.histogram(
+    "spimex_parse_file_duration_seconds", "Время разбора одного файла отчёта", ("result",))
+DB_LOAD_SECONDS = registry.histogram(
+    "spimex_db_load_duration_seconds", "Время записи одного отчёта в БД (вставка, агрегаты, commit)")
+DB_LOAD_ROWS = registry.counter(
+    "spimex_db_load_rows_total", "Записано строк в БД")
+DB_LOAD_BATCH_ROWS = registry.histogram(
+    "spimex_db_load_batch_rows", "Размер пачки строк при записи в БД",
+    buckets=(10, 25, 50, 100, 200, 500, 1000, 2500, 5000, 10000))
+CACHE_REQUESTS = registry.counter(
+    "spimex_cache_requests_total", "Обращения к кэшу Redis", ("method", "result"))
+CACHE_SECONDS = registry.histogram(
+    "spimex_cache_duration_seconds", "Время операций с кэшем Redis", ("operation",))
+DB_QUERY_SECONDS = registry.histogram(
+    "spimex_db_query_duration_seconds", "Время выполнения SQL-запроса", ("engine",))
+ADMISSION_REJECTED = registry.counter(
+    "spimex_admission_rejected_total", "Запросы, отклонённые ограничением нагрузки", ("reason", "endpoint_class"))
+FEED_EVENTS = registry.counter(
+    "spimex_feed_events_total", "События SSE-ленты: опубликовано, доставлено клиентам, клиент отключён",
+    ("result",))
@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+
+class SamplingProfiler:
+    # Снимает стек потока event loop каждые interval секунд из отдельного потока. Результат — «свёрнутые» стеки
+    # (folded stacks: func;func;func N), которые читают flamegraph.pl, speedscope и inferno.
+    # Поток один на все запросы, поэтому в профиль попадает и то, что параллельно делали соседние запросы.
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_qualname}:{code.co_firstlineno}"
+
+    def _fold(self, frame) -> str:
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame).replace(";", ","))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is not None:
+            self.stacks[self._fold(frame)] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def dump(self, path: Path) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.folded())
+        return path
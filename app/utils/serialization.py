@@ -0,0 +1,33 @@
+import json
+from typing import Any
+from fastapi.responses import JSONResponse, Response
+from .timing import span
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него работает стандартный json
+    orjson = None
+
+
+def dumps(data: Any) -> bytes:
+    with span("serialize"):
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    # ответ без повторной валидации через response_model: данные уже в итоговом виде
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    # готовое тело из кэша, отдаётся как есть
+    media_type = "application/json"
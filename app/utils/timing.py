@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional
+
+# Именованные отрезки времени текущего запроса (cache, db, hydrate, serialize...). Словарь создаёт middleware;
+# задачи, запущенные из обработчика, наследуют контекст и пишут в тот же словарь. Вне запроса запись ничего не делает.
+_spans: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_spans", default=None)
+
+
+def start_collecting() -> Dict[str, list]:
+    spans: Dict[str, list] = {}
+    _spans.set(spans)
+    return spans
+
+
+def record_span(name: str, seconds: float):
+    spans = _spans.get()
+    if spans is None:
+        return
+    entry = spans.get(name)
+    if entry is None:
+        spans[name] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def span(name: str):
+    if _spans.get() is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, perf_counter() - started)
+
+
+def server_timing_header(spans: Dict[str, list], total: Optional[float] = None) -> str:
+    parts = [f'{name};dur={seconds * 1000:.2f};desc="x{count}"' for name, (seconds, count) in spans.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
@@ -0,0 +1,84 @@
+"""Топ-N базисов по обороту: строки /trading/dynamics/ с подсчётом на клиенте против /trading/aggregates/.
+
+    python -m benchmarks.seed --days 750
+    python -m benchmarks.bench_aggregates --output results.json
+
+Оба варианта — SQL текущего query builder'а на одной базе: "client" читает все строки периода (как клиент
+dynamics) и группирует их в Python, "server" — один GROUP BY по таблицам-агрегатам. Время — медиана,
+вместе с передачей строк по сети; rows — сколько строк пришло клиенту.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from datetime import timedelta
+from statistics import median
+
+import asyncpg
+
+from app.services.partitions import month_start, add_months
+from app.services.queries import dynamics_query
+from app.services.rollups import aggregate_query
+from benchmarks.common import save_results
+from benchmarks.seed import DEFAULT_DSN
+from benchmarks.bench_indexes import compile_sql
+
+
+def top_bases(rows, limit: int):
+    totals = defaultdict(float)
+    for row in rows:
+        totals[row["delivery_basis_id"]] += float(row["total"] or 0)
+    return sorted(totals.items(), key=lambda item: -item[1])[:limit]
+
+
+async def measure(conn, sql: str, repeat: int, aggregate=None) -> dict:
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = await conn.fetch(sql)
+        if aggregate:
+            aggregate(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"ms": round(median(timings), 3), "rows": len(rows)}
+
+
+async def run(dsn: str, repeat: int, limit: int) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        last_date = await conn.fetchval("SELECT max(date) FROM spimex_trading_results")
+        if last_date is None:
+            raise SystemExit("Таблица пуста, сначала запустите benchmarks.seed")
+        # прошлый полный месяц (месячные агрегаты) и последний год до последней даты (дневные)
+        month = month_start(last_date)
+        cases = {
+            "top_bases_last_month": (add_months(month, -1), month - timedelta(days=1)),
+            "top_bases_last_year": (last_date - timedelta(days=365), last_date),
+        }
+        results = {}
+        for name, (start_date, end_date) in cases.items():
+            client = await measure(conn, compile_sql(dynamics_query(start_date, end_date)), repeat,
+                                   lambda rows: top_bases(rows, limit))
+            server = await measure(conn, compile_sql(aggregate_query(start_date, end_date, ["delivery_basis_id"],
+                                                                     limit=limit)), repeat)
+            results[name] = {"client": client, "server": server,
+                             "speedup": round(client["ms"] / server["ms"], 1) if server["ms"] else None}
+            print(f"{name}: client {client['ms']} мс / {client['rows']} строк, "
+                  f"server {server['ms']} мс / {server['rows']} строк")
+        return results
+    finally:
+        await conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--dsn", default=DEFAULT_DSN)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--limit", type=int, default=20)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+    save_results("aggregates", asyncio.run(run(args.dsn, args.repeat, args.limit)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Ценовая аналитика на многолетнем ряду: векторизованный расчёт против цикла по JSON.
+
+    python -m benchmarks.bench_analytics --years 3 --rows-per-day 200
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from statistics import median
+
+import numpy as np
+
+from benchmarks.common import save_results
+from app.services.analytics import PriceAnalytics
+
+
+def synthetic_rows(years: int, rows_per_day: int) -> list:
+    rng = np.random.default_rng(42)
+    start = date.today() - timedelta(days=365 * years)
+    days = [start + timedelta(days=i) for i in range(365 * years) if (start + timedelta(days=i)).weekday() < 5]
+    n = len(days) * rows_per_day
+    volume = rng.uniform(60, 5000, n).round(2)
+    total = (volume * rng.uniform(40000, 70000, n)).round(2)
+    count = rng.integers(1, 20, n)
+    dates = np.repeat(np.array(days, dtype=object), rows_per_day)
+    return list(zip(dates.tolist(), volume.tolist(), total.tolist(), count.tolist()))
+
+
+def loop_baseline(rows: list, window: int = 5) -> dict:
+    # так считают потребители: словари по дням, затем по месяцам
+    by_day = defaultdict(lambda: [0.0, 0.0, float("inf"), float("-inf")])
+    for d, volume, total, _ in rows:
+        acc = by_day[d]
+        acc[0] += volume
+        acc[1] += total
+        price = total / volume
+        acc[2] = min(acc[2], price)
+        acc[3] = max(acc[3], price)
+    days = sorted(by_day)
+    vwaps = [by_day[d][1] / by_day[d][0] for d in days]
+    rolling = [sum(vwaps[max(0, i - window + 1):i + 1]) / len(vwaps[max(0, i - window + 1):i + 1])
+               for i in range(len(vwaps))]
+    by_month = defaultdict(list)
+    for d, vwap in zip(days, vwaps):
+        by_month[d.replace(day=1)].append(vwap)
+    bands = {m: (min(v), max(v), sum(v) / len(v)) for m, v in by_month.items()}
+    return {"daily": len(days), "rolling": len(rolling), "bands": len(bands)}
+
+
+def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--years", type=int, action="append")
+    arg_parser.add_argument("--rows-per-day", type=int, default=200)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+
+    results = {}
+    for years in args.years or [1, 3, 5]:
+        rows = synthetic_rows(years, args.rows_per_day)
+        load_time = measure(lambda: PriceAnalytics.from_rows(rows), args.repeat)
+        analytics = PriceAnalytics.from_rows(rows)
+        compute_time = measure(lambda: analytics.compute(resample="month"), args.repeat)
+        loop_time = measure(lambda: loop_baseline(rows), args.repeat)
+        results[f"{years}y"] = {
+            "rows": len(rows),
+            "load_ms": round(load_time * 1000, 2),
+            "numpy_compute_ms": round(compute_time * 1000, 2),
+            "python_loop_ms": round(loop_time * 1000, 2),
+            "speedup_compute": round(loop_time / compute_time, 1),
+        }
+        print(f"{years} г. ({len(rows)} строк): загрузка {results[f'{years}y']['load_ms']} мс, "
+              f"NumPy {results[f'{years}y']['numpy_compute_ms']} мс, цикл {results[f'{years}y']['python_loop_ms']} мс")
+
+    save_results("analytics", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Колоночный движок в памяти против SQL-пути для /trading/dynamics/ и /trading/results/.
+
+    python -m benchmarks.bench_columnar --rows 127410
+    python -m benchmarks.bench_columnar --rows 127410 --sql   # плюс те же запросы к Postgres (benchmarks.seed)
+
+Движок: поиск строк (бинарный поиск + маски) и полный ответ со сборкой словарей.
+SQL: запрос и разбор строк через asyncpg, без Redis. Время — медиана на запрос.
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+from statistics import median
+
+from benchmarks.common import save_results
+from benchmarks.bench_serialization import synthetic_rows
+from benchmarks.bench_indexes import compile_sql
+from benchmarks.seed import DEFAULT_DSN
+from app.services.columnar import ColumnarSnapshot
+from app.services.queries import dynamics_query, trading_results_query, rows_to_results
+
+
+def build_cases(last_date, oil_id: str, basis_id: str) -> dict:
+    month_ago = last_date - timedelta(days=30)
+    year_ago = last_date - timedelta(days=365)
+    return {
+        "dynamics_30d_all": ("dynamics", dict(start_date=month_ago, end_date=last_date)),
+        "dynamics_365d_oil_id": ("dynamics", dict(start_date=year_ago, end_date=last_date, oil_id=oil_id)),
+        "dynamics_365d_basis": ("dynamics", dict(start_date=year_ago, end_date=last_date,
+                                                 delivery_basis_id=basis_id)),
+        "results_latest_100": ("trading_results", dict(limit=100)),
+        "results_oil_id_100": ("trading_results", dict(oil_id=oil_id, limit=100)),
+    }
+
+
+def measure(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(median(timings), 4)
+
+
+async def measure_sql(dsn: str, cases: dict, repeat: int) -> dict:
+    import asyncpg
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        results = {}
+        for name, (method, kwargs) in cases.items():
+            query = dynamics_query(**kwargs) if method == "dynamics" else trading_results_query(**kwargs)
+            sql = compile_sql(query)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows_to_results(await conn.fetch(sql))
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = round(median(timings), 4)
+        return results
+    finally:
+        await conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, default=127410)
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--sql", action="store_true", help="сравнить с запросами к Postgres")
+    arg_parser.add_argument("--dsn", default=DEFAULT_DSN)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    started = time.perf_counter()
+    snapshot = ColumnarSnapshot(rows)
+    build_seconds = time.perf_counter() - started
+    _, _, _, oil_id, basis_id, *_ = rows[0]
+    cases = build_cases(rows[0][10], oil_id, basis_id)
+
+    results = {
+        "rows": args.rows,
+        "snapshot_build_seconds": round(build_seconds, 3),
+        "snapshot_mb": round(snapshot.nbytes / 2 ** 20, 2),
+        "cases": {},
+    }
+    for name, (method, kwargs) in cases.items():
+        find = getattr(snapshot, f"{method}_index")
+        answer = getattr(snapshot, method)
+        results["cases"][name] = {
+            "matched_rows": len(find(**kwargs)),
+            "columnar_lookup_ms": measure(lambda: find(**kwargs), args.repeat),
+            "columnar_response_ms": measure(lambda: answer(**kwargs), args.repeat),
+        }
+
+    if args.sql:
+        # в Postgres должны быть данные benchmarks.seed; фильтры берутся из синтетических строк,
+        # поэтому сравнивается время, а не совпадение ответов
+        for name, ms in asyncio.run(measure_sql(args.dsn, cases, args.repeat)).items():
+            results["cases"][name]["sql_ms"] = ms
+
+    for name, case in results["cases"].items():
+        sql = f", SQL {case['sql_ms']} мс" if "sql_ms" in case else ""
+        print(f"{name}: {case['matched_rows']} строк, поиск {case['columnar_lookup_ms']} мс, "
+              f"ответ {case['columnar_response_ms']} мс{sql}")
+    save_results("columnar", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
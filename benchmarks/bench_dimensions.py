@@ -0,0 +1,99 @@
+"""Размер таблицы торгов и время чтения до и после выноса названий в таблицы-измерения.
+
+Прогнать на ревизии до миграции и после неё (на одной и той же базе, после VACUUM FULL):
+
+    alembic downgrade e7a3f5c2b918 && python -m benchmarks.bench_dimensions --output before.json
+    alembic upgrade head && psql -c "VACUUM FULL ANALYZE spimex_trading_results" \\
+        && python -m benchmarks.bench_dimensions --output after.json
+
+Размер — сумма по партициям (heap + TOAST + индексы), ширина строки — средний pg_column_size.
+Время — медиана полного прохода по таблице и типовых запросов /trading/dynamics/ (через query builder,
+то есть с JOIN к измерениям, если они есть).
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+from statistics import median
+
+import asyncpg
+
+from benchmarks.common import save_results
+from benchmarks.seed import DEFAULT_DSN
+from benchmarks.bench_indexes import compile_sql
+
+SIZE_SQL = """
+SELECT coalesce(sum(pg_table_size(c.oid)), 0) AS heap_bytes,
+       coalesce(sum(pg_indexes_size(c.oid)), 0) AS index_bytes
+FROM pg_class c
+WHERE c.relkind = 'r'
+  AND (c.relname = 'spimex_trading_results' OR c.relname LIKE 'spimex_trading_results_y%')
+"""
+ROW_WIDTH_SQL = "SELECT avg(pg_column_size(t.*)) FROM spimex_trading_results AS t"
+SCAN_SQL = "SELECT count(*), sum(volume), sum(total) FROM spimex_trading_results"
+
+
+async def timed(conn, sql: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await conn.fetch(sql)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(median(timings), 3)
+
+
+async def run(dsn: str, repeat: int) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        normalized = await conn.fetchval("SELECT to_regclass('spimex_instruments')") is not None
+        heap_bytes, index_bytes = await conn.fetchrow(SIZE_SQL)
+        last_date = await conn.fetchval("SELECT max(date) FROM spimex_trading_results")
+        if last_date is None:
+            raise SystemExit("Таблица пуста, сначала запустите benchmarks.seed")
+        oil_id = await conn.fetchval("SELECT oil_id FROM spimex_trading_results WHERE date = $1 LIMIT 1", last_date)
+        results = {
+            "normalized": normalized,
+            "rows": await conn.fetchval("SELECT count(*) FROM spimex_trading_results"),
+            "heap_mb": round(heap_bytes / 2 ** 20, 2),
+            "index_mb": round(index_bytes / 2 ** 20, 2),
+            "avg_row_bytes": round(float(await conn.fetchval(ROW_WIDTH_SQL)), 1),
+            "full_scan_ms": await timed(conn, SCAN_SQL, repeat),
+        }
+        if normalized:
+            results["dimension_rows"] = {
+                "spimex_instruments": await conn.fetchval("SELECT count(*) FROM spimex_instruments"),
+                "spimex_delivery_bases": await conn.fetchval("SELECT count(*) FROM spimex_delivery_bases"),
+            }
+            # запросы текущего кода: с JOIN к измерениям
+            from app.services.queries import dynamics_query
+            results["dynamics_30d_all_ms"] = await timed(
+                conn, compile_sql(dynamics_query(last_date - timedelta(days=30), last_date)), repeat)
+            results["dynamics_365d_oil_id_ms"] = await timed(
+                conn, compile_sql(dynamics_query(last_date - timedelta(days=365), last_date, oil_id=oil_id)), repeat)
+        else:
+            columns = ("id, exchange_product_id, exchange_product_name, oil_id, delivery_basis_id, "
+                       "delivery_basis_name, delivery_type_id, volume, total, count, date, created_on, updated_on")
+            results["dynamics_30d_all_ms"] = await timed(conn, (
+                f"SELECT {columns} FROM spimex_trading_results WHERE date >= '{last_date - timedelta(days=30)}' "
+                f"AND date <= '{last_date}' ORDER BY date DESC, id"), repeat)
+            results["dynamics_365d_oil_id_ms"] = await timed(conn, (
+                f"SELECT {columns} FROM spimex_trading_results WHERE date >= '{last_date - timedelta(days=365)}' "
+                f"AND date <= '{last_date}' AND oil_id = '{oil_id}' ORDER BY date DESC, id"), repeat)
+        for name, value in results.items():
+            print(f"{name}: {value}")
+        return results
+    finally:
+        await conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--dsn", default=DEFAULT_DSN)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+    save_results("dimensions", asyncio.run(run(args.dsn, args.repeat)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Планы и время запросов каждого эндпоинта на большой синтетической таблице.
+
+Сравнение индексов: прогнать на ревизии до миграции и после неё, например
+
+    python -m benchmarks.seed --rows 3000000 --truncate
+    alembic downgrade 517188ec1bd2 && python -m benchmarks.bench_indexes --output before.json
+    alembic upgrade head && python -m benchmarks.bench_indexes --output after.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import timedelta
+from statistics import median
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+
+from benchmarks.common import save_results
+from benchmarks.seed import DEFAULT_DSN
+from app.services.queries import dynamics_query, trading_results_query
+
+
+def compile_sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+async def build_cases(conn) -> dict:
+    last_date = await conn.fetchval("SELECT max(date) FROM spimex_trading_results")
+    if last_date is None:
+        raise SystemExit("Таблица пуста, сначала запустите benchmarks.seed")
+    oil_id, basis_id, type_id = await conn.fetchrow(
+        "SELECT oil_id, delivery_basis_id, delivery_type_id FROM spimex_trading_results "
+        "WHERE date = $1 LIMIT 1", last_date
+    )
+    month_ago = last_date - timedelta(days=30)
+    year_ago = last_date - timedelta(days=365)
+    return {
+        "last_dates_distinct": "SELECT DISTINCT date FROM spimex_trading_results ORDER BY date DESC LIMIT 10",
+        "last_dates_calendar": "SELECT date FROM spimex_trading_days ORDER BY date DESC LIMIT 10",
+        "dynamics_30d_all": compile_sql(dynamics_query(month_ago, last_date)),
+        "dynamics_365d_oil_id": compile_sql(dynamics_query(year_ago, last_date, oil_id=oil_id)),
+        "dynamics_365d_basis": compile_sql(dynamics_query(year_ago, last_date, delivery_basis_id=basis_id)),
+        "dynamics_365d_type": compile_sql(dynamics_query(year_ago, last_date, delivery_type_id=type_id)),
+        "results_latest_100": compile_sql(trading_results_query(limit=100)),
+        "results_oil_id_100": compile_sql(trading_results_query(oil_id=oil_id, limit=100)),
+        "results_type_1000": compile_sql(trading_results_query(delivery_type_id=type_id, limit=1000)),
+    }
+
+
+async def run(dsn: str, repeat: int) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        indexes = [r["indexdef"] for r in await conn.fetch(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = 'spimex_trading_results' ORDER BY indexname"
+        )]
+        total_rows = await conn.fetchval("SELECT count(*) FROM spimex_trading_results")
+        cases = {}
+        for name, sql in (await build_cases(conn)).items():
+            plan = json.loads(await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"))[0]
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await conn.fetch(sql)
+                timings.append((time.perf_counter() - started) * 1000)
+            cases[name] = {
+                "sql": sql,
+                "median_ms": round(median(timings), 3),
+                "max_ms": round(max(timings), 3),
+                "planning_ms": plan["Planning Time"],
+                "execution_ms": plan["Execution Time"],
+                "plan": plan["Plan"],
+            }
+            print(f"{name}: {cases[name]['median_ms']} мс (узел плана: {plan['Plan']['Node Type']})")
+        return {"rows": total_rows, "indexes": indexes, "cases": cases}
+    finally:
+        await conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--dsn", default=DEFAULT_DSN)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+    save_results("indexes", asyncio.run(run(args.dsn, args.repeat)), args.output)
+
+
+if __name__ == "__main__":
+    main()
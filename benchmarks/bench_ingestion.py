@@ -0,0 +1,92 @@
+"""Сквозной бенчмарк загрузки: скачивание с локального стенда, разбор .xls, запись в БД.
+
+    python -m benchmarks.bench_ingestion --days 120 --products 400
+    python -m benchmarks.bench_ingestion --days 120 --products 400 --load   # только на отдельной тестовой базе
+
+Бюллетени генерируются (benchmarks/bulletins.py) и раздаются локальным HTTP-стендом, так что сеть и сайт биржи
+не влияют на результат. Для каждого этапа — время, пропускная способность и пиковый RSS процесса.
+Этап --load пишет строки через ReportParser.save_to_database в базу из DB_* (партиции и агрегаты тоже).
+"""
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import save_results, StageMeter
+from benchmarks.bulletins import generate, BulletinSite
+from app.services.downloader import ReportDownloader
+from app.services.parser import ReportParser, report_date_from_path
+
+
+async def run(args) -> dict:
+    results = {"days": args.days, "products": args.products, "concurrency": args.concurrency}
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = Path(tmp) / "site", Path(tmp) / "reports"
+
+        with StageMeter() as meter:
+            paths = generate(source, args.days, args.products, args.seed)
+        size = sum(path.stat().st_size for path in paths)
+        results["generate"] = meter.result(files=len(paths), megabytes=round(size / 2 ** 20, 2))
+
+        site = await BulletinSite(source).start()
+        try:
+            dates = [report_date_from_path(path) for path in paths]
+            downloader = ReportDownloader(base_url=site.url, reports_dir=str(target))
+            with StageMeter() as meter:
+                saved = await downloader.get_and_save_reports(min(dates), max(dates), args.concurrency)
+            results["download"] = meter.result(
+                files=len(saved),
+                files_per_sec=round(len(saved) / meter.seconds, 1),
+                megabytes_per_sec=round(size / 2 ** 20 / meter.seconds, 2),
+            )
+        finally:
+            await site.stop()
+
+        parser = ReportParser()
+        frames = []
+        with StageMeter() as meter:
+            for path in sorted(target.glob("*.xls")):
+                df = parser.parse_xls_file(path, report_date_from_path(path))
+                if df is not None:
+                    frames.append(df)
+        rows = sum(len(df) for df in frames)
+        results["parse"] = meter.result(
+            files=len(frames),
+            rows=rows,
+            files_per_sec=round(len(frames) / meter.seconds, 1),
+            rows_per_sec=round(rows / meter.seconds),
+        )
+
+        if args.load:
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def save(df):
+                async with semaphore:
+                    return await parser.save_to_database(df)
+
+            with StageMeter() as meter:
+                saved_rows = sum(await asyncio.gather(*(save(df) for df in frames)))
+            results["load"] = meter.result(rows=saved_rows, rows_per_sec=round(saved_rows / meter.seconds))
+
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--days", type=int, default=120)
+    arg_parser.add_argument("--products", type=int, default=400)
+    arg_parser.add_argument("--concurrency", type=int, default=10)
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--load", action="store_true", help="записать строки в БД (тестовую!)")
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for stage in ("generate", "download", "parse", "load"):
+        if stage in results:
+            print(f"{stage}: {results[stage]}")
+    save_results("ingestion", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
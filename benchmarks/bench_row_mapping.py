@@ -0,0 +1,126 @@
+"""Стоимость строки результата: ORM-гидрация против Core-строк с проекцией колонок.
+
+    python -m benchmarks.bench_row_mapping --rows 10000 --rows 50000
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from statistics import median
+
+from benchmarks.common import save_results
+from sqlalchemy import MetaData, create_engine, select
+from sqlalchemy.orm import Session
+
+from app.models import SpimexTradingResult, SpimexInstrument, SpimexDeliveryBasis
+from app.services.queries import RESULT_FROM, dynamics_query, rows_to_results
+
+
+def seed(engine, rows: int) -> None:
+    rnd = random.Random(42)
+    start = date(2023, 1, 1)
+    now = datetime(2025, 7, 23, 15, 42)
+    # SQLite не умеет autoincrement в составном ключе (id, date), id проставляем сами
+    metadata = MetaData()
+    SpimexInstrument.__table__.to_metadata(metadata)
+    SpimexDeliveryBasis.__table__.to_metadata(metadata)
+    table = SpimexTradingResult.__table__.to_metadata(metadata)
+    table.c.id.autoincrement = False
+    metadata.create_all(engine)
+    instruments = {}
+    records = []
+    for i in range(rows):
+        code = f"A{rnd.randint(100, 999)}NVY{rnd.randint(10, 99)}F"
+        instrument_key = instruments.setdefault(code, len(instruments) + 1)
+        records.append({
+            "id": i + 1,
+            "exchange_product_id": code,
+            "instrument_key": instrument_key,
+            "oil_id": code[:10],
+            "delivery_basis_id": code[4:14],
+            "delivery_basis_key": 1,
+            "delivery_type_id": code[-5:],
+            "volume": round(rnd.uniform(60, 5000), 2),
+            "total": round(rnd.uniform(1e5, 5e8), 2),
+            "count": rnd.randint(1, 20),
+            "date": start + timedelta(days=i % 900),
+            "created_on": now,
+            "updated_on": now,
+        })
+    with Session(engine) as session:
+        session.bulk_insert_mappings(SpimexInstrument, [
+            {"id": key, "exchange_product_id": code,
+             "name": "Бензин автомобильный ЭКТО-92 (АИ-92-К5), ст. Новоярославская"}
+            for code, key in instruments.items()
+        ])
+        session.bulk_insert_mappings(SpimexDeliveryBasis, [{"id": 1, "name": "ст. Новоярославская"}])
+        session.bulk_insert_mappings(SpimexTradingResult, records)
+        session.commit()
+
+
+def orm_path(session: Session) -> list:
+    query = select(SpimexTradingResult, SpimexInstrument.name, SpimexDeliveryBasis.name) \
+        .select_from(RESULT_FROM) \
+        .order_by(SpimexTradingResult.date.desc(), SpimexTradingResult.id)
+    records = session.execute(query).fetchall()
+    return [{
+        "id": record.id,
+        "exchange_product_id": record.exchange_product_id,
+        "exchange_product_name": product_name,
+        "oil_id": record.oil_id,
+        "delivery_basis_id": record.delivery_basis_id,
+        "delivery_basis_name": basis_name,
+        "delivery_type_id": record.delivery_type_id,
+        "volume": float(record.volume) if record.volume else None,
+        "total": float(record.total) if record.total else None,
+        "count": record.count,
+        "date": record.date.isoformat(),
+        "created_on": record.created_on.isoformat() if record.created_on else None,
+        "updated_on": record.updated_on.isoformat() if record.updated_on else None
+    } for record, product_name, basis_name in records]
+
+
+def core_path(session: Session) -> list:
+    query = dynamics_query(date(2000, 1, 1), date(2100, 1, 1))
+    return rows_to_results(session.execute(query).fetchall())
+
+
+def measure(engine, func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with Session(engine) as session:
+            started = time.perf_counter()
+            func(session)
+            timings.append(time.perf_counter() - started)
+    return median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, action="append", help="размер результата (можно несколько раз)")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--output", help="путь к JSON с результатами")
+    args = arg_parser.parse_args()
+
+    results = {}
+    for rows in args.rows or [10_000, 50_000]:
+        engine = create_engine("sqlite://")
+        seed(engine, rows)
+        orm_time = measure(engine, orm_path, args.repeat)
+        core_time = measure(engine, core_path, args.repeat)
+        results[rows] = {
+            "orm_ms": round(orm_time * 1000, 2),
+            "core_ms": round(core_time * 1000, 2),
+            "orm_us_per_row": round(orm_time / rows * 1e6, 3),
+            "core_us_per_row": round(core_time / rows * 1e6, 3),
+            "speedup": round(orm_time / core_time, 2),
+        }
+        print(f"{rows} строк: ORM {results[rows]['orm_us_per_row']} мкс/строка, "
+              f"Core {results[rows]['core_us_per_row']} мкс/строка (x{results[rows]['speedup']})")
+        engine.dispose()
+
+    save_results("row_mapping", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
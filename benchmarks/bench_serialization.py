@@ -0,0 +1,95 @@
+"""Сериализация ответа /trading/dynamics/: прежний путь через Pydantic против готовых байтов.
+
+    python -m benchmarks.bench_serialization --rows 1000 --rows 10000
+
+Прежний путь: json.loads из кэша -> DynamicsResponse -> повторная валидация response_model -> json.dumps.
+Новый путь: при попадании в кэш байты отдаются как есть, при промахе строки сериализуются один раз.
+Время — медиана wall-clock и процессорного времени на один ответ.
+"""
+import argparse
+import json
+import time
+from datetime import date, datetime, timedelta
+from statistics import median
+
+from fastapi.responses import JSONResponse
+
+from benchmarks.common import save_results
+from app.schemas import DynamicsResponse
+from app.services.queries import rows_to_results
+from app.utils.serialization import dumps, orjson
+
+
+def synthetic_rows(n: int) -> list:
+    start = date(2025, 7, 11)
+    created = datetime(2025, 7, 23, 15, 42, 19, 760432)
+    return [
+        (i, f"TRD-RFF{i % 900:03d}C", "Топливо для реактивных двигателей марок РТ в/с ТС-1 в/с, РФ БП",
+         f"TRD-RFF{i % 900:03d}", f"RFF{i % 900:03d}C", "РФ БП", "F060C", 1500.0 + i, 119221500.0 + i,
+         1 + i % 7, start - timedelta(days=i // 200), created, created)
+        for i in range(n)
+    ]
+
+
+def pydantic_response(results: list) -> bytes:
+    # как было: ручная сборка модели, затем валидация и сериализация по response_model
+    model = DynamicsResponse(results=results, count=len(results))
+    content = DynamicsResponse.model_validate(model.model_dump()).model_dump(mode="json")
+    return JSONResponse(content).body
+
+
+def measure(func, repeat: int) -> dict:
+    wall, cpu = [], []
+    for _ in range(repeat):
+        started_wall, started_cpu = time.perf_counter(), time.process_time()
+        func()
+        wall.append(time.perf_counter() - started_wall)
+        cpu.append(time.process_time() - started_cpu)
+    return {"wall_ms": round(median(wall) * 1000, 3), "cpu_ms": round(median(cpu) * 1000, 3)}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, action="append")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+
+    results = {"encoder": "orjson" if orjson is not None else "json"}
+    for n in args.rows or [1000, 10000]:
+        rows = synthetic_rows(n)
+        results_list = rows_to_results(rows)
+        cached = json.dumps({"results": results_list, "count": n})
+        fast_cached = dumps({"results": results_list, "count": n}).decode()
+
+        def old_hit():
+            return pydantic_response(json.loads(cached)["results"])
+
+        def old_miss():
+            data = rows_to_results(rows)
+            json.dumps({"results": data})
+            return pydantic_response(data)
+
+        def new_hit():
+            return fast_cached.encode()
+
+        def new_miss():
+            data = rows_to_results(rows)
+            return dumps({"results": data, "count": len(data)})
+
+        assert json.loads(old_hit()) == json.loads(new_hit())
+        results[str(n)] = {
+            "pydantic_cache_hit": measure(old_hit, args.repeat),
+            "raw_cache_hit": measure(new_hit, args.repeat),
+            "pydantic_cache_miss": measure(old_miss, args.repeat),
+            "fast_cache_miss": measure(new_miss, args.repeat),
+        }
+        row = results[str(n)]
+        print(f"{n} строк: попадание {row['pydantic_cache_hit']['wall_ms']} -> {row['raw_cache_hit']['wall_ms']} мс, "
+              f"промах {row['pydantic_cache_miss']['wall_ms']} -> {row['fast_cache_miss']['wall_ms']} мс")
+
+    save_results("serialization", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Время импорта app.main и RSS воркера сразу после старта.
+
+    python -m benchmarks.bench_startup --repeat 5
+
+Каждый замер — отдельный интерпретатор (как свежий воркер uvicorn). Сценарии:
+API только для чтения (INGESTION_API_ENABLED=false), API с роутером загрузки и прежнее поведение,
+когда парсер и загрузчик импортировались вместе с эндпоинтами.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+from benchmarks.common import ROOT_DIR, save_results
+
+HEAVY_MODULES = ("pandas", "numpy", "bs4", "aiohttp", "pyarrow")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+{extra}
+elapsed = time.perf_counter() - started
+from benchmarks.common import current_rss
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "rss_mb": current_rss() / 2 ** 20,
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+SCENARIOS = {
+    "read_only": ({"INGESTION_API_ENABLED": "false"}, ""),
+    "with_ingestion_router": ({"INGESTION_API_ENABLED": "true"}, ""),
+    # как было до выделения роутера: парсер и загрузчик импортируются при старте
+    "eager_ingestion": ({"INGESTION_API_ENABLED": "true"},
+                        "import app.services.parser, app.services.downloader, app.services.analytics"),
+}
+
+
+def probe(env: dict, extra: str) -> dict:
+    output = subprocess.check_output(
+        [sys.executable, "-c", PROBE.format(extra=extra, heavy=HEAVY_MODULES)],
+        cwd=ROOT_DIR, env={**os.environ, **env}
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+
+    results = {}
+    for name, (env, extra) in SCENARIOS.items():
+        runs = [probe(env, extra) for _ in range(args.repeat)]
+        results[name] = {
+            "import_ms": round(median(run["import_ms"] for run in runs), 1),
+            "rss_mb": round(median(run["rss_mb"] for run in runs), 1),
+            "loaded": runs[-1]["loaded"],
+        }
+        row = results[name]
+        print(f"{name}: импорт {row['import_ms']} мс, RSS {row['rss_mb']} МБ, загружены: {row['loaded'] or '-'}")
+
+    save_results("startup", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Пропускная способность общей очереди загрузки в зависимости от числа узлов.
+
+Каждый «узел» — отдельный QueueWorker со своим владельцем и подключением к Redis; загрузка даты
+заменена задержкой --latency-ms (скачивание + разбор + запись). Проверяется, что каждая дата загружена
+ровно один раз, и что даты «упавшего» узла (--crash) подхватываются остальными после истечения аренды.
+
+    python -m benchmarks.bench_work_queue --dates 600 --nodes 1 --nodes 2 --nodes 4
+    python -m benchmarks.bench_work_queue --dates 200 --nodes 3 --crash --lease-seconds 2
+
+Нужен запущенный Redis (REDIS_HOST/REDIS_PORT); ключи trading_meta:ingest:* очищаются перед каждым прогоном.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import List
+
+from benchmarks.common import save_results
+from app.services.redis_client import close_redis
+from app.services.work_queue import IngestionQueue, QueueWorker, QUEUE_KEYS
+
+
+async def run_nodes(dates: int, nodes: int, concurrency: int, latency: float, lease_seconds: float,
+                    crash: bool) -> dict:
+    days = [date(2023, 1, 1) + timedelta(days=i) for i in range(dates)]
+    queues: List[IngestionQueue] = [IngestionQueue(lease_seconds=lease_seconds) for _ in range(nodes)]
+    await queues[0]._get_redis().delete(*QUEUE_KEYS)
+    await queues[0].enqueue((f"https://spimex.com/{day:%Y%m%d}.xls", day) for day in days)
+    loaded = Counter()
+
+    async def ingest(day, url):
+        await asyncio.sleep(latency)
+        loaded[day] += 1
+        return 1
+
+    workers = []
+    for queue in queues:
+        worker = QueueWorker(queue=queue, concurrency=concurrency, poll_seconds=lease_seconds / 4, refresh=False)
+        worker.ingest = ingest
+        queue.is_ingested = lambda day: asyncio.sleep(0, result=False)
+        workers.append(worker)
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(worker.run(drain=True)) for worker in workers]
+    if crash and nodes > 1:
+        # «падение» узла: задачи отменяются посреди загрузки, аренды остаются в Redis до истечения срока
+        await asyncio.sleep(latency * 2)
+        tasks[0].cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    status = await queues[-1].status()
+    await queues[-1]._get_redis().delete(*QUEUE_KEYS)
+    for queue in queues:
+        await queue.close()
+
+    missing = [day for day in days if not loaded[day]]
+    return {
+        "nodes": nodes,
+        "seconds": round(elapsed, 3),
+        "dates_per_second": round(dates / elapsed, 1),
+        "duplicates": sum(count - 1 for count in loaded.values() if count > 1),
+        "missing": len(missing),
+        "left_pending": status["pending"],
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results = {"dates": args.dates, "concurrency": args.concurrency, "latency_ms": args.latency_ms, "runs": []}
+    for nodes in args.nodes or [1, 2, 4]:
+        result = await run_nodes(args.dates, nodes, args.concurrency, args.latency_ms / 1000,
+                                 args.lease_seconds, args.crash)
+        print(f"{nodes} узл.: {result['dates_per_second']} дат/с, дублей {result['duplicates']}, "
+              f"пропущено {result['missing']}")
+        results["runs"].append(result)
+    await close_redis()
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--dates", type=int, default=600)
+    arg_parser.add_argument("--nodes", type=int, action="append")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="дат в работе на одном узле")
+    arg_parser.add_argument("--latency-ms", type=float, default=50)
+    arg_parser.add_argument("--lease-seconds", type=float, default=5)
+    arg_parser.add_argument("--crash", action="store_true", help="остановить первый узел посреди прогона")
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+    save_results("work_queue", asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Синтетические бюллетени TRADE_SUMMARY (.xls) и локальный стенд вместо сайта биржи.
+
+    python -m benchmarks.bulletins --days 60 --products 400 --output /tmp/bulletins
+
+Файлы повторяют раскладку настоящих отчётов: шапка, строка с единицей измерения, заголовки колонок с переносами,
+строки инструментов (часть без сделок), строка «Итого:». Стенд отдаёт страницы списка со ссылками того же вида,
+что и spimex.com, и сами файлы, поэтому ReportDownloader и ReportParser работают с ним без изменений.
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import xlwt
+from aiohttp import web
+
+COLUMNS = [
+    "Код\nИнструмента",
+    "Наименование\nИнструмента",
+    "Базис\nпоставки",
+    "Объем\nДоговоров\nв единицах\nизмерения",
+    "Обьем\nДоговоров,\nруб.",
+    "Изменение рыночной\nцены к цене\nпредыдущего\nдня, руб.",
+    "Изменение рыночной\nцены к цене\nпредыдущего\nдня, %",
+    "Цена\n(за единицу\nизмерения), руб.\nМинимальная",
+    "Цена\n(за единицу\nизмерения), руб.\nСредневзвешенная",
+    "Цена\n(за единицу\nизмерения), руб.\nМаксимальная",
+    "Количество\nДоговоров,\nшт.",
+]
+FUELS = [("A592", "Бензин (АИ-92-К5)"), ("A595", "Бензин (АИ-95-К5)"), ("DSC5", "ДТ межсезонное"),
+         ("DTL5", "ДТ летнее"), ("TRD-", "Топливо для реактивных двигателей"), ("MZMC", "Мазут топочный М-100"),
+         ("SUG2", "Газ сжиженный углеводородный")]
+STATIONS = ["ст. Новоярославская", "ст. Стенькино II", "ст. Кириши", "ст. Никола", "ст. Пурпе",
+            "ст. Комбинатская", "ст. Сызрань I", "ст. Нижнекамск", "РФ БП", "ст. Уфа"]
+PAGE_SIZE = 10
+LISTING_PATH = "/markets/oil_products/trades/results/"
+FILE_PATH = "/upload/reports/oil_xls/oil_xls_{stamp}162000.xls"
+
+
+def trading_days(days: int, end: Optional[date] = None) -> List[date]:
+    end = end or date.today()
+    result, current = [], end
+    while len(result) < days:
+        if current.weekday() < 5:
+            result.append(current)
+        current -= timedelta(days=1)
+    return result
+
+
+def instruments(products: int, seed: int = 42) -> List[tuple]:
+    rng = random.Random(seed)
+    result = []
+    for i in range(products):
+        code, name = FUELS[i % len(FUELS)]
+        station = STATIONS[(i // len(FUELS)) % len(STATIONS)]
+        basis = f"{chr(65 + i % 26)}{chr(65 + (i // 26) % 26)}{chr(65 + (i // 676) % 26)}"
+        exchange_product_id = f"{code}{basis}{rng.randint(10, 99):03d}{rng.choice('FJW')}"
+        result.append((exchange_product_id, f"{name}, {station} (ст. отправления)", station,
+                       rng.uniform(30000, 80000)))
+    return result
+
+
+def write_bulletin(path: Path, report_date: date, products: List[tuple], rng: random.Random,
+                   traded_share: float = 0.7):
+    book = xlwt.Workbook(encoding="utf-8")
+    sheet = book.add_sheet("TRADE_SUMMARY")
+    sheet.write(1, 1, "Бюллетень по итогам торгов в Секции «Нефтепродукты» АО «Биржа «Санкт-Петербург»")
+    sheet.write(3, 1, f"Дата торгов: {report_date:%d.%m.%Y}")
+    sheet.write(5, 1, "Единица измерения: Метрическая тонна")
+    for col, title in enumerate(COLUMNS, start=1):
+        sheet.write(6, col, title)
+    row = 7
+    for exchange_product_id, name, basis, base_price in products:
+        traded = rng.random() < traded_share
+        price = round(base_price * rng.uniform(0.95, 1.05), 0)
+        volume = rng.choice((60, 120, 180, 300, 600, 1500)) * rng.randint(1, 5) if traded else 0
+        values = [exchange_product_id, name, basis, volume, volume * price if traded else 0,
+                  "-", "-", price if traded else "-", price if traded else "-", price if traded else "-",
+                  rng.randint(1, 12) if traded else "-"]
+        for col, value in enumerate(values, start=1):
+            sheet.write(row, col, value)
+        row += 1
+    sheet.write(row, 1, "Итого:")
+    book.save(str(path))
+
+
+def generate(output: Path, days: int, products: int, seed: int = 42, end: Optional[date] = None) -> List[Path]:
+    output.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    catalog = instruments(products, seed)
+    paths = []
+    for report_date in trading_days(days, end):
+        path = output / f"oil_xls_{report_date:%Y%m%d}162000.xls"
+        write_bulletin(path, report_date, catalog, rng)
+        paths.append(path)
+    return paths
+
+
+class BulletinSite:
+    # страницы списка по PAGE_SIZE ссылок (новые сверху), как на spimex.com, и сами файлы из каталога
+    def __init__(self, directory: Path, host: str = "127.0.0.1", port: int = 0):
+        self.directory = directory
+        self.host = host
+        self.port = port
+        self.files = sorted(directory.glob("oil_xls_*.xls"), reverse=True)
+        self.runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def listing(self, request: web.Request) -> web.Response:
+        page = int(request.query.get("page", "page-1").split("-")[-1])
+        chunk = self.files[(page - 1) * PAGE_SIZE: page * PAGE_SIZE]
+        links = "\n".join(
+            f'<div class="accordeon-inner__item"><a class="accordeon-inner__item-title link xls" '
+            f'href="{FILE_PATH.format(stamp=path.name[8:16])}?r={i}">Бюллетень</a></div>'
+            for i, path in enumerate(chunk)
+        )
+        return web.Response(text=f"<html><body>{links}</body></html>", content_type="text/html")
+
+    async def bulletin(self, request: web.Request) -> web.FileResponse:
+        path = self.directory / request.match_info["name"]
+        if not path.exists():
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    async def start(self) -> "BulletinSite":
+        app = web.Application()
+        app.router.add_get(LISTING_PATH, self.listing)
+        app.router.add_get("/upload/reports/oil_xls/{name}", self.bulletin)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--days", type=int, default=60)
+    arg_parser.add_argument("--products", type=int, default=400)
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--output", default=os.path.join("benchmarks", "results", "bulletins"))
+    args = arg_parser.parse_args()
+
+    paths = generate(Path(args.output), args.days, args.products, args.seed)
+    print(f"Создано {len(paths)} бюллетеней в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
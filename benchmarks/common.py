@@ -0,0 +1,87 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT_DIR / "benchmarks" / "results"
+
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def save_results(name: str, results: Dict[str, Any], output: Optional[str] = None) -> Path:
+    payload = {
+        "benchmark": name,
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    path = Path(output) if output else RESULTS_DIR / f"{name}_{payload['commit'] or 'nocommit'}.json"
+    os.makedirs(path.parent, exist_ok=True)
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2, default=str))
+    print(f"Результаты сохранены в {path}")
+    return path
+
+
+def current_rss() -> int:
+    # RSS процесса в байтах; без /proc (macOS) — максимум за время жизни процесса
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageMeter:
+    """Время и пик RSS одного этапа; память снимается фоновым потоком каждые interval секунд."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.seconds = 0.0
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def __enter__(self) -> "StageMeter":
+        self.start_rss = self.peak_rss = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._started
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+
+    def result(self, **extra) -> Dict[str, Any]:
+        return {
+            "seconds": round(self.seconds, 3),
+            "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+            "rss_growth_mb": round((self.peak_rss - self.start_rss) / 2 ** 20, 1),
+            **extra,
+        }
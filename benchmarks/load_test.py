@@ -0,0 +1,211 @@
+"""Нагрузочный тест API: смесь реальных запросов от N одновременных клиентов, холодный и тёплый кэш.
+
+    python -m benchmarks.seed --rows 3000000 --truncate        # 10x-100x от текущего объёма, тестовая база
+    uvicorn app.main:app --workers 4                            # приложение, смотрящее в ту же базу и Redis
+    python -m benchmarks.load_test --clients 50 --requests 5000
+
+Фаза cold начинается с очищенного кэша trading:*, фаза warm повторяет ту же последовательность запросов.
+Для каждой фазы и эндпоинта — число запросов, ошибки, RPS и p50/p95/p99 в миллисекундах.
+
+--abusive-clients N добавляет к каждой фазе N клиентов, которые без пауз шлют некэшируемую динамику
+(случайные периоды). Так проверяется ограничение нагрузки (RATE_LIMIT_ENABLED, DB_MISS_CONCURRENCY):
+хвост задержек обычных клиентов должен остаться ограниченным, а «шумные» клиенты — получать 429/503.
+
+    python -m benchmarks.load_test --clients 20 --requests 2000 --abusive-clients 50
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from benchmarks.common import save_results
+from app.services.redis_client import close_redis
+from app.services.trading_service import TradingService
+
+# доли запросов в смеси: даты торгов для выбора периода, динамика по окнам, последние торги по фильтру
+DEFAULT_MIX = {"last_dates": 0.2, "dynamics": 0.5, "results": 0.3}
+WINDOWS = (7, 30, 90, 365)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    # ближайший ранг
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, object]:
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(ms, 50), 2) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 2) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 2) if ms else None,
+        "max_ms": round(max(ms), 2) if ms else None,
+    }
+
+
+class QueryMix:
+    def __init__(self, oil_ids: List[str], bases: List[str], latest: date, weights: Dict[str, float], seed: int):
+        self.oil_ids = oil_ids
+        self.bases = bases
+        self.latest = latest
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.rng = random.Random(seed)
+
+    def next(self) -> Tuple[str, str, str, dict]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == "last_dates":
+            return name, "GET", "/trading/last-dates/", {"params": {"limit": self.rng.choice((5, 10, 30))}}
+        if name == "dynamics":
+            window = self.rng.choice(WINDOWS)
+            body = {"start_date": (self.latest - timedelta(days=window)).isoformat(),
+                    "end_date": self.latest.isoformat()}
+            if self.rng.random() < 0.8:
+                body["oil_id"] = self.rng.choice(self.oil_ids)
+            else:
+                body["delivery_basis_id"] = self.rng.choice(self.bases)
+            return name, "POST", "/trading/dynamics/", {"json": body}
+        body = {"limit": self.rng.choice((10, 100, 500))}
+        if self.rng.random() < 0.7:
+            body["oil_id"] = self.rng.choice(self.oil_ids)
+        return name, "POST", "/trading/results/", {"json": body}
+
+
+async def discover(session: aiohttp.ClientSession, base_url: str) -> Tuple[List[str], List[str], date]:
+    # фильтры берём из самих данных, чтобы запросы были непустыми
+    async with session.get(f"{base_url}/trading/last-dates/", params={"limit": 1}) as response:
+        latest = date.fromisoformat((await response.json())["dates"][0])
+    async with session.post(f"{base_url}/trading/results/", json={"limit": 1000}) as response:
+        results = (await response.json())["results"]
+    oil_ids = sorted({row["oil_id"] for row in results if row["oil_id"]})
+    bases = sorted({row["delivery_basis_id"] for row in results if row["delivery_basis_id"]})
+    return oil_ids, bases, latest
+
+
+async def run_phase(session: aiohttp.ClientSession, base_url: str, mix: QueryMix, clients: int,
+                    total: int, abusive: int = 0) -> Dict[str, object]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    queries = [mix.next() for _ in range(total)]
+    position = 0
+    finished = asyncio.Event()
+    abusive_statuses: Dict[int, int] = defaultdict(int)
+
+    async def client(number: int):
+        nonlocal position
+        # у каждого клиента свой ключ: лимиты считаются на клиента
+        headers = {"X-API-Key": f"load-test-{number}"}
+        while position < len(queries):
+            name, method, path, kwargs = queries[position]
+            position += 1
+            started = time.perf_counter()
+            try:
+                async with session.request(method, f"{base_url}{path}", headers=headers, **kwargs) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            if ok:
+                latencies[name].append(time.perf_counter() - started)
+            else:
+                errors[name] += 1
+
+    async def abuser(number: int):
+        rng = random.Random(number)
+        headers = {"X-API-Key": f"load-test-abuser-{number}"}
+        while not finished.is_set():
+            end = mix.latest - timedelta(days=rng.randrange(0, 700))
+            body = {"start_date": (end - timedelta(days=rng.randrange(30, 365))).isoformat(),
+                    "end_date": end.isoformat()}
+            try:
+                async with session.post(f"{base_url}/trading/dynamics/", json=body, headers=headers) as response:
+                    await response.read()
+                    abusive_statuses[response.status] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                abusive_statuses[0] += 1
+
+    started = time.perf_counter()
+    abusers = [asyncio.create_task(abuser(number)) for number in range(abusive)]
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    seconds = time.perf_counter() - started
+    finished.set()
+    await asyncio.gather(*abusers)
+
+    phase = {name: summarize(latencies[name], errors[name], seconds) for name in mix.names}
+    phase["total"] = summarize([value for values in latencies.values() for value in values],
+                               sum(errors.values()), seconds)
+    phase["seconds"] = round(seconds, 3)
+    if abusive:
+        phase["abusive_statuses"] = dict(sorted(abusive_statuses.items()))
+    return phase
+
+
+async def run(args) -> Dict[str, object]:
+    if args.seed_rows:
+        from benchmarks.seed import seed, DEFAULT_DSN
+        await seed(args.dsn or DEFAULT_DSN, args.seed_rows, truncate=True)
+
+    weights = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, value = item.split("=")
+        weights[name] = float(value)
+
+    connector = aiohttp.TCPConnector(limit=args.clients + args.abusive_clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        oil_ids, bases, latest = await discover(session, args.base_url)
+        results: Dict[str, object] = {
+            "base_url": args.base_url, "clients": args.clients, "requests": args.requests, "mix": weights,
+            "abusive_clients": args.abusive_clients,
+            "oil_ids": len(oil_ids), "latest_date": latest.isoformat(),
+        }
+
+        trading_service = TradingService(record_queries=False)
+        try:
+            await trading_service.invalidate_cache()
+        finally:
+            await trading_service.close()
+            await close_redis()
+        for phase in ("cold", "warm"):
+            # одинаковый seed: тёплая фаза повторяет те же запросы, что прогрели кэш в холодной
+            mix = QueryMix(oil_ids, bases, latest, weights, args.seed)
+            results[phase] = await run_phase(session, args.base_url, mix, args.clients, args.requests,
+                                             args.abusive_clients)
+            total = results[phase]["total"]
+            print(f"{phase}: {total['rps']} RPS, p50 {total['p50_ms']} мс, p95 {total['p95_ms']} мс, "
+                  f"p99 {total['p99_ms']} мс, ошибок {total['errors']}")
+            if args.abusive_clients:
+                print(f"{phase}: ответы шумным клиентам {results[phase]['abusive_statuses']}")
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    arg_parser.add_argument("--clients", type=int, default=20)
+    arg_parser.add_argument("--requests", type=int, default=2000, help="запросов в каждой фазе")
+    arg_parser.add_argument("--mix", action="append", help="доля эндпоинта, например dynamics=0.7")
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--abusive-clients", type=int, default=0,
+                            help="клиентов, шлющих некэшируемые запросы без пауз")
+    arg_parser.add_argument("--seed-rows", type=int, help="перед тестом заполнить базу (с TRUNCATE!)")
+    arg_parser.add_argument("--dsn")
+    arg_parser.add_argument("--output")
+    args = arg_parser.parse_args()
+
+    save_results("load_test", asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Наполнение локального Postgres синтетической историей торгов.
+
+Таблица должна быть создана миграциями (`alembic upgrade head`). Запускать только
+против отдельной, тестовой базы: при --truncate данные удаляются.
+
+    python -m benchmarks.seed --rows 3000000 --truncate
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+import asyncpg
+
+from benchmarks.common import ROOT_DIR  # noqa: F401  (добавляет корень проекта в sys.path)
+from app.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from app.services.partitions import add_months, create_partition_sql, month_start
+
+DEFAULT_DSN = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# ~200 инструментов в торговый день, как в реальных бюллетенях; всего инструментов больше,
+# чтобы фильтры по oil_id / базису были селективными.
+# синтетические коды инструментов и объёмы для номеров строк [low, high]
+SEED_ROWS = """
+    SELECT g,
+           'A' || lpad(((g * 7919) % {products})::text, 3, '0')
+               || chr(65 + ((g * 31) % 26)) || chr(65 + ((g * 17) % 26)) || 'Y'
+               || lpad(((g * 13) % 100)::text, 3, '0') || chr(65 + (g % 6)) AS code,
+           round((60 + (g * 37) % 5000)::numeric, 2) AS vol
+    FROM generate_series({low}::bigint, {high}::bigint) AS g
+"""
+
+# названия инструментов и базисов сначала в таблицы-измерения; $1 — high, $2 — число кодов, $3 — low
+SEED_DIMENSIONS_SQL = """
+WITH s AS ({rows}),
+instruments AS (
+    INSERT INTO spimex_instruments (exchange_product_id, name)
+    SELECT DISTINCT code, 'Синтетический продукт ' || code FROM s
+    ON CONFLICT DO NOTHING
+)
+INSERT INTO spimex_delivery_bases (name)
+SELECT DISTINCT 'Базис ' || substr(code, 5, 7) FROM s
+ON CONFLICT DO NOTHING
+""".format(rows=SEED_ROWS.format(high="$1", products="$2", low="$3"))
+
+# $1 — первая дата, $2 — high, $3 — строк в день, $4 — число кодов, $5 — low
+SEED_SQL = """
+INSERT INTO spimex_trading_results (
+    exchange_product_id, instrument_key, oil_id, delivery_basis_id,
+    delivery_basis_key, delivery_type_id, volume, total, count, date
+)
+SELECT code,
+       i.id,
+       left(code, 10),
+       substr(code, 5, 10),
+       b.id,
+       right(code, 5),
+       vol,
+       round(vol * (40000 + (g % 30000))::numeric, 2),
+       1 + (g % 17),
+       $1::date + ((g - 1) / $3)::int
+FROM ({rows}) AS s
+JOIN spimex_instruments AS i ON i.exchange_product_id = s.code AND i.name = 'Синтетический продукт ' || s.code
+JOIN spimex_delivery_bases AS b ON b.name = 'Базис ' || substr(s.code, 5, 7)
+""".format(rows=SEED_ROWS.format(high="$2", products="$4", low="$5"))
+
+
+async def ensure_partitions(conn, start: date, end: date) -> None:
+    partitioned = await conn.fetchval(
+        "SELECT count(*) FROM pg_partitioned_table WHERE partrelid = 'spimex_trading_results'::regclass"
+    )
+    if not partitioned:
+        return
+    month = month_start(start)
+    while month <= end:
+        await conn.execute(create_partition_sql(month))
+        month = add_months(month, 1)
+
+
+DERIVED_SQL = {
+    "spimex_daily_rollups": """
+        INSERT INTO spimex_daily_rollups (date, oil_id, delivery_basis_id, delivery_type_id, volume, total, count)
+        SELECT date, coalesce(oil_id, ''), coalesce(delivery_basis_id, ''), coalesce(delivery_type_id, ''),
+               sum(volume), sum(total), sum(count)
+        FROM spimex_trading_results GROUP BY 1, 2, 3, 4
+    """,
+    "spimex_monthly_rollups": """
+        INSERT INTO spimex_monthly_rollups (month, oil_id, delivery_basis_id, delivery_type_id, volume, total, count)
+        SELECT date_trunc('month', date)::date, oil_id, delivery_basis_id, delivery_type_id,
+               sum(volume), sum(total), sum(count)
+        FROM spimex_daily_rollups GROUP BY 1, 2, 3, 4
+    """,
+    "spimex_trading_days": """
+        INSERT INTO spimex_trading_days (date, rows, volume, total, count)
+        SELECT date, count(*), sum(volume), sum(total), sum(count)
+        FROM spimex_trading_results GROUP BY date
+    """,
+}
+
+
+async def rebuild_derived(conn) -> None:
+    # агрегаты и календарь пересобираются целиком, если их таблицы уже созданы миграциями
+    for table, sql in DERIVED_SQL.items():
+        if await conn.fetchval("SELECT to_regclass($1)", table) is None:
+            continue
+        await conn.execute(f"TRUNCATE {table}")
+        await conn.execute(sql)
+        await conn.execute(f"ANALYZE {table}")
+
+
+async def seed(dsn: str, rows: int, rows_per_day: int = 200, products: int = 900,
+               start: date = None, truncate: bool = False, chunk: int = 500_000) -> float:
+    days = (rows + rows_per_day - 1) // rows_per_day
+    # история заканчивается сегодняшним днём, чтобы окна "последние N дней" были непустыми
+    start = start or date.today() - timedelta(days=days - 1)
+    conn = await asyncpg.connect(dsn)
+    try:
+        if truncate:
+            await conn.execute("TRUNCATE spimex_trading_results, spimex_instruments, spimex_delivery_bases "
+                               "RESTART IDENTITY")
+        await ensure_partitions(conn, start, start + timedelta(days=days))
+        started = time.perf_counter()
+        for low in range(1, rows + 1, chunk):
+            high = min(low + chunk - 1, rows)
+            await conn.execute(SEED_DIMENSIONS_SQL, high, products, low)
+            await conn.execute(SEED_SQL, start, high, rows_per_day, products, low)
+            print(f"Вставлено {high}/{rows} строк")
+        await rebuild_derived(conn)
+        await conn.execute("VACUUM ANALYZE spimex_trading_results")
+        return time.perf_counter() - started
+    finally:
+        await conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--dsn", default=DEFAULT_DSN)
+    arg_parser.add_argument("--rows", type=int, default=3_000_000)
+    arg_parser.add_argument("--rows-per-day", type=int, default=200)
+    arg_parser.add_argument("--truncate", action="store_true")
+    args = arg_parser.parse_args()
+    elapsed = asyncio.run(seed(args.dsn, args.rows, args.rows_per_day, truncate=args.truncate))
+    print(f"Готово за {elapsed:.1f} с")
+
+
+if __name__ == "__main__":
+    main()